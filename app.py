@@ -1,19 +1,21 @@
 import streamlit as st
 import pandas as pd
-import os
-from utils import local_lookup, query_uk_tariff_api, append_sku_record, exact_match_lookup
-import csv
-
-def format_commodity_code(code):
-    digits = ''.join(filter(str.isdigit, str(code)))
-    if len(digits) < 4:
-        return digits
-    result = digits[:4]
-    for i in range(4, len(digits), 2):
-        result += '.' + digits[i:i+2]
-    return result
+import hashlib
+import io
+from utils import query_uk_tariff_api_batch, bulk_upsert
+from sku_store import get_backend, instance_origin, records_to_csv
+from sku_sync import delta_file_name, export_delta, import_delta
+from matching import SOURCE_COLUMN, UPLOAD_COLUMN, match_order_files
+from dhl_export import DHL_COLUMNS, export_dhl, export_dhl_by_source, zip_parts
+from review import (
+    ALL, BULK_EDIT_COLUMNS, MATCHED, PAGE_SIZES, SAVE_COLUMN, SELECT_COLUMN, UNMATCHED, apply_page_edits,
+    bulk_set, fill_unmatched, filter_index, page_count, page_index, records_to_save, review_frame, selected_index,
+)
+from suggest import suggest_matches
+import metrics
 
 SKU_DB = "sku_reference_data.csv"
+PREVIEW_ROWS = 200
 
 # App title
 st.set_page_config(page_title="DHL 发货自动生成系统 v5", layout="wide")
@@ -21,75 +23,67 @@ st.title("📦 DHL 发货自动生成系统 v5")
 
 # --- 侧边栏：下载 SKU 数据库 ---
 st.sidebar.header("📥 数据管理")
-if os.path.exists(SKU_DB):
-    with open(SKU_DB, "rb") as f:
-        st.sidebar.download_button(
-            label="下载 SKU 数据库",
-            data=f,
-            file_name="sku_reference_data.csv",
-            mime="text/csv"
-        )
+# 打开时把旧版的两份数据库文件迁移为一份。新写入先进 journal，
+# 磁盘上的 CSV 要到压缩时才更新，所以下载内容从当前记录生成；
+# 只在点击下载时生成，平时的 rerun 不必序列化整个数据库
+sku_backend = get_backend(SKU_DB)
+if sku_backend.record_count():
+    st.sidebar.download_button(
+        label="下载 SKU 数据库",
+        data=lambda: records_to_csv(sku_backend.reference_records())[1],
+        file_name="sku_reference_data.csv",
+        mime="text/csv"
+    )
 else:
     st.sidebar.info("SKU 数据库文件不存在。请先生成数据。")
 
-# Step 1: 上传订单文件
-uploaded_file = st.file_uploader("上传订单文件 (CSV/Excel)", type=["csv", "xlsx", "xls"])
+def upload_keys(uploaded_files):
+    """(name, content hash) per upload; each file is hashed once and remembered by file_id"""
+    known = st.session_state.get("upload_hashes", {})
+    hashes = {
+        f.file_id: known.get(f.file_id) or hashlib.sha1(f.getbuffer()).hexdigest()
+        for f in uploaded_files
+    }
+    st.session_state["upload_hashes"] = hashes
+    return tuple((f.name, hashes[f.file_id]) for f in uploaded_files)
 
-if uploaded_file:
-    # Step 2: 只提取两列
-    if uploaded_file.name.endswith("csv"):
-        df = pd.read_csv(uploaded_file)
-    else:
-        df = pd.read_excel(uploaded_file)
-    
-    # 只保留 Item Description 和 Selling Price
-    col_map = {c.lower().strip(): c for c in df.columns}
-    desc_col = col_map.get("item description")
-    price_col = col_map.get("selling price")
-    if not desc_col or not price_col:
-        st.error("请确保文件包含 'Item Description' 和 'Selling Price' 两列！")
-        st.stop()
-    df = df[[desc_col, price_col]].copy()
-    df.columns = ["Item Description", "Selling Price"]
+@st.cache_data(max_entries=8, show_spinner="正在读取并匹配订单文件...")
+def match_uploads(file_keys, db_version, _uploaded_files):
+    """Parse + match, memoized on (file names and content hashes, SKU DB version)"""
+    metrics.incr("match_cache_misses")
+    for f in _uploaded_files:
+        f.seek(0)
+    with metrics.stage("parse_match") as timer:
+        result = match_order_files([(f.name, f) for f in _uploaded_files], get_backend(SKU_DB))
+        timer.rows = len(result[0])
+    return result
 
-    # Step 2: 数据预处理和匹配检查
-    results = []
-    matched_count = 0
-    unmatched_count = 0
-    
-    for _, row in df.iterrows():
-        desc = str(row["Item Description"]).strip()
-        price = row["Selling Price"]
-        
-        # 使用 exact match 查找
-        local = exact_match_lookup(desc)
-        
-        if local and local["Commodity Code"] and local["Weight"] and local["Origin Country"]:
-            # 找到 exact match，从数据库调取完整数据
-            matched_count += 1
-            code = local["Commodity Code"]
-            weight = local["Weight"]
-            origin = local["Origin Country"]
-            is_matched = True
-        else:
-            # 未找到 exact match，留空让用户填写
-            unmatched_count += 1
-            code = ""
-            weight = ""
-            origin = ""
-            is_matched = False
-            
-        results.append({
-            "Item Description": desc,
-            "Selling Price": price,
-            "Weight": weight,
-            "Origin Country": origin,
-            "Commodity Code": code,
-            "写入 SKU 数据库": False,
-            "is_matched": is_matched
-        })
-    
-    edit_df = pd.DataFrame(results)
+# Step 1: 上传订单文件（可一次上传多个店铺导出的文件）
+uploaded_files = st.file_uploader("上传订单文件 (CSV/Excel)", type=["csv", "xlsx", "xls"], accept_multiple_files=True)
+
+if uploaded_files:
+    # Step 2: 流式读取，只解析 Item Description 和 Selling Price 两列；多个文件在线程池中并行匹配，共用同一个已加载的 SKU 索引
+    # 只在上传的文件变化时匹配：同一批文件的编辑和写入数据库后的 rerun 都沿用 session 中的表格，
+    # 结果另按（文件内容哈希, SKU 数据库版本）缓存，切换回之前的文件时不必重新读取
+    sku_store = get_backend(SKU_DB)
+    file_keys = upload_keys(uploaded_files)
+    # 完整表格只保存在服务器端 session 中，浏览器每次只拿到当前一页；同一批文件的编辑在 rerun 之间保留
+    if st.session_state.get("review_files") != file_keys:
+        metrics.incr("match_cache_lookups")
+        edit_df, file_summary, file_errors = match_uploads(file_keys, sku_store.reference_version(), uploaded_files)
+        st.session_state["review_files"] = file_keys
+        st.session_state["review_df"] = review_frame(edit_df)
+        st.session_state["review_summary"] = (file_summary, file_errors)
+        st.session_state["editor_generation"] = 0
+    work_df = st.session_state["review_df"]
+    file_summary, file_errors = st.session_state["review_summary"]
+    for file_name, error in file_errors.items():
+        st.error(f"{file_name}: {error}")
+    if not file_summary:
+        st.stop()
+    # 统计与表格来自同一份数据
+    matched_count = int(work_df["is_matched"].sum())
+    unmatched_count = len(work_df) - matched_count
 
     # 显示匹配统计
     st.subheader("🔍 数据匹配结果")
@@ -99,51 +93,135 @@ if uploaded_file:
     with col2:
         st.metric("未找到", unmatched_count)
     with col3:
-        st.metric("总计", len(results))
+        st.metric("总计", len(work_df))
+    if len(file_summary) > 1:
+        st.dataframe(pd.DataFrame(file_summary), use_container_width=True, hide_index=True)
     
     if unmatched_count > 0:
         st.warning(f"⚠️ 有 {unmatched_count} 条商品未找到匹配，请手动补全信息")
+        # 未匹配商品去重后并发查询 UK Tariff API，结果直接填入 session 中的表格
+        if st.button("🔎 用 UK Tariff API 查询未匹配商品的海关编码"):
+            unmatched_descriptions = work_df.loc[~work_df["is_matched"], "Item Description"].unique().tolist()
+            with st.spinner(f"正在查询 {len(unmatched_descriptions)} 个商品..."), \
+                    metrics.stage("tariff_fill", rows=len(unmatched_descriptions)):
+                tariff_codes = query_uk_tariff_api_batch(unmatched_descriptions)
+            fill = ~work_df["is_matched"] & (work_df["Commodity Code"] == "")
+            work_df.loc[fill, "Commodity Code"] = work_df.loc[fill, "Item Description"].map(tariff_codes).fillna("")
+            st.session_state["editor_generation"] += 1
 
     st.subheader("📝 可编辑商品信息表")
     st.info("请补全未匹配商品的 Weight、Origin Country、Commodity Code，并勾选需要写入 SKU 数据库的行")
-    
-    edited = st.data_editor(
-        edit_df,
+
+    # 默认只看未匹配的行；已匹配的行不必显示也会照常导出
+    status_labels = {UNMATCHED: "未匹配", MATCHED: "已匹配", ALL: "全部"}
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        status = st.radio("显示", list(status_labels), format_func=status_labels.get, horizontal=True)
+    filtered = filter_index(work_df, status)
+    with col2:
+        page_size = st.selectbox("每页行数", PAGE_SIZES, index=1)
+    with col3:
+        page = st.number_input(
+            f"页码（共 {page_count(len(filtered), page_size)} 页）",
+            min_value=1, max_value=page_count(len(filtered), page_size), value=1,
+            key=f"page_{status}_{page_size}"
+        )
+    page_rows = page_index(filtered, page, page_size)
+
+    # editor 的 key 随筛选/分页/批量修改变化，避免旧的编辑记录套到别的行上
+    edited_page = st.data_editor(
+        work_df.loc[page_rows],
+        key=f"review_{status}_{page_size}_{page}_{st.session_state['editor_generation']}",
         use_container_width=True,
-        num_rows="dynamic",
+        num_rows="fixed",
         column_config={
-            "写入 SKU 数据库": st.column_config.CheckboxColumn(
-                "写入 SKU 数据库",
+            SELECT_COLUMN: st.column_config.CheckboxColumn(
+                SELECT_COLUMN,
+                help="勾选后可在下方批量修改"
+            ),
+            SAVE_COLUMN: st.column_config.CheckboxColumn(
+                SAVE_COLUMN,
                 help="勾选后，所有字段不为空时会写入 sku_reference_data.csv"
             ),
             "is_matched": st.column_config.CheckboxColumn(
                 "已匹配",
-                help="系统自动标记是否找到匹配"
-            )
+                help="系统自动标记是否找到匹配",
+                disabled=True
+            ),
+            SOURCE_COLUMN: st.column_config.TextColumn(
+                "来源文件",
+                disabled=True
+            ),
+            # 上传序号只用于按文件分组导出，不显示
+            UPLOAD_COLUMN: None
         }
     )
+    apply_page_edits(work_df, edited_page)
+
+    # 当前页未匹配商品的相似建议（trigram 索引），勾选后一键填入
+    # expander 折叠时内容也会执行，所以用开关：打开后才建索引，写入数据库后不必每次 rerun 都重建
+    if st.toggle("💡 显示未匹配商品的相似建议"):
+        page_df = work_df.loc[page_rows]
+        page_unmatched = page_df.loc[~page_df["is_matched"], "Item Description"].unique()
+        suggestions = suggest_matches(sku_store, page_unmatched)
+        suggestion_df = pd.DataFrame([
+            {
+                "采用": False,
+                "Item Description": description,
+                "建议商品": found[0]["Item Description"],
+                "相似度": found[0]["Score"],
+                "Commodity Code": found[0]["Commodity Code"],
+                "Weight": found[0]["Weight"],
+                "Origin Country": found[0]["Origin Country"],
+                "其他候选": " / ".join(f"{other['Item Description']} ({other['Score']})" for other in found[1:]),
+            }
+            for description, found in suggestions.items() if found
+        ])
+        if suggestion_df.empty:
+            st.write("当前页没有找到相似的已知商品")
+        else:
+            accepted = st.data_editor(
+                suggestion_df,
+                key=f"suggest_{status}_{page_size}_{page}_{st.session_state['editor_generation']}",
+                use_container_width=True,
+                hide_index=True,
+                disabled=[c for c in suggestion_df.columns if c != "采用"]
+            )
+            if st.button("填入勾选的建议"):
+                changed = 0
+                for _, row in accepted[accepted["采用"]].iterrows():
+                    changed += fill_unmatched(work_df, row["Item Description"], row)
+                st.session_state["editor_generation"] += 1
+                st.success(f"已填入 {changed} 行")
+                st.rerun()
+
+    # 批量修改：选中的行，或当前筛选下的全部行
+    with st.expander("✏️ 批量修改"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            bulk_column = st.selectbox("字段", BULK_EDIT_COLUMNS)
+        with col2:
+            bulk_value = st.text_input("新值")
+        with col3:
+            bulk_scope = st.radio("范围", ["选中的行", "当前筛选的全部行"])
+        if st.button("应用批量修改"):
+            rows = selected_index(work_df) if bulk_scope == "选中的行" else filtered
+            changed = bulk_set(work_df, rows, bulk_column, bulk_value)
+            st.session_state["editor_generation"] += 1
+            st.success(f"已修改 {changed} 行的 {bulk_column}")
+            st.rerun()
+
+    # DHL 单个文件有行数上限，0 表示不拆分
+    max_rows_per_file = st.number_input("每个 DHL 文件最多行数（0 = 不拆分）", min_value=0, value=0, step=100)
 
     # Step 3: 提交后处理逻辑
     if st.button("提交并导出 DHL 文件"):
         # 1. 写入 SKU 数据库
-        new_records = []
-        for _, row in edited.iterrows():
-            if (
-                row["写入 SKU 数据库"]
-                and all([row["Item Description"], row["Commodity Code"], row["Weight"], row["Origin Country"]])
-            ):
-                append_sku_record(
-                    row["Item Description"],
-                    row["Commodity Code"],
-                    row["Weight"],
-                    row["Origin Country"]
-                )
-                new_records.append({
-                    "Item Description": row["Item Description"],
-                    "Commodity Code": row["Commodity Code"],
-                    "Weight": row["Weight"],
-                    "Origin Country": row["Origin Country"]
-                })
+        new_records = records_to_save(work_df)
+        
+        # 所有勾选的行一次性写入（去重 + 原子替换）
+        if new_records:
+            bulk_upsert(new_records)
         
         # 2. 导出新添加的数据（用于数据库更新）
         if new_records:
@@ -160,59 +238,116 @@ if uploaded_file:
                 help="下载此文件，包含本次新添加的所有商品数据"
             )
         
-        # 3. 生成 DHL_ready_file.csv
-        dhl_rows = []
-        for i, row in edited.iterrows():
-            formatted_code = format_commodity_code(row["Commodity Code"])
-            dhl_rows.append([
-                1,  # Unique Item Number 固定为1
-                "INV_ITEM",  # Item
-                row["Item Description"],
-                formatted_code,
-                1,  # Quantity
-                "PCS",  # Units
-                row["Selling Price"],
-                "GBP",  # Currency
-                row["Weight"],
-                "",  # Weight 2
-                row["Origin Country"],
-                "", "", ""  # Reference Type, Details, Tax Paid
-            ])
-        dhl_df = pd.DataFrame(dhl_rows)
-        dhl_df.columns = [
-            "Unique Item Number", "Item", "Item Description", "Commodity Code", "Quantity",
-            "Units", "Value", "Currency", "Weight", "Weight 2", "Country of Origin",
-            "Reference Type", "Reference Details", "Tax Paid"
-        ]
+        # 3. 生成 DHL_ready_file.csv（逐行流式写出，超过每个文件行数上限时自动分文件）
+        max_rows = int(max_rows_per_file) or None
+        with metrics.stage("dhl_export", rows=len(work_df)):
+            if len(file_summary) > 1:
+                # 多个文件：每个来源文件单独导出，打包成一个 zip
+                dhl_parts = export_dhl_by_source(work_df, SOURCE_COLUMN, UPLOAD_COLUMN, max_rows=max_rows)
+            else:
+                dhl_parts = export_dhl(work_df, max_rows=max_rows)
         st.subheader("📋 DHL 导出数据预览")
-        st.dataframe(dhl_df, use_container_width=True)
-        csv = dhl_df.to_csv(index=False, header=False)
-        st.download_button(
-            label="📥 下载 DHL_ready_file.csv",
-            data=csv,
-            file_name="DHL_ready_file.csv",
-            mime="text/csv"
-        )
+        # 预览只解析第一个文件的前几百行
+        if dhl_parts[0][1]:
+            preview = pd.read_csv(
+                io.StringIO(dhl_parts[0][1]), header=None, names=DHL_COLUMNS,
+                nrows=PREVIEW_ROWS, dtype=str, keep_default_na=False
+            )
+            st.dataframe(preview, use_container_width=True)
+        if len(dhl_parts) > 1:
+            with metrics.stage("zip", rows=len(work_df)):
+                archive = zip_parts(dhl_parts)
+            st.download_button(
+                label=f"📥 下载全部 DHL 文件（{len(dhl_parts)} 个，zip）",
+                data=archive,
+                file_name="DHL_ready_files.zip",
+                mime="application/zip"
+            )
+        for file_name, csv_text in dhl_parts:
+            st.download_button(
+                label=f"📥 下载 {file_name}",
+                data=csv_text,
+                file_name=file_name,
+                mime="text/csv",
+                key=f"download_{file_name}"
+            )
         st.success("✅ 已写入 SKU 数据库并生成 DHL 文件！")
 
 # Display memory database info
 if st.sidebar.checkbox("📊 显示记忆数据库信息"):
     st.sidebar.subheader("智能记忆数据库")
-    
-    if os.path.exists("data/sku_memory_db.csv"):
-        memory_df = pd.read_csv("data/sku_memory_db.csv")
-        if not memory_df.empty:
-            st.sidebar.write(f"📈 已记忆商品数量: {len(memory_df)}")
-            st.sidebar.write("📋 记忆字段:")
-            st.sidebar.write("• 海关编码 (Commodity Code)")
-            st.sidebar.write("• 重量 (Weight)")
-            st.sidebar.write("• 产地 (Country of Origin)")
-            
-            if st.sidebar.button("🗑️ 清空记忆数据库"):
-                os.remove("data/sku_memory_db.csv")
-                st.sidebar.success("记忆数据库已清空！")
-                st.rerun()
-        else:
-            st.sidebar.write("📝 记忆数据库为空")
+    # 记忆与参考数据同在 SKU 数据库中：带 SKU 或品牌的记录即为记忆
+    total = remembered = 0
+    for record in get_backend(SKU_DB).reference_records():
+        total += 1
+        remembered += bool(record["SKU"] or record["Brand"])
+    if remembered:
+        st.sidebar.write(f"📈 已记忆商品数量: {remembered}（SKU 数据库共 {total} 条）")
+        st.sidebar.write("📋 记忆字段:")
+        st.sidebar.write("• 海关编码 (Commodity Code)")
+        st.sidebar.write("• 重量 (Weight)")
+        st.sidebar.write("• 产地 (Origin Country)")
     else:
-        st.sidebar.write("📝 记忆数据库尚未创建")
+        st.sidebar.write("📝 记忆数据库为空")
+
+# 增量同步：多个实例之间只交换某序号之后的变更，不必整份传输 CSV
+if st.sidebar.checkbox("🔄 增量同步"):
+    st.sidebar.subheader("增量同步")
+    sync_backend = get_backend(SKU_DB)
+    st.sidebar.write(f"📍 本实例 {instance_origin()}，最新序号 {sync_backend.last_seq()}")
+    since = st.sidebar.number_input("导出此序号之后的变更", min_value=0, value=0, step=1)
+    delta, delta_header = export_delta(sync_backend, int(since))
+    st.sidebar.download_button(
+        label=f"下载增量文件（{delta_header['count']} 条变更）",
+        data=delta,
+        file_name=delta_file_name(delta_header),
+        mime="application/gzip"
+    )
+    st.sidebar.caption(f"下次向同一实例同步时，从序号 {delta_header['until']} 之后导出")
+    delta_files = st.sidebar.file_uploader("导入其他实例的增量文件", type=["gz"], accept_multiple_files=True)
+    if delta_files and st.sidebar.button("导入增量"):
+        for delta_file in delta_files:
+            try:
+                result = import_delta(sync_backend, delta_file.getvalue())
+            except ValueError as e:
+                st.sidebar.error(f"❌ {delta_file.name}: {e}")
+            else:
+                st.sidebar.success(
+                    f"✅ {delta_file.name}（来自 {result['origin']}）：应用 {result['applied']} 条，"
+                    f"跳过 {result['skipped']} 条已是最新的记录"
+                )
+
+# 性能诊断：各阶段耗时、吞吐、缓存命中率、API 延迟分布
+if st.sidebar.checkbox("⏱️ 显示性能诊断"):
+    st.sidebar.subheader("性能诊断")
+    snap = metrics.snapshot()
+    stage_rows = metrics.stage_table(snap)
+    if stage_rows:
+        st.sidebar.dataframe(pd.DataFrame(stage_rows), hide_index=True)
+    else:
+        st.sidebar.write("📝 还没有记录")
+    for name, rate in metrics.hit_rates(snap).items():
+        st.sidebar.write(f"🎯 {name} 命中率: {rate:.1%}")
+    if snap["counters"].get("db_rows_scanned"):
+        st.sidebar.write(f"🔍 数据库扫描行数: {snap['counters']['db_rows_scanned']:,}")
+    latency = snap["histograms"].get("tariff_api_latency_seconds")
+    if latency and latency["count"]:
+        st.sidebar.write(f"🌐 Tariff API: {latency['count']} 次请求，平均 {latency['sum'] / latency['count'] * 1000:.0f} ms")
+        counts, previous, last_bound = {}, 0, 0
+        for bound, total in latency["buckets"]:
+            label = f"> {last_bound:g}s" if bound == float("inf") else f"≤ {bound * 1000:g}ms"
+            counts[label] = total - previous
+            previous, last_bound = total, bound
+        st.sidebar.bar_chart(pd.Series(counts, name="请求数"))
+    st.sidebar.download_button(
+        label="下载 Prometheus 指标",
+        data=metrics.to_prometheus(snap),
+        file_name="dhl_metrics.prom",
+        mime="text/plain"
+    )
+    if st.sidebar.button("重置统计"):
+        metrics.reset()
+        st.rerun()
+
+# 设置了 METRICS_PROM_FILE 时，每次运行后更新 Prometheus textfile
+metrics.write_prometheus()
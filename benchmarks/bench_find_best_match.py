@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: inverted-index find_best_match vs the original linear scan
+
+    python benchmarks/bench_find_best_match.py            # 10k, 100k, 1M records
+    python benchmarks/bench_find_best_match.py 10000 --queries 50
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import find_best_match
+from sku_store import SkuMemory
+
+BRANDS = ["LV", "GUCCI", "HERMES", "CHANEL", "PRADA", "DIOR", "FENDI", "CELINE", "LOEWE", "BURBERRY"]
+NOUNS = ["BAG", "BELT", "WALLET", "SHOES", "SNEAKERS", "JACKET", "DRESS", "SCARF", "HAT", "WATCH"]
+ADJECTIVES = ["CLASSIC", "MINI", "LEATHER", "CANVAS", "BLACK", "RED", "LARGE", "SMALL", "VINTAGE", "SPORT"]
+
+
+def legacy_find_best_match(sku, brand, item_description, memory_data):
+    """The linear-scan implementation find_best_match replaced, kept for comparison"""
+    desc_lower = item_description.lower()
+
+    for record in memory_data:
+        if record['SKU'] and record['SKU'].strip() == sku.strip():
+            return record
+
+    desc_words = re.findall(r'\b\w+\b', desc_lower)
+    best_match = None
+    best_score = 0
+
+    for record in memory_data:
+        if not record['Item Description']:
+            continue
+        record_words = re.findall(r'\b\w+\b', record['Item Description'].lower())
+        common_words = set(desc_words) & set(record_words)
+        if len(common_words) > 0:
+            score = len(common_words) / max(len(desc_words), len(record_words))
+            if score > best_score and score > 0.3:
+                best_score = score
+                best_match = record
+
+    if best_match:
+        return best_match
+
+    for record in memory_data:
+        if record['Brand'] and record['Brand'].strip().lower() == brand.strip().lower():
+            return record
+
+    return None
+
+
+def make_records(n, rng):
+    records = []
+    for i in range(n):
+        brand = rng.choice(BRANDS)
+        records.append({
+            'SKU': f"SKU{i:07d}",
+            'Brand': brand,
+            'Item Description': f"{brand} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+            'Commodity Code': "42022100",
+            'Weight': "0.5",
+            'Origin Country': "IT",
+        })
+    return records
+
+
+def make_queries(n, rng):
+    # 不命中 SKU，逼迫两种实现都走关键词匹配
+    return [("NOSKU", rng.choice(BRANDS), f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randrange(n)}")
+            for _ in range(50)]
+
+
+def time_queries(fn, queries, memory_data, limit):
+    results = []
+    start = time.perf_counter()
+    for sku, brand, desc in queries[:limit]:
+        results.append(fn(sku, brand, desc, memory_data))
+    return (time.perf_counter() - start) / limit, results
+
+
+def run(size, queries, legacy_queries, seed=42):
+    rng = random.Random(seed)
+    records = make_records(size, rng)
+    query_set = make_queries(size, rng)
+
+    start = time.perf_counter()
+    memory = SkuMemory(records)
+    build_time = time.perf_counter() - start
+
+    indexed_avg, indexed_results = time_queries(find_best_match, query_set, memory, queries)
+    legacy_limit = min(queries, legacy_queries)
+    legacy_avg, legacy_results = time_queries(legacy_find_best_match, query_set, records, legacy_limit)
+    assert indexed_results[:legacy_limit] == legacy_results, "indexed and legacy results differ"
+
+    print(f"{size:>9,} records | index build {build_time * 1000:9.1f} ms | "
+          f"legacy {legacy_avg * 1000:9.3f} ms/query | indexed {indexed_avg * 1000:8.3f} ms/query | "
+          f"speedup {legacy_avg / indexed_avg:7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50, help="indexed queries per size (max 50)")
+    parser.add_argument("--legacy-queries", type=int, default=5, help="legacy queries per size")
+    args = parser.parse_args()
+
+    print("🏁 find_best_match benchmark")
+    print("=" * 50)
+    for size in args.sizes:
+        run(size, min(args.queries, 50), args.legacy_queries)
+
+
+if __name__ == "__main__":
+    main()
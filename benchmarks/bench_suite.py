@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the lookup, matching, persistence and export hot paths
+
+    python benchmarks/bench_suite.py                                 # 1k, 100k, 1M rows
+    python benchmarks/bench_suite.py --sizes 1000 100000 --only exact_match_lookup pipeline
+    python benchmarks/bench_suite.py --baseline benchmarks/results/old.json
+    python benchmarks/bench_suite.py --load new.json --baseline old.json    # compare two saved runs
+
+Every benchmark runs against a synthetic SKU database and order file of the
+given size, generated from a fixed seed. Results (min / median / mean seconds
+per operation) are written as JSON to benchmarks/results/, and with
+--baseline every benchmark whose median got slower by more than --threshold
+is flagged as a regression (exit code 1).
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+import pandas as pd
+
+import utils
+from bench_find_best_match import ADJECTIVES, BRANDS, NOUNS, make_records
+from dhl_export import _format_code, export_dhl, format_commodity_code
+from matching import match_order_files
+from sku_store import (
+    BACKEND_ENV, SKU_FIELDS, SQLITE_PATH_ENV, SkuMemory, SkuStore, get_backend,
+)
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD = 0.2
+# 单次计时里的操作数：库越大测得越少，保证 1M 行也能在几分钟内跑完
+MAX_OPS = 1_000
+WRITE_OPS = 50
+
+
+def op_count(size, cap, floor):
+    """Operations per timed run for a dataset of size rows"""
+    return max(floor, min(cap, cap * 1_000 // max(size, 1)))
+
+
+def make_reference(size, rng):
+    """size reference rows (SKU_FIELDS without SKU and Brand) with unique descriptions"""
+    return [
+        {
+            "Item Description": f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+            "Commodity Code": f"{rng.randrange(10**7, 10**8)}",
+            "Weight": f"{rng.randint(1, 30) / 10}",
+            "Origin Country": rng.choice(["IT", "FR", "CN", "GB"]),
+        }
+        for i in range(size)
+    ]
+
+
+def make_orders(size, reference, rng, match_rate=0.7):
+    """Order rows: about match_rate of them repeat a reference description, the rest are new"""
+    rows = []
+    for i in range(size):
+        if rng.random() < match_rate:
+            description = rng.choice(reference)["Item Description"]
+        else:
+            description = f"{rng.choice(BRANDS)} {rng.choice(NOUNS)} NEW {i}"
+        rows.append((description, rng.randint(5, 500)))
+    return rows
+
+
+def write_csv(path, fieldnames, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        writer.writerows(rows)
+
+
+class Dataset:
+    """Synthetic SKU database + order file of one size in a temporary directory"""
+
+    def __init__(self, size, backend, seed=42):
+        rng = random.Random(seed)
+        self.size = size
+        self.dir = tempfile.mkdtemp(prefix=f"dhl_bench_{size}_")
+        self.reference = make_reference(size, rng)
+        self.memory = make_records(size, rng)
+        self.orders = make_orders(size, self.reference, rng)
+        self.write_ops = op_count(size, WRITE_OPS, 3)
+        queries = op_count(size, MAX_OPS, 50)
+        # 一半命中一半不命中
+        self.queries = [rng.choice(self.reference)["Item Description"] for _ in range(queries // 2)]
+        self.queries += [f"UNKNOWN ITEM {i}" for i in range(queries - len(self.queries))]
+        rng.shuffle(self.queries)
+        self.memory_queries = [
+            ("NOSKU", rng.choice(BRANDS), f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randrange(size)}")
+            for _ in range(queries)
+        ]
+
+        self.reference_path = os.path.join(self.dir, "sku_reference_data.csv")
+        self.memory_path = os.path.join(self.dir, "sku_memory_db.csv")
+        self.orders_path = os.path.join(self.dir, "orders.csv")
+        write_csv(self.reference_path, SKU_FIELDS, ([r.get(f, "") for f in SKU_FIELDS] for r in self.reference))
+        write_csv(self.memory_path, SKU_FIELDS, ([r[f] for f in SKU_FIELDS] for r in self.memory))
+        write_csv(self.orders_path, ["Item Description", "Selling Price"], self.orders)
+
+        # 基准结束后恢复，避免影响同一进程里的其他代码
+        self._saved = {name: os.environ.get(name) for name in (BACKEND_ENV, SQLITE_PATH_ENV)}
+        self._saved_db = utils.SKU_DB
+        os.environ[BACKEND_ENV] = backend
+        if backend == "sqlite":
+            from sku_sqlite import import_csv
+            os.environ[SQLITE_PATH_ENV] = os.path.join(self.dir, "sku.sqlite3")
+            import_csv(os.environ[SQLITE_PATH_ENV], self.reference_path, self.memory_path)
+        self._writes = 0
+
+    def use(self, path):
+        """Point utils (and so get_backend) at one of the dataset's CSV files"""
+        utils.SKU_DB = path
+        return get_backend(path)
+
+    def new_records(self, n):
+        """n reference records that are not in the database yet"""
+        start, self._writes = self._writes, self._writes + n
+        return [
+            {"Item Description": f"BENCH WRITE {i}", "Commodity Code": "42022100", "Weight": "0.5",
+             "Origin Country": "IT"}
+            for i in range(start, start + n)
+        ]
+
+    def cleanup(self):
+        for name, value in self._saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        utils.SKU_DB = self._saved_db
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+# 每个基准：setup(dataset) -> (每次计时要调用的函数, 函数里包含的操作数)
+
+def bench_exact_match_lookup(data):
+    data.use(data.reference_path).reference_records()  # 先加载，只测查询
+
+    def run():
+        for description in data.queries:
+            utils.exact_match_lookup(description)
+    return run, len(data.queries)
+
+
+def bench_find_best_match(data):
+    memory = SkuMemory(data.memory)
+
+    def run():
+        for sku, brand, description in data.memory_queries:
+            utils.find_best_match(sku, brand, description, memory)
+    return run, len(data.memory_queries)
+
+
+def bench_get_memory_values(data):
+    data.use(data.memory_path).memory_index()
+
+    def run():
+        for sku, brand, description in data.memory_queries:
+            utils.get_memory_values(sku, brand, description)
+    return run, len(data.memory_queries)
+
+
+def bench_append_sku_record(data):
+    data.use(data.reference_path).reference_records()
+
+    def run():
+        for record in data.new_records(data.write_ops):
+            utils.append_sku_record(record["Item Description"], record["Commodity Code"], record["Weight"],
+                                    record["Origin Country"])
+    return run, data.write_ops
+
+
+def bench_save_sku_memory(data):
+    data.use(data.memory_path).memory_index()
+
+    def run():
+        for record in data.new_records(data.write_ops):
+            utils.save_sku_memory(f"SKU-{record['Item Description']}", "BENCH", record["Item Description"],
+                                  record["Commodity Code"], record["Weight"], record["Origin Country"])
+    return run, data.write_ops
+
+
+def bench_save_then_get_memory_values(data):
+    """A memory write followed by a memory read, as when a saved row is matched again"""
+    data.use(data.memory_path).memory_index()  # 先建好索引，测的是写入后的更新
+
+    def run():
+        for record in data.new_records(data.write_ops):
+            sku = f"SKU-{record['Item Description']}"
+            utils.save_sku_memory(sku, "BENCH", record["Item Description"],
+                                  record["Commodity Code"], record["Weight"], record["Origin Country"])
+            utils.get_memory_values(sku, "BENCH", record["Item Description"])
+    return run, data.write_ops
+
+
+def bench_format_commodity_code(data):
+    codes = [record["Commodity Code"] for record in data.reference]
+
+    def run():
+        _format_code.cache_clear()  # 测的是未命中缓存的格式化
+        for code in codes:
+            format_commodity_code(code)
+    return run, len(codes)
+
+
+def bench_cold_start(data):
+    """A new process opening both CSV stores, ready to match (from their snapshots)"""
+    # 先并掉前面写基准留下的 journal，快照才覆盖全部数据
+    for path in (data.reference_path, data.memory_path):
+        SkuStore(path).compact()
+        SkuStore(path).refresh().memory
+
+    def run():
+        SkuStore(data.reference_path).refresh()
+        SkuStore(data.memory_path).refresh().memory
+    return run, 1
+
+
+def bench_pipeline(data):
+    """Upload to DHL: parse + match the order file, then export every row"""
+    backend = data.use(data.reference_path)
+    backend.reference_records()
+
+    def run():
+        with open(data.orders_path, "rb") as f:
+            df, _, errors = match_order_files([("orders.csv", f)], backend)
+        assert not errors and len(df) == data.size
+        export_dhl(df)
+    return run, data.size
+
+
+BENCHMARKS = {
+    "exact_match_lookup": bench_exact_match_lookup,
+    "find_best_match": bench_find_best_match,
+    "get_memory_values": bench_get_memory_values,
+    "append_sku_record": bench_append_sku_record,
+    "save_sku_memory": bench_save_sku_memory,
+    "save_then_get_memory_values": bench_save_then_get_memory_values,
+    "format_commodity_code": bench_format_commodity_code,
+    "cold_start": bench_cold_start,
+    "pipeline": bench_pipeline,
+}
+
+
+def time_benchmark(setup, data, repeat):
+    fn, ops = setup(data)
+    fn()  # 预热
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) / ops)
+    return {
+        "ops": ops, "repeat": repeat,
+        "min": min(times), "median": statistics.median(times), "mean": statistics.mean(times),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(sizes, names, repeat, backend="csv", log=print):
+    """Run the named benchmarks at every size; returns the results document"""
+    results = []
+    for size in sizes:
+        data = Dataset(size, backend)
+        try:
+            for name in names:
+                result = {"name": name, "size": size, **time_benchmark(BENCHMARKS[name], data, repeat)}
+                results.append(result)
+                log(f"{name:<22} {size:>9,} rows | median {result['median'] * 1e6:11.2f} µs/op | "
+                    f"min {result['min'] * 1e6:11.2f} µs/op")
+        finally:
+            data.cleanup()
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "backend": backend,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """[(name, size, old_median, new_median, ratio, regressed)] for benchmarks present in both runs"""
+    old = {(r["name"], r["size"]): r["median"] for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        key = (r["name"], r["size"])
+        if key in old:
+            ratio = r["median"] / old[key] if old[key] else float("inf")
+            rows.append((r["name"], r["size"], old[key], r["median"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(document, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = document["meta"]["timestamp"].replace(":", "").replace("-", "")
+        path = os.path.join(RESULTS_DIR, f"{stamp}_{document['meta']['revision']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (after one warm-up)")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<time>_<rev>.json)")
+    parser.add_argument("--load", help="compare this saved results file instead of running the suite")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="median slowdown counted as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.load:
+        current = load_results(args.load)
+    else:
+        print("🏁 DHL CSV Generator benchmark suite")
+        print("=" * 50)
+        current = run_suite(args.sizes, args.only, args.repeat, args.backend)
+        print(f"\n💾 Results saved to {save_results(current, args.output)}")
+
+    if not args.baseline:
+        return 0
+    rows = compare(load_results(args.baseline), current, args.threshold)
+    print(f"\n📊 Compared with {args.baseline}:")
+    for name, size, old, new, ratio, regressed in rows:
+        flag = "❌ REGRESSION" if regressed else ("✅ faster" if ratio < 1 - args.threshold else "")
+        print(f"{name:<22} {size:>9,} rows | {old * 1e6:11.2f} -> {new * 1e6:11.2f} µs/op | {ratio:5.2f}x {flag}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
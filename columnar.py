@@ -0,0 +1,372 @@
+"""
+Compact columnar storage for SKU records: string buffers, interned columns and hash indexes
+
+Every structure can be dumped to and rebuilt from a flat {name: ndarray}
+dict (to_arrays / from_arrays), which is what snapshot.py writes to disk
+and memory-maps back.
+"""
+
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+
+def _text(value):
+    return "" if value is None else value if isinstance(value, str) else str(value)
+
+
+# 2^63 以下最大的素数
+HASH_MODULUS = 9223372036854775783
+
+
+def key_hash(key):
+    """Stable 63-bit hash of a str key: its UTF-8 bytes as an integer mod a prime
+
+    Unlike hash() it is the same in every process, so hashes can be saved
+    in a snapshot.
+    """
+    return int.from_bytes(key.encode("utf-8"), "little") % HASH_MODULUS
+
+
+def _offsets(lengths, count):
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(lengths, dtype=np.int64, count=count), out=offsets[1:])
+    return offsets
+
+
+class StringColumn:
+    """Many distinct strings in one contiguous UTF-8 buffer with int64 byte offsets
+
+    The buffer is bytes, or a memoryview into a memory-mapped snapshot.
+    """
+
+    def __init__(self, values=(), buffer=None, offsets=None):
+        if offsets is not None:
+            self.buffer = buffer
+            self.offsets = offsets
+            return
+        values = values if isinstance(values, list) else list(values)
+        text = "".join(values)
+        if text.isascii():
+            # 纯 ASCII：字符长度即字节长度，不必逐个编码
+            self.buffer = text.encode("ascii")
+            self.offsets = _offsets(map(len, values), len(values))
+        else:
+            encoded = [value.encode("utf-8") for value in values]
+            self.buffer = b"".join(encoded)
+            self.offsets = _offsets(map(len, encoded), len(encoded))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        offsets = self.offsets
+        return str(self.buffer[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        buffer = self.buffer
+        bounds = self.offsets.tolist()
+        text = str(buffer, "utf-8")
+        if len(text) == len(buffer):
+            return (text[start:end] for start, end in zip(bounds, bounds[1:]))
+        return (str(buffer[start:end], "utf-8") for start, end in zip(bounds, bounds[1:]))
+
+    def to_arrays(self, prefix):
+        return {
+            f"{prefix}.buffer": np.frombuffer(self.buffer, dtype=np.uint8),
+            f"{prefix}.offsets": self.offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(buffer=memoryview(arrays[f"{prefix}.buffer"]), offsets=arrays[f"{prefix}.offsets"])
+
+    @property
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.nbytes
+
+
+class InternedColumn:
+    """Repetitive strings (brands, countries, codes, weights): each distinct value stored once, rows hold uint32 codes"""
+
+    def __init__(self, values=(), codes=None):
+        if codes is not None:
+            self.values = values
+            self.codes = codes
+            return
+        codes_of = {}
+        codes = [codes_of.setdefault(value, len(codes_of)) for value in values]
+        self.values = StringColumn(list(codes_of))
+        self.codes = np.array(codes, dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        return map(list(self.values).__getitem__, self.codes.tolist())
+
+    def to_arrays(self, prefix):
+        return {f"{prefix}.codes": self.codes, **self.values.to_arrays(f"{prefix}.values")}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(StringColumn.from_arrays(arrays, f"{prefix}.values"), arrays[f"{prefix}.codes"])
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.values.nbytes
+
+
+class RecordView(Mapping):
+    """Read-only dict-like view of one row of a ColumnarTable"""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, field):
+        return self._table.columns[field][self._row]
+
+    def __iter__(self):
+        return iter(self._table.fieldnames)
+
+    def __len__(self):
+        return len(self._table.fieldnames)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarTable(Sequence):
+    """Rows of string fields stored column by column, read back as RecordView mappings
+
+    The loaded rows are immutable columns; rows replaced or appended later
+    (journal updates) are kept as plain dicts on top until packed().
+    copy() shares the columns, so publishing a new version after an update
+    costs only the size of those changes.
+    """
+
+    def __init__(self, fieldnames, columns, overlay=None, extra=None):
+        self.fieldnames = list(fieldnames)
+        self.columns = columns
+        self._base = len(columns[self.fieldnames[0]]) if self.fieldnames else 0
+        self._overlay = overlay or {}
+        self._extra = extra or []
+
+    @classmethod
+    def from_rows(cls, fieldnames, rows, interned=()):
+        """Build from an iterable of value lists in fieldnames order"""
+        rows = rows if isinstance(rows, list) else list(rows)
+        values = list(zip(*rows)) if rows else [()] * len(fieldnames)
+        columns = {
+            field: (InternedColumn if field in interned else StringColumn)(list(column))
+            for field, column in zip(fieldnames, values)
+        }
+        return cls(fieldnames, columns)
+
+    @classmethod
+    def from_records(cls, fieldnames, records, interned=()):
+        """Build from record mappings; missing fields and None become ''"""
+        return cls.from_rows(
+            fieldnames, [[_text(record.get(field)) for field in fieldnames] for record in records], interned
+        )
+
+    def __len__(self):
+        return self._base + len(self._extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i >= self._base:
+            return self._extra[i - self._base]
+        if i < 0:
+            raise IndexError("row index out of range")
+        record = self._overlay.get(i)
+        return record if record is not None else RecordView(self, i)
+
+    def __iter__(self):
+        overlay = self._overlay
+        for row in range(self._base):
+            record = overlay.get(row)
+            yield record if record is not None else RecordView(self, row)
+        yield from self._extra
+
+    def __setitem__(self, i, record):
+        if i < 0:
+            i += len(self)
+        if i >= self._base:
+            self._extra[i - self._base] = record
+        else:
+            self._overlay[i] = record
+
+    def append(self, record):
+        self._extra.append(record)
+
+    def copy(self):
+        return ColumnarTable(self.fieldnames, self.columns, dict(self._overlay), list(self._extra))
+
+    def column(self, field):
+        """All values of one field, in row order"""
+        values = list(self.columns[field])
+        for row, record in self._overlay.items():
+            values[row] = record[field]
+        values.extend(record[field] for record in self._extra)
+        return values
+
+    def iter_rows(self):
+        """Value lists in fieldnames order, e.g. for csv.writer"""
+        fieldnames = self.fieldnames
+        overlay = self._overlay
+        for row, values in enumerate(zip(*(self.columns[field] for field in fieldnames))):
+            record = overlay.get(row)
+            yield [record[field] for field in fieldnames] if record is not None else list(values)
+        for record in self._extra:
+            yield [record[field] for field in fieldnames]
+
+    def packed(self):
+        """The same rows with every overlay/appended dict folded back into the columns"""
+        if not self._overlay and not self._extra:
+            return self
+        interned = {field for field, column in self.columns.items() if isinstance(column, InternedColumn)}
+        return ColumnarTable.from_rows(self.fieldnames, list(self.iter_rows()), interned)
+
+    def to_arrays(self, prefix):
+        """The columns as flat arrays; only valid for a packed table"""
+        if self._overlay or self._extra:
+            raise ValueError("pack() the table before saving it")
+        arrays = {}
+        for i, field in enumerate(self.fieldnames):
+            arrays.update(self.columns[field].to_arrays(f"{prefix}.{i}"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, fieldnames):
+        columns = {}
+        for i, field in enumerate(fieldnames):
+            column = InternedColumn if f"{prefix}.{i}.codes" in arrays else StringColumn
+            columns[field] = column.from_arrays(arrays, f"{prefix}.{i}")
+        return cls(fieldnames, columns)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns (the overlay is not counted)"""
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class HashIndex:
+    """str key -> row number for many keys, as sorted 64-bit hashes instead of a dict
+
+    Every hit is checked against the real key, so hash collisions never
+    return a wrong row: the keys are kept in one StringColumn, or, when
+    key_of(row) can recompute a row's key, not stored at all. With
+    duplicate keys the smallest row wins. Keys added after construction go
+    to a small dict.
+    """
+
+    def __init__(self, keys=(), rows=None, key_of=None):
+        keys = keys if isinstance(keys, list) else list(keys)
+        rows = np.arange(len(keys), dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+        hashes = np.fromiter(map(key_hash, keys), dtype=np.int64, count=len(keys))
+        order = np.lexsort((rows, hashes))
+        self.hashes = hashes[order]
+        self.rows = rows[order]
+        self.key_of = key_of
+        self.keys = None if key_of else StringColumn([keys[i] for i in order.tolist()])
+        self._added = {}
+
+    def to_arrays(self, prefix):
+        """The sorted arrays (and keys); keys added later are not included, pack() first"""
+        if self._added:
+            raise ValueError("pack() the index before saving it")
+        arrays = {f"{prefix}.hashes": self.hashes, f"{prefix}.rows": self.rows}
+        if self.keys is not None:
+            arrays.update(self.keys.to_arrays(f"{prefix}.keys"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, key_of=None):
+        index = cls.__new__(cls)
+        index.hashes = arrays[f"{prefix}.hashes"]
+        index.rows = arrays[f"{prefix}.rows"]
+        index.key_of = key_of
+        index.keys = None if key_of else StringColumn.from_arrays(arrays, f"{prefix}.keys")
+        index._added = {}
+        return index
+
+    def _key(self, i):
+        return self.keys[i] if self.key_of is None else self.key_of(int(self.rows[i]))
+
+    def _find(self, key, h, i):
+        hashes = self.hashes
+        while i < len(hashes) and hashes[i] == h:
+            if self._key(i) == key:
+                return int(self.rows[i])
+            i += 1
+        return None
+
+    def get(self, key, default=None):
+        row = self._added.get(key)
+        if row is None:
+            h = key_hash(key)
+            row = self._find(key, h, int(np.searchsorted(self.hashes, h)))
+        return default if row is None else row
+
+    def get_many(self, keys):
+        """{key: row} for the keys that are present, with one vectorized search"""
+        keys = list(keys)
+        found = {}
+        if len(self.hashes) and keys:
+            query = np.fromiter(map(key_hash, keys), dtype=np.int64, count=len(keys))
+            for key, h, i in zip(keys, query.tolist(), np.searchsorted(self.hashes, query).tolist()):
+                row = self._find(key, h, i)
+                if row is not None:
+                    found[key] = row
+        for key in keys:
+            row = self._added.get(key)
+            if row is not None:
+                found[key] = row
+        return found
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, row):
+        self._added[key] = row
+
+    def __len__(self):
+        return len(self.hashes) + len(self._added)
+
+    def items(self):
+        """(key, row) pairs, one per distinct key"""
+        merged = {}
+        for i in range(len(self.hashes)):
+            merged.setdefault(self._key(i), int(self.rows[i]))
+        merged.update(self._added)
+        return merged.items()
+
+    def copy(self, key_of=None):
+        """A new index sharing the sorted arrays, with its own added keys (and key_of, if given)"""
+        index = HashIndex.__new__(HashIndex)
+        index.hashes, index.rows, index.keys = self.hashes, self.rows, self.keys
+        index.key_of = self.key_of if key_of is None else key_of
+        index._added = dict(self._added)
+        return index
+
+    def packed(self):
+        """A new index with the added keys merged into the sorted arrays"""
+        if not self._added:
+            return self
+        merged = dict(self.items())
+        return HashIndex(list(merged), list(merged.values()), self.key_of)
+
+    @property
+    def nbytes(self):
+        keys = 0 if self.keys is None else self.keys.nbytes
+        return self.hashes.nbytes + self.rows.nbytes + keys
@@ -0,0 +1,190 @@
+"""
+Streaming DHL CSV export: rows go straight into the output, split into parts at a row limit
+"""
+
+import csv
+import io
+import math
+import os
+import zipfile
+from functools import lru_cache
+
+DHL_COLUMNS = [
+    "Unique Item Number", "Item", "Item Description", "Commodity Code", "Quantity",
+    "Units", "Value", "Currency", "Weight", "Weight 2", "Country of Origin",
+    "Reference Type", "Reference Details", "Tax Paid"
+]
+DEFAULT_FILE_NAME = "DHL_ready_file.csv"
+
+
+@lru_cache(maxsize=65536)
+def _format_code(code):
+    digits = ''.join(filter(str.isdigit, code))
+    if len(digits) < 4:
+        return digits
+    result = digits[:4]
+    for i in range(4, len(digits), 2):
+        result += '.' + digits[i:i+2]
+    return result
+
+
+def format_commodity_code(code):
+    """Format a commodity code as xxxx.xx.xx...; results are cached per distinct code"""
+    return _format_code(str(code))
+
+
+def _cell(value):
+    # 与 DataFrame.to_csv 一致：None / NaN 写成空
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+def part_name(file_name, index):
+    """DHL_ready_file.csv -> DHL_ready_file_part2.csv"""
+    stem, ext = os.path.splitext(file_name)
+    return f"{stem}_part{index}{ext}"
+
+
+class DHLExporter:
+    """Write DHL rows one by one, starting a new part every max_rows rows
+
+    Without a directory the parts are kept in memory (see .parts); with a
+    directory each part is written to a file there. max_rows=None means a
+    single file named file_name; otherwise parts are named
+    <stem>_part1.csv, <stem>_part2.csv, ...
+    """
+
+    def __init__(self, directory=None, file_name=DEFAULT_FILE_NAME, max_rows=None, header=False):
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows must be a positive number of rows")
+        self.directory = directory
+        self.file_name = file_name
+        self.max_rows = max_rows
+        self.header = header
+        self.row_count = 0
+        self._names = []
+        self._files = []
+        self._file = None
+        self._writer = None
+        self._part_rows = 0
+
+    def _open_part(self):
+        self._close_part()
+        index = len(self._names) + 1
+        name = self.file_name if self.max_rows is None else part_name(self.file_name, index)
+        if self.directory is None:
+            f = io.StringIO()
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(os.path.join(self.directory, name), "w", newline="", encoding="utf-8")
+        self._names.append(name)
+        self._files.append(f)
+        self._file = f
+        self._writer = csv.writer(f, lineterminator="\n")
+        self._part_rows = 0
+        if self.header:
+            self._writer.writerow(DHL_COLUMNS)
+
+    def _close_part(self):
+        if self._file is not None and self.directory is not None:
+            self._file.close()
+        self._file = self._writer = None
+
+    def write_row(self, description, commodity_code, value, weight, origin_country):
+        """Write one item line in DHL's 14-column layout"""
+        if self._writer is None or (self.max_rows is not None and self._part_rows >= self.max_rows):
+            self._open_part()
+        self._writer.writerow([
+            1,  # Unique Item Number 固定为1
+            "INV_ITEM",  # Item
+            _cell(description),
+            format_commodity_code(_cell(commodity_code)),
+            1,  # Quantity
+            "PCS",  # Units
+            _cell(value),
+            "GBP",  # Currency
+            _cell(weight),
+            "",  # Weight 2
+            _cell(origin_country),
+            "", "", ""  # Reference Type, Details, Tax Paid
+        ])
+        self._part_rows += 1
+        self.row_count += 1
+
+    def write_frame(self, df):
+        """Write every row of an edited order DataFrame (columns as in matching.RESULT_COLUMNS)"""
+        # 按列 zip 迭代，避免 iterrows 为每行构造 Series
+        for row in zip(
+            df["Item Description"], df["Commodity Code"], df["Selling Price"],
+            df["Weight"], df["Origin Country"],
+        ):
+            self.write_row(*row)
+        return self
+
+    def close(self):
+        """Finish the current part; an export with no rows still produces one (empty) file"""
+        if not self._names:
+            self._open_part()
+        self._close_part()
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    @property
+    def paths(self):
+        """Paths of the written parts (directory mode only)"""
+        return [os.path.join(self.directory, name) for name in self._names]
+
+    @property
+    def parts(self):
+        """[(file_name, csv_text)] for each part (in-memory mode only)"""
+        return [(name, f.getvalue()) for name, f in zip(self._names, self._files)]
+
+
+def export_dhl(df, max_rows=None, file_name=DEFAULT_FILE_NAME):
+    """In-memory DHL export of an edited order DataFrame; returns [(file_name, csv_text)]"""
+    with DHLExporter(file_name=file_name, max_rows=max_rows) as exporter:
+        exporter.write_frame(df)
+    return exporter.parts
+
+
+def output_names(sources):
+    """<stem>_DHL.csv per source file name, numbered when two sources share a stem"""
+    names, seen = [], {}
+    for source in sources:
+        stem = os.path.splitext(os.path.basename(str(source)))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(f"{stem}_DHL.csv" if seen[stem] == 1 else f"{stem}_{seen[stem]}_DHL.csv")
+    return names
+
+
+def export_dhl_by_source(df, source_column="Source File", upload_column="Upload", max_rows=None):
+    """One DHL export per uploaded file in df; returns [(file_name, csv_text)] over all parts
+
+    Rows are grouped by upload_column (see matching.match_order_files), so
+    two uploads with the same file name still get separate exports; the
+    source file name only names them.
+    """
+    parts = []
+    groups = [group for _, group in df.groupby(upload_column, sort=False)]
+    for group, name in zip(groups, output_names(group[source_column].iloc[0] for group in groups)):
+        parts.extend(export_dhl(group, max_rows=max_rows, file_name=name))
+    return parts
+
+
+def zip_parts(parts):
+    """Pack [(file_name, csv_text)] into the bytes of a zip archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, text in parts:
+            archive.writestr(name, text)
+    return buffer.getvalue()
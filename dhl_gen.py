@@ -0,0 +1,154 @@
+"""
+Headless batch mode: order files in, DHL-ready CSVs and an unmatched-items report out
+
+    python dhl_gen.py orders/*.csv incoming/ [--out dhl_out] [--workers 4] [--max-rows 999]
+
+Each input (file, directory or glob) goes through the same pipeline as the
+app: streaming ingestion, exact match against the SKU database, optional
+tariff code fill for unmatched rows, then the DHL export. Files are
+processed in parallel in a process pool.
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import utils
+from dhl_export import DHLExporter, output_names
+from ingest import iter_order_batches
+from matching import match_order_batches
+from sku_store import get_backend
+from tariff_cache import TokenBucket
+
+ORDER_EXTENSIONS = (".csv", ".xlsx", ".xls")
+REPORT_NAME = "unmatched_items.csv"
+REPORT_FIELDS = ["Source File", "Row", "Item Description", "Selling Price", "Suggested Commodity Code"]
+
+
+def expand_inputs(inputs):
+    """Order file paths for a mix of files, directories and glob patterns, without duplicates"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(
+                os.path.join(item, name) for name in os.listdir(item)
+                if name.lower().endswith(ORDER_EXTENSIONS)
+            )
+        elif os.path.exists(item):
+            matches = [item]
+        else:
+            matches = sorted(glob.glob(item))
+        paths.extend(m for m in matches if os.path.isfile(m))
+    return list(dict.fromkeys(paths))
+
+
+def _init_worker(tariff_rate):
+    # 每个进程各有一个令牌桶，按进程数平分总速率，整体仍不超过 API 限制
+    utils.tariff_rate_limiter = TokenBucket(rate=tariff_rate, capacity=max(1.0, tariff_rate))
+
+
+def _with_lines(batches, lines):
+    """Pass batches through, collecting each batch's source line numbers into lines"""
+    for batch in batches:
+        lines.append(batch.index.tolist())
+        yield batch
+
+
+def process_order_file(path, out_dir, out_name, db_path, max_rows=None, fill_tariff=False, matched_only=False):
+    """Run one order file through match + fill + export; returns a summary dict
+
+    Failures are returned as {"error": ...} instead of raised, so one bad
+    file does not stop the batch.
+    """
+    try:
+        lines = []
+        df, matched_count, unmatched_count = match_order_batches(
+            _with_lines(iter_order_batches(path), lines), get_backend(db_path)
+        )
+        lines = [line for batch_lines in lines for line in batch_lines]
+        unmatched = ~df["is_matched"]
+        if fill_tariff and unmatched.any():
+            codes = utils.query_uk_tariff_api_batch(df.loc[unmatched, "Item Description"].unique().tolist())
+            df.loc[unmatched, "Commodity Code"] = df.loc[unmatched, "Item Description"].map(codes).fillna("")
+
+        with DHLExporter(directory=out_dir, file_name=out_name, max_rows=max_rows) as exporter:
+            exporter.write_frame(df[df["is_matched"]] if matched_only else df)
+
+        rows = df.loc[unmatched]
+        report = [
+            [path, lines[i], description, price, code]  # 源文件里的行号，跳过的空行不影响
+            for i, description, price, code in zip(
+                rows.index, rows["Item Description"], rows["Selling Price"], rows["Commodity Code"]
+            )
+        ]
+        return {
+            "path": path, "outputs": exporter.paths, "rows": len(df),
+            "matched": matched_count, "unmatched": unmatched_count, "report": report,
+        }
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_batch(paths, out_dir, db_path=utils.SKU_DB, workers=None, max_rows=None,
+              fill_tariff=False, matched_only=False):
+    """Process all paths, write the unmatched report; returns the per-file summaries in input order"""
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    jobs = [
+        (path, out_dir, name, db_path, max_rows, fill_tariff, matched_only)
+        for path, name in zip(paths, output_names(paths))
+    ]
+    if workers == 1:
+        results = [process_order_file(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(utils.tariff_rate_limiter.rate / workers,)
+        ) as pool:
+            results = list(pool.map(process_order_file, *zip(*jobs)))
+
+    with open(os.path.join(out_dir, REPORT_NAME), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_FIELDS)
+        for result in results:
+            writer.writerows(result.get("report", []))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dhl-gen", description="Generate DHL-ready CSV files from order files")
+    parser.add_argument("inputs", nargs="+", help="order files (CSV/Excel), directories or glob patterns")
+    parser.add_argument("--out", default="dhl_out", help="output directory")
+    parser.add_argument("--db", default=utils.SKU_DB, help="SKU reference database (SKU_BACKEND=sqlite is honoured)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-rows", type=int, default=None, help="split each DHL file after this many rows")
+    parser.add_argument("--fill-tariff", action="store_true",
+                        help="fill unmatched rows' commodity codes from the tariff index / UK Tariff API")
+    parser.add_argument("--matched-only", action="store_true", help="leave unmatched rows out of the DHL files")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("❌ No order files found", file=sys.stderr)
+        return 2
+
+    results = run_batch(
+        paths, args.out, db_path=args.db, workers=args.workers, max_rows=args.max_rows,
+        fill_tariff=args.fill_tariff, matched_only=args.matched_only,
+    )
+    failed = 0
+    for result in results:
+        if "error" in result:
+            failed += 1
+            print(f"❌ {result['path']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"✅ {result['path']}: {result['rows']} rows, {result['matched']} matched, "
+                  f"{result['unmatched']} unmatched -> {', '.join(result['outputs'])}")
+    print(f"📋 Unmatched items report: {os.path.join(args.out, REPORT_NAME)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
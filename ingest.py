@@ -0,0 +1,153 @@
+"""
+Streaming ingestion of order files: only the two needed columns, in batches
+"""
+
+import os
+
+import pandas as pd
+
+ORDER_COLUMNS = ["Item Description", "Selling Price"]
+DEFAULT_BATCH_SIZE = 50_000
+LINE_INDEX = "Line"
+
+
+class MissingColumnsError(ValueError):
+    """The order file lacks an Item Description or Selling Price column"""
+
+
+def _find_columns(header):
+    # 与原来一致：表头忽略大小写和首尾空格
+    col_map = {str(c).lower().strip(): c for c in header if c is not None}
+    desc_col = col_map.get("item description")
+    price_col = col_map.get("selling price")
+    if desc_col is None or price_col is None:
+        raise MissingColumnsError("请确保文件包含 'Item Description' 和 'Selling Price' 两列！")
+    return desc_col, price_col
+
+
+def _to_batch(descriptions, prices, lines):
+    """Build one batch with explicit dtypes: descriptions as str, prices numeric where possible
+
+    lines are the rows' line numbers in the source file (header = line 1)
+    and become the batch's index.
+    """
+    index = pd.Index(lines, name=LINE_INDEX)
+    descriptions = pd.Series(descriptions, index=index, dtype=object)
+    prices = pd.Series(prices, index=index, dtype=object)
+    numeric = pd.to_numeric(prices, errors="coerce")
+    # 无法转换成数字的价格保留原值，避免静默丢数据
+    prices = numeric.where(numeric.notna() | prices.isna(), prices)
+    return pd.DataFrame({"Item Description": descriptions, "Selling Price": prices})
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _leading_blank_lines(source):
+    """Number of blank lines before the CSV header"""
+    f = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        count = 0
+        for line in f:
+            if line.strip():
+                break
+            count += 1
+        return count
+    finally:
+        if f is not source:
+            f.close()
+        _rewind(source)
+
+
+def iter_csv_batches(source, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield batches from a CSV path or file object, parsing only the two order columns
+
+    Rows with neither a description nor a price (e.g. blank lines) are
+    skipped; the index keeps each row's line number in the file. A quoted
+    value spanning several lines counts as one line.
+    """
+    header = pd.read_csv(source, nrows=0).columns
+    _rewind(source)
+    desc_col, price_col = _find_columns(header)
+    header_line = _leading_blank_lines(source) + 1
+    # 空行保留下来再丢掉，行号才与文件一致
+    reader = pd.read_csv(
+        source,
+        usecols=[desc_col, price_col],
+        dtype={desc_col: str, price_col: str},
+        chunksize=batch_size,
+        skiprows=header_line - 1,
+        skip_blank_lines=False,
+    )
+    for chunk in reader:
+        chunk = chunk[chunk[desc_col].notna() | chunk[price_col].notna()]
+        if len(chunk):
+            yield _to_batch(chunk[desc_col].to_numpy(), chunk[price_col].to_numpy(), chunk.index + header_line + 1)
+
+
+def iter_xlsx_batches(source, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield batches from the first sheet of an .xlsx using openpyxl's read-only row iterator"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        desc_col, price_col = _find_columns(header)
+        header = list(header)
+        desc_idx, price_idx = header.index(desc_col), header.index(price_col)
+
+        descriptions, prices, lines = [], [], []
+        # 只读模式从表格实际使用的第一行开始迭代
+        for line, row in enumerate(rows, start=(sheet.min_row or 1) + 1):
+            if row is None or all(value is None for value in row):
+                continue
+            descriptions.append(row[desc_idx] if desc_idx < len(row) else None)
+            prices.append(row[price_idx] if price_idx < len(row) else None)
+            lines.append(line)
+            if len(descriptions) >= batch_size:
+                yield _to_batch(descriptions, prices, lines)
+                descriptions, prices, lines = [], [], []
+        if descriptions:
+            yield _to_batch(descriptions, prices, lines)
+    finally:
+        workbook.close()
+
+
+def iter_xls_batches(source, batch_size=DEFAULT_BATCH_SIZE):
+    """Legacy .xls has no streaming reader; load only the two columns, then batch"""
+    df = pd.read_excel(source, usecols=lambda c: str(c).lower().strip() in ("item description", "selling price"))
+    desc_col, price_col = _find_columns(df.columns)
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size]
+        # 表头占第 1 行
+        yield _to_batch(chunk[desc_col].to_numpy(), chunk[price_col].to_numpy(), chunk.index + 2)
+
+
+def iter_order_batches(source, filename=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield DataFrames with columns ["Item Description", "Selling Price"] from an order file
+
+    Each batch is indexed by the rows' line numbers in the source file
+    (header = line 1), so skipped empty rows do not shift them.
+
+    source is a path or a file object (e.g. a Streamlit upload); filename
+    picks the format when source is not a path. Raises MissingColumnsError
+    when either column is missing.
+    """
+    name = (filename or str(source)).lower()
+    if name.endswith("csv"):
+        return iter_csv_batches(source, batch_size)
+    if name.endswith("xls"):
+        return iter_xls_batches(source, batch_size)
+    return iter_xlsx_batches(source, batch_size)
+
+
+def read_orders(source, filename=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Whole order file as one two-column DataFrame"""
+    batches = list(iter_order_batches(source, filename, batch_size))
+    if not batches:
+        return pd.DataFrame(columns=ORDER_COLUMNS)
+    return pd.concat(batches, ignore_index=True)
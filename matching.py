@@ -0,0 +1,110 @@
+"""
+Vectorized matching of order DataFrames against the SKU store
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from ingest import iter_order_batches
+from metrics import incr, stage
+from sku_store import description_key
+
+MATCH_FIELDS = ["Commodity Code", "Weight", "Origin Country"]
+RESULT_COLUMNS = ["Item Description", "Selling Price", "Weight", "Origin Country", "Commodity Code", "is_matched"]
+SOURCE_COLUMN = "Source File"
+# 上传文件的序号：同名的两个文件也能分开
+UPLOAD_COLUMN = "Upload"
+
+
+def reference_frame(store, keys):
+    """Reference rows for the given normalized keys, fetched in one batch from the store"""
+    found = store.lookup_many(keys)
+    frame = pd.DataFrame.from_records(list(found.values()), columns=MATCH_FIELDS)
+    frame.insert(0, "_key", pd.Series(list(found.keys()), dtype=object))
+    return frame
+
+
+def match_orders(df, store):
+    """Match every order row in one merge; returns (result_df, matched_count, unmatched_count)
+
+    store is any SKU backend (see sku_store.get_backend); only the distinct
+    descriptions of the order are looked up.
+    """
+    with stage("match_orders", rows=len(df)):
+        return _match_orders(df, store)
+
+
+def _match_orders(df, store):
+    descriptions = df["Item Description"].astype(str).str.strip()
+    # 每个不同的描述只规范化一次
+    keys = {description: description_key(description) for description in descriptions.unique()}
+    orders = pd.DataFrame({
+        "Item Description": descriptions.to_numpy(),
+        "Selling Price": df["Selling Price"].to_numpy(),
+        "_key": descriptions.map(keys).to_numpy(),
+    })
+
+    # 参考表的 key 唯一，left merge 保持订单行数和顺序不变
+    merged = orders.merge(reference_frame(store, orders["_key"].unique()), on="_key", how="left", sort=False)
+    merged[MATCH_FIELDS] = merged[MATCH_FIELDS].fillna("")
+
+    # 三个字段都齐全才算匹配，否则全部留空让用户填写
+    is_matched = merged[MATCH_FIELDS].ne("").all(axis=1)
+    merged[MATCH_FIELDS] = merged[MATCH_FIELDS].where(is_matched, "")
+    merged["is_matched"] = is_matched
+
+    matched_count = int(is_matched.sum())
+    incr("sku_lookup_keys", len(keys))
+    incr("sku_lookup_hits", matched_count)
+    incr("sku_lookup_misses", len(merged) - matched_count)
+    return merged[RESULT_COLUMNS].copy(), matched_count, len(merged) - matched_count
+
+
+def match_order_batches(batches, store):
+    """match_orders over a stream of order batches, combined into one result"""
+    results = []
+    matched_count = unmatched_count = 0
+    for batch in batches:
+        result, matched, unmatched = match_orders(batch, store)
+        results.append(result)
+        matched_count += matched
+        unmatched_count += unmatched
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS), 0, 0
+    return pd.concat(results, ignore_index=True), matched_count, unmatched_count
+
+
+def match_order_files(files, store, max_workers=None):
+    """Parse and match several order files in a thread pool against one shared store
+
+    files is a list of (file_name, source) pairs; returns (result_df,
+    summary, errors). result_df has leading "Upload" (the file's position in
+    files) and "Source File" columns and keeps the files in the given order;
+    summary is one dict per matched file and errors maps file names to the
+    reason they could not be read.
+    """
+    def run(item):
+        name, source = item
+        try:
+            return match_order_batches(iter_order_batches(source, name), store), None
+        except Exception as e:  # 单个文件出错不影响其他文件
+            return None, str(e)
+
+    results, summary, errors = [], [], {}
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(files) or 1)) as pool:
+        for upload, ((name, _), (matched, error)) in enumerate(zip(files, pool.map(run, files))):
+            if error is not None:
+                errors[name] = error
+                continue
+            df, matched_count, unmatched_count = matched
+            df.insert(0, SOURCE_COLUMN, name)
+            df.insert(0, UPLOAD_COLUMN, upload)
+            results.append(df)
+            summary.append({
+                SOURCE_COLUMN: name, "Rows": len(df),
+                "Matched": matched_count, "Unmatched": unmatched_count,
+            })
+    if not results:
+        return pd.DataFrame(columns=[UPLOAD_COLUMN, SOURCE_COLUMN] + RESULT_COLUMNS), summary, errors
+    return pd.concat(results, ignore_index=True), summary, errors
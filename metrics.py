@@ -0,0 +1,247 @@
+"""
+Lightweight in-process metrics: stage timers, counters and latency histograms
+
+Everything lives in one process-wide registry guarded by a single lock; a
+timed call costs two perf_counter() reads and one dict update, so the
+instrumentation stays on in production. The registry is exposed as a
+snapshot dict (sidebar panel), as Prometheus text exposition format and,
+when METRICS_JSON_LOG=1, as one JSON log line per finished stage.
+
+    with stage("parse_match") as s:
+        df = ...
+        s.rows = len(df)
+
+    @timed("exact_match_lookup")
+    def exact_match_lookup(...): ...
+"""
+
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prometheus textfile 路径（node_exporter textfile collector 读取）；为空则不写
+PROM_FILE = os.environ.get("METRICS_PROM_FILE", "")
+JSON_LOG = os.environ.get("METRICS_JSON_LOG", "0") == "1"
+PREFIX = "dhl"
+# 秒；API 延迟直方图的桶上界
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper_bound, count <= upper_bound)] including +Inf"""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Registry:
+    """Named stage timers, counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    def record_stage(self, name, seconds, rows=0):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0}
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["rows"] += rows
+            if seconds > stats["max_seconds"]:
+                stats["max_seconds"] = seconds
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """Plain-dict copy: {"stages", "counters", "histograms", "uptime_seconds"}"""
+        with self._lock:
+            return {
+                "stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: {"buckets": h.cumulative(), "sum": h.sum, "count": h.count}
+                    for name, h in self.histograms.items()
+                },
+                "uptime_seconds": time.time() - self.started,
+            }
+
+
+REGISTRY = Registry()
+
+
+class stage:
+    """Context manager timing one pipeline stage; set .rows inside the block for rows/sec"""
+
+    def __init__(self, name, rows=0, registry=REGISTRY):
+        self.name = name
+        self.rows = rows
+        self.registry = registry
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        self.registry.record_stage(self.name, seconds, self.rows)
+        if exc_type is not None:
+            self.registry.incr(f"{self.name}_errors")
+        if JSON_LOG:
+            logger.info(json.dumps({
+                "event": "stage", "stage": self.name, "seconds": round(seconds, 6), "rows": self.rows,
+                "error": exc_type.__name__ if exc_type else None,
+            }))
+        return False
+
+
+def timed(name):
+    """Decorator recording every call of the function as a stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name, amount=1):
+    REGISTRY.incr(name, amount)
+
+
+def observe(name, value):
+    REGISTRY.observe(name, value)
+
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+def reset():
+    REGISTRY.reset()
+
+
+def hit_rate(counters, name):
+    """<name>_hits / (<name>_hits + <name>_misses), or None before the first lookup
+
+    Caches that only see their misses count <name>_lookups instead of hits.
+    """
+    misses = counters.get(f"{name}_misses", 0)
+    lookups = counters.get(f"{name}_lookups")
+    hits = counters.get(f"{name}_hits", 0) if lookups is None else lookups - misses
+    return hits / (hits + misses) if hits + misses else None
+
+
+def hit_rates(snap):
+    """{name: rate} for every counter family with hits/misses or lookups/misses"""
+    names = {
+        counter.rsplit("_", 1)[0] for counter in snap["counters"]
+        if counter.endswith(("_hits", "_misses", "_lookups"))
+    }
+    return {name: rate for name in sorted(names) if (rate := hit_rate(snap["counters"], name)) is not None}
+
+
+def stage_table(snap):
+    """One row per stage for display: calls, total/mean/max ms, rows and rows per second"""
+    rows = []
+    for name, stats in sorted(snap["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        seconds = stats["seconds"]
+        rows.append({
+            "Stage": name,
+            "Calls": stats["calls"],
+            "Total ms": round(seconds * 1000, 1),
+            "Mean ms": round(seconds * 1000 / stats["calls"], 3),
+            "Max ms": round(stats["max_seconds"] * 1000, 1),
+            "Rows": stats["rows"],
+            "Rows/s": round(stats["rows"] / seconds) if stats["rows"] and seconds else None,
+        })
+    return rows
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def to_prometheus(snap=None):
+    """Registry contents in Prometheus text exposition format"""
+    snap = snap or snapshot()
+    lines = [
+        f"# TYPE {PREFIX}_stage_seconds_total counter",
+        f"# TYPE {PREFIX}_stage_calls_total counter",
+        f"# TYPE {PREFIX}_stage_rows_total counter",
+        f"# TYPE {PREFIX}_stage_max_seconds gauge",
+    ]
+    for name, stats in sorted(snap["stages"].items()):
+        label = f'{{stage="{name}"}}'
+        lines.append(f"{PREFIX}_stage_seconds_total{label} {stats['seconds']:.6f}")
+        lines.append(f"{PREFIX}_stage_calls_total{label} {stats['calls']}")
+        lines.append(f"{PREFIX}_stage_rows_total{label} {stats['rows']}")
+        lines.append(f"{PREFIX}_stage_max_seconds{label} {stats['max_seconds']:.6f}")
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        lines.append(f"{PREFIX}_{name}_total {value}")
+    for name, histogram in sorted(snap["histograms"].items()):
+        lines.append(f"# TYPE {PREFIX}_{name} histogram")
+        for bound, count in histogram["buckets"]:
+            lines.append(f'{PREFIX}_{name}_bucket{{le="{_format_bound(bound)}"}} {count}')
+        lines.append(f"{PREFIX}_{name}_sum {histogram['sum']:.6f}")
+        lines.append(f"{PREFIX}_{name}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    """Atomically write the Prometheus text file (METRICS_PROM_FILE by default); no-op without a path"""
+    path = path or PROM_FILE
+    if not path:
+        return None
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(to_prometheus())
+        os.replace(tmp, path)
+    except OSError as e:
+        # 指标文件写不了不应影响业务流程
+        logger.warning("Could not write metrics to %s: %s", path, e)
+        return None
+    return path
@@ -0,0 +1,31 @@
+"""
+Canonical form of item descriptions, shared by every SKU index
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# 规则变化时递增，SQLite 后端据此重建已保存的 key
+NORMALIZATION_VERSION = 2
+
+STOPWORDS = frozenset({"a", "an", "the", "and", "of"})
+
+_APOSTROPHES_RE = re.compile(r"['’‘`´]")
+_SEPARATORS_RE = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_description(text):
+    """Canonical description: NFKC, casefold, no punctuation, single spaces, no stopwords
+
+    "Men’s  T-Shirt", "MENS T SHIRT" and full-width "ＭＥＮＳ Ｔ－ＳＨＩＲＴ" all
+    normalize to "mens t shirt". Apostrophes are dropped (MEN'S -> mens), any
+    other punctuation separates words. A description made only of stopwords
+    keeps them, so it never collapses to an empty key.
+    """
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    text = _APOSTROPHES_RE.sub("", text)
+    words = _SEPARATORS_RE.sub(" ", text).split()
+    kept = [word for word in words if word not in STOPWORDS]
+    return " ".join(kept or words)
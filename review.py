@@ -0,0 +1,82 @@
+"""
+Server-side filtering, paging and bulk edits for the review table
+
+The full order frame stays on the server (in the Streamlit session); only
+one page of it is sent to the browser at a time.
+"""
+
+import math
+
+SAVE_COLUMN = "写入 SKU 数据库"
+SELECT_COLUMN = "选中"
+READ_ONLY_COLUMNS = ["Upload", "Source File", "is_matched"]
+BULK_EDIT_COLUMNS = ["Weight", "Origin Country", "Commodity Code"]
+SAVE_FIELDS = ["Item Description", "Commodity Code", "Weight", "Origin Country"]
+PAGE_SIZES = [50, 100, 200, 500]
+
+UNMATCHED = "unmatched"
+MATCHED = "matched"
+ALL = "all"
+
+
+def review_frame(matched_df):
+    """Working copy of a match result with the save / select checkbox columns added"""
+    df = matched_df.copy()
+    df.insert(df.columns.get_loc("is_matched"), SAVE_COLUMN, False)
+    df.insert(0, SELECT_COLUMN, False)
+    return df
+
+
+def filter_index(df, status):
+    """Row labels of df whose match status is unmatched / matched / all"""
+    if status == UNMATCHED:
+        return df.index[~df["is_matched"].astype(bool)]
+    if status == MATCHED:
+        return df.index[df["is_matched"].astype(bool)]
+    return df.index
+
+
+def page_count(total, page_size):
+    return max(1, math.ceil(total / page_size))
+
+
+def page_index(index, page, page_size):
+    """Labels on page (1-based) of index; out-of-range pages are clamped"""
+    page = min(max(1, page), page_count(len(index), page_size))
+    start = (page - 1) * page_size
+    return index[start:start + page_size]
+
+
+def apply_page_edits(df, edited):
+    """Write an edited page back into df in place (read-only columns are ignored)"""
+    columns = [c for c in edited.columns if c in df.columns and c not in READ_ONLY_COLUMNS]
+    # 逐列赋值，保持每列原有的 dtype
+    for column in columns:
+        df.loc[edited.index, column] = edited[column].to_numpy()
+
+
+def bulk_set(df, rows, column, value):
+    """Set column to value on the given row labels; returns how many rows were changed"""
+    if column not in BULK_EDIT_COLUMNS:
+        raise ValueError(f"{column!r} cannot be bulk edited")
+    df.loc[rows, column] = value
+    return len(rows)
+
+
+def fill_unmatched(df, item_description, fields):
+    """Copy fields (e.g. an accepted suggestion) into unmatched rows with this description; returns rows changed"""
+    rows = df.index[~df["is_matched"].astype(bool) & (df["Item Description"] == item_description)]
+    for column in BULK_EDIT_COLUMNS:
+        df.loc[rows, column] = fields[column]
+    return len(rows)
+
+
+def selected_index(df):
+    return df.index[df[SELECT_COLUMN].astype(bool)]
+
+
+def records_to_save(df):
+    """Rows ticked for the SKU database with all four fields filled, as reference records"""
+    fields = df[SAVE_FIELDS].fillna("").astype(str).apply(lambda column: column.str.strip())
+    ready = df[SAVE_COLUMN].astype(bool) & fields.ne("").all(axis=1)
+    return df.loc[ready, SAVE_FIELDS].to_dict("records")
@@ -0,0 +1,483 @@
+"""
+SQLite storage backend for the SKU database (one skus table in the SKU_FIELDS schema)
+
+    python sku_sqlite.py --db data/sku_reference.sqlite3 \
+        --reference sku_reference_data.csv [--memory data/sku_memory_db.csv]
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+
+from normalize import NORMALIZATION_VERSION
+from sku_store import (
+    DEFAULT_SQLITE_PATH, KEYWORD_MATCH_THRESHOLD, NO_STAMP, SCHEMA_VERSION, SKU_FIELDS, SkuMemory, change_stamp,
+    description_key, match_fields, merge_record, read_csv_records, row_key, tokenize, upgrade_record,
+)
+
+# SQL 列名与 CSV 字段一一对应
+SKU_COLUMNS = ["sku", "brand", "item_description", "commodity_code", "weight", "origin_country"]
+UPSERT_BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS skus (
+    id INTEGER PRIMARY KEY,
+    description_key TEXT NOT NULL UNIQUE,
+    sku TEXT NOT NULL DEFAULT '',
+    brand TEXT NOT NULL DEFAULT '',
+    item_description TEXT NOT NULL,
+    commodity_code TEXT NOT NULL DEFAULT '',
+    weight TEXT NOT NULL DEFAULT '',
+    origin_country TEXT NOT NULL DEFAULT '',
+    sku_key TEXT,
+    brand_key TEXT,
+    token_count INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    stamp_ts REAL NOT NULL DEFAULT 0,
+    stamp_origin TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS skus_sku_key ON skus (sku_key);
+CREATE INDEX IF NOT EXISTS skus_brand_key ON skus (brand_key);
+CREATE TABLE IF NOT EXISTS sku_tokens (
+    token TEXT NOT NULL,
+    sku_id INTEGER NOT NULL,
+    PRIMARY KEY (token, sku_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sku_meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+# 增量同步的变更列：seq 为本地写入序号，(stamp_ts, stamp_origin) 为版本戳
+CHANGE_COLUMNS = {
+    "seq": "INTEGER NOT NULL DEFAULT 0",
+    "stamp_ts": "REAL NOT NULL DEFAULT 0",
+    "stamp_origin": "TEXT NOT NULL DEFAULT ''",
+}
+NO_CHANGE = (0, *NO_STAMP)
+
+
+def _row_to_record(row):
+    return {field: row[column] for field, column in zip(SKU_FIELDS, SKU_COLUMNS)}
+
+
+def _row_change(row):
+    return (row["seq"], row["stamp_ts"], row["stamp_origin"])
+
+
+def _insert(conn, key, record, change=NO_CHANGE):
+    """Insert a SKU_FIELDS record with its lookup keys, tokens and (seq, ts, origin) change; returns the new id"""
+    words = tokenize(record["Item Description"])
+    cursor = conn.execute(
+        "INSERT INTO skus (description_key, sku, brand, item_description, commodity_code, weight, origin_country,"
+        " sku_key, brand_key, token_count, seq, stamp_ts, stamp_origin)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [key] + [record[field] for field in SKU_FIELDS]
+        + [record["SKU"] or None, record["Brand"].lower() or None, len(words), *change],
+    )
+    conn.executemany(
+        "INSERT INTO sku_tokens (token, sku_id) VALUES (?, ?)", [(token, cursor.lastrowid) for token in set(words)]
+    )
+    return cursor.lastrowid
+
+
+def _update(conn, row_id, record, change):
+    # 同一 key 的描述规范化后相同，token 不变
+    conn.execute(
+        "UPDATE skus SET sku = ?, brand = ?, item_description = ?, commodity_code = ?, weight = ?,"
+        " origin_country = ?, sku_key = ?, brand_key = ?, seq = ?, stamp_ts = ?, stamp_origin = ? WHERE id = ?",
+        [record[field] for field in SKU_FIELDS]
+        + [record["SKU"] or None, record["Brand"].lower() or None, *change, row_id],
+    )
+
+
+def _bump_version(conn):
+    conn.execute(
+        "INSERT INTO sku_meta (name, value) VALUES ('reference_version', 1)"
+        " ON CONFLICT(name) DO UPDATE SET value = value + 1"
+    )
+
+
+def _set_meta(conn, name, value):
+    conn.execute(
+        "INSERT INTO sku_meta (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+        (name, value),
+    )
+
+
+def _fold(rows):
+    """Records in order, merged by row_key: first row wins, later rows fill its empty fields"""
+    kept = {}
+    for record in rows:
+        key = row_key(record, kept.get)
+        kept[key] = merge_record(kept[key], record, fill_empty=True) if key in kept else record
+    return kept
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SqliteBackend:
+    """SKU storage backend on one SQLite file (WAL mode, one connection per thread)
+
+    Offers the same operations as sku_store.CsvBackend, backed by indexes on
+    the normalized description, SKU, brand and description tokens of one
+    skus table. description_key holds sku_store.row_key, so a second SKU
+    sharing a description has a row of its own. A version-1 database
+    (sku_reference + sku_memory tables) is migrated on open.
+
+    Every changed row carries the sequence number of the write (the
+    last_seq meta counter) and its version stamp, so changes_since() is an
+    indexed range scan.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+        self._migrate_schema()
+        self._migrate_changes()
+        self._migrate_keys()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    def _meta(self, conn, name):
+        row = conn.execute("SELECT value FROM sku_meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _tables(self, conn):
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def _migrate_schema(self):
+        """Fold the version-1 sku_reference and sku_memory tables into skus
+
+        Reference rows come first and win; memory rows are merged by
+        description, only filling fields that are still empty.
+        """
+        conn = self._connect()
+        if "sku_meta" in self._tables(conn) and self._meta(conn, "schema_version") == SCHEMA_VERSION:
+            return
+        with self._transaction() as conn:
+            tables = self._tables(conn)
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            if self._meta(conn, "schema_version") == SCHEMA_VERSION:
+                return
+            rows = []
+            if "sku_reference" in tables:
+                rows += [upgrade_record(dict(row)) for row in conn.execute(
+                    "SELECT item_description AS 'Item Description', commodity_code AS 'Commodity Code',"
+                    " weight AS 'Weight', origin_country AS 'Origin Country' FROM sku_reference ORDER BY id"
+                )]
+            if "sku_memory" in tables:
+                rows += [upgrade_record(dict(row)) for row in conn.execute(
+                    "SELECT sku AS 'SKU', brand AS 'Brand', item_description AS 'Item Description',"
+                    " commodity_code AS 'Commodity Code', weight AS 'Weight',"
+                    " country_of_origin AS 'Origin Country' FROM sku_memory ORDER BY id"
+                )]
+            for key, record in _fold(rows).items():
+                _insert(conn, key, record)
+            for table in ("sku_reference", "sku_memory", "sku_memory_tokens"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            _set_meta(conn, "schema_version", SCHEMA_VERSION)
+            # 迁移时已按当前规则计算 key
+            _set_meta(conn, "key_version", NORMALIZATION_VERSION)
+            if rows:
+                _bump_version(conn)
+
+    def _migrate_changes(self):
+        """Add the change-tracking columns to a skus table created without them"""
+        conn = self._connect()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(skus)")}
+        if set(CHANGE_COLUMNS) - columns:
+            with self._transaction() as conn:
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(skus)")}
+                for name, definition in CHANGE_COLUMNS.items():
+                    if name not in columns:
+                        conn.execute(f"ALTER TABLE skus ADD COLUMN {name} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS skus_seq ON skus (seq)")
+
+    def _migrate_keys(self):
+        """Recompute stored description keys and tokens written under older normalization rules
+
+        Rows whose descriptions now share a key are folded into the earliest
+        one (first occurrence wins, as for the CSV index); its empty fields
+        are filled from the later rows before they are removed.
+        """
+        if self._meta(self._connect(), "key_version") == NORMALIZATION_VERSION:
+            return
+        with self._transaction() as conn:
+            if self._meta(conn, "key_version") == NORMALIZATION_VERSION:
+                return
+            rows = conn.execute("SELECT * FROM skus ORDER BY id").fetchall()
+            conn.execute("DELETE FROM skus")
+            conn.execute("DELETE FROM sku_tokens")
+            # 与 _fold 相同的合并规则；合并后的行沿用最早一行的序号和版本戳
+            kept, changes = {}, {}
+            for row in rows:
+                record = _row_to_record(row)
+                key = row_key(record, kept.get)
+                kept[key] = merge_record(kept[key], record, fill_empty=True) if key in kept else record
+                changes.setdefault(key, _row_change(row))
+            for key, record in kept.items():
+                _insert(conn, key, record, changes[key])
+            _set_meta(conn, "key_version", NORMALIZATION_VERSION)
+            if rows:
+                _bump_version(conn)
+
+    # --- exact description matches ---
+
+    def _stored(self, conn):
+        """current(key) for sku_store.row_key, reading the skus table"""
+        def current(key):
+            row = conn.execute("SELECT * FROM skus WHERE description_key = ?", (key,)).fetchone()
+            return None if row is None else _row_to_record(row)
+        return current
+
+    def lookup(self, item_description):
+        row = self._connect().execute(
+            "SELECT * FROM skus WHERE description_key = ?", (description_key(item_description),)
+        ).fetchone()
+        if row is None:
+            return None
+        return match_fields(_row_to_record(row))
+
+    def lookup_many(self, keys):
+        conn = self._connect()
+        found = {}
+        # SQLite 单条语句的参数个数有限，分批查询
+        for chunk in _chunks(list(keys), 500):
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM skus WHERE description_key IN ({placeholders})", chunk):
+                found[row["description_key"]] = match_fields(_row_to_record(row))
+        return found
+
+    def reference_records(self):
+        for row in self._connect().execute("SELECT * FROM skus ORDER BY id"):
+            yield _row_to_record(row)
+
+    def reference_version(self):
+        """Counter bumped by every write that changes skus"""
+        return self._meta(self._connect(), "reference_version") or 0
+
+    def record_count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM skus").fetchone()[0]
+
+    def derived(self, name, build):
+        """build(backend), cached until reference_version() changes"""
+        version = self.reference_version()
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != version:
+            with self._derived_lock:
+                cached = self._derived.get(name)
+                if cached is None or cached[0] != version:
+                    cached = self._derived[name] = (version, build(self))
+        return cached[1]
+
+    def upsert(self, records, overwrite=True, fill_empty=False):
+        """Insert or update records keyed by description; returns (inserted, updated)"""
+        inserted = updated = 0
+        records = list(records)
+        stamp = change_stamp()
+        for batch in _chunks(records, UPSERT_BATCH_SIZE):
+            with self._transaction() as conn:
+                changes = inserted + updated
+                seq = self._meta(conn, "last_seq") or 0
+                stored = self._stored(conn)
+                for record in batch:
+                    record = upgrade_record(record)
+                    key = row_key(record, stored)
+                    row = conn.execute("SELECT * FROM skus WHERE description_key = ?", (key,)).fetchone()
+                    if row is None:
+                        seq += 1
+                        _insert(conn, key, record, (seq, *stamp))
+                        inserted += 1
+                    elif overwrite:
+                        existing = _row_to_record(row)
+                        merged = merge_record(existing, record, fill_empty)
+                        if merged != existing:
+                            seq += 1
+                            _update(conn, row["id"], merged, (seq, *stamp))
+                            updated += 1
+                # 同一事务内递增版本号，读者据此判断匹配结果是否过期
+                if inserted + updated > changes:
+                    _set_meta(conn, "last_seq", seq)
+                    _bump_version(conn)
+        return inserted, updated
+
+    # --- delta sync ---
+
+    def last_seq(self):
+        """Sequence number of the latest write, 0 before the first one"""
+        return self._meta(self._connect(), "last_seq") or 0
+
+    def changes_since(self, seq):
+        """Records written after seq, as {"seq", "ts", "origin", "key", "record"} in seq order"""
+        return [
+            {"seq": row["seq"], "ts": row["stamp_ts"], "origin": row["stamp_origin"],
+             "key": row["description_key"], "record": _row_to_record(row)}
+            for row in self._connect().execute("SELECT * FROM skus WHERE seq > ? ORDER BY seq", (seq,))
+        ]
+
+    def apply_changes(self, changes):
+        """Merge changes from another instance, last writer wins per key; returns (applied, skipped)
+
+        Same rule as sku_store.SkuStore.apply_changes: a change replaces the
+        whole row when its (ts, origin) stamp is newer than the row's.
+        """
+        applied = skipped = 0
+        for batch in _chunks(list(changes), UPSERT_BATCH_SIZE):
+            with self._transaction() as conn:
+                seq = self._meta(conn, "last_seq") or 0
+                stored = self._stored(conn)
+                for change in batch:
+                    record = upgrade_record(change["record"])
+                    key = row_key(record, stored)
+                    stamp = (float(change["ts"]), str(change["origin"]))
+                    row = conn.execute("SELECT * FROM skus WHERE description_key = ?", (key,)).fetchone()
+                    if stamp <= (NO_STAMP if row is None else _row_change(row)[1:]):
+                        skipped += 1
+                        continue
+                    seq += 1
+                    if row is None:
+                        _insert(conn, key, record, (seq, *stamp))
+                    else:
+                        _update(conn, row["id"], record, (seq, *stamp))
+                    applied += 1
+                if seq != (self._meta(conn, "last_seq") or 0):
+                    _set_meta(conn, "last_seq", seq)
+                    _bump_version(conn)
+        return applied, skipped
+
+    def __contains__(self, item_description):
+        return self._connect().execute(
+            "SELECT 1 FROM skus WHERE description_key = ?", (description_key(item_description),)
+        ).fetchone() is not None
+
+    # --- SKU > keyword > brand tiers ---
+
+    def memory_match(self, sku, brand, item_description):
+        """Full SKU > Partial keyword > Brand, each tier answered from an index"""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM skus WHERE sku_key = ? ORDER BY id LIMIT 1", (sku.strip(),)).fetchone()
+        if row is None:
+            row = self._keyword_match(conn, item_description)
+        if row is None:
+            row = conn.execute(
+                "SELECT * FROM skus WHERE brand_key = ? ORDER BY id LIMIT 1", (brand.strip().lower(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return _row_to_record(row)
+
+    def _keyword_match(self, conn, item_description):
+        desc_words = tokenize(item_description)
+        tokens = sorted(set(desc_words))
+        if not tokens:
+            return None
+        placeholders = ",".join("?" * len(tokens))
+        # 分数相同时取 id 最小（最早写入）的记录，与 CSV 后端一致
+        row = conn.execute(
+            f"""
+            SELECT m.*, COUNT(*) * 1.0 / MAX(?, m.token_count) AS score
+            FROM sku_tokens t JOIN skus m ON m.id = t.sku_id
+            WHERE t.token IN ({placeholders})
+            GROUP BY m.id
+            ORDER BY score DESC, m.id
+            LIMIT 1
+            """,
+            [len(desc_words)] + tokens,
+        ).fetchone()
+        if row is None or row["score"] <= KEYWORD_MATCH_THRESHOLD:
+            return None
+        return row
+
+    def memory_index(self):
+        """All records as an in-memory SkuMemory"""
+        return SkuMemory(self.reference_records())
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_sqlite_backend(path):
+    """Return the shared SqliteBackend for the database file at path"""
+    key = os.path.abspath(path)
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = _backends[key] = SqliteBackend(path)
+    return backend
+
+
+def import_csv(db_path, reference_path=None, memory_path=None):
+    """One-shot import of SKU CSV files; returns {'reference': n, 'memory': n} rows inserted or filled in
+
+    Both files may be in either schema version. Rows already in the database
+    are left alone, except that memory rows fill in their empty fields (such
+    as SKU and Brand); for duplicate keys in a CSV the first row wins,
+    matching what lookups against the CSV returned.
+    """
+    backend = get_sqlite_backend(db_path)
+    counts = {"reference": 0, "memory": 0}
+    if reference_path:
+        counts["reference"], _ = backend.upsert(read_csv_records(reference_path, SKU_FIELDS), overwrite=False)
+    if memory_path:
+        records = list(_fold(read_csv_records(memory_path, SKU_FIELDS)).values())
+        counts["memory"] = sum(backend.upsert(records, fill_empty=True))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the SKU CSV files into a SQLite database")
+    parser.add_argument("--db", default=DEFAULT_SQLITE_PATH, help="SQLite database file to create/update")
+    parser.add_argument("--reference", default="sku_reference_data.csv", help="the SKU database CSV")
+    parser.add_argument("--memory", default="data/sku_memory_db.csv",
+                        help="schema-version-1 SKU/Brand memory CSV to fold in, if it still exists")
+    args = parser.parse_args()
+
+    counts = import_csv(
+        args.db,
+        args.reference if os.path.exists(args.reference) else None,
+        args.memory if os.path.exists(args.memory) else None,
+    )
+    print(f"✅ Imported {counts['reference']} rows and merged {counts['memory']} memory rows into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1177 @@
+"""
+The SKU database: one CSV in the SKU_FIELDS schema, indexed in memory and shared per process
+
+Schema version 1 kept two files with two schemas: sku_reference_data.csv
+(REFERENCE_FIELDS, exact description matches) and data/sku_memory_db.csv
+(MEMORY_FIELDS, SKU / keyword / brand matches). Version 2 keeps both in
+one SKU_FIELDS file keyed by normalized description (see row_key() for
+SKUs sharing a description); migrate_csv() folds an old pair into it.
+"""
+
+import copy
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+from operator import itemgetter
+
+import numpy as np
+
+from columnar import ColumnarTable, HashIndex, StringColumn
+from normalize import NORMALIZATION_VERSION, normalize_description
+from snapshot import SNAPSHOT_SUFFIX, read_snapshot, replace_keeping_mode, snapshots_enabled, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking, single writer only
+    fcntl = None
+
+SCHEMA_VERSION = 2
+SKU_FIELDS = ["SKU", "Brand", "Item Description", "Commodity Code", "Weight", "Origin Country"]
+# 版本 1 的两种表头，只在迁移和读取旧文件时使用
+REFERENCE_FIELDS = ["Item Description", "Commodity Code", "Weight", "Origin Country"]
+MEMORY_FIELDS = ["SKU", "Brand", "Item Description", "Commodity Code", "Weight", "Country of Origin"]
+# 当前字段 -> 旧表头里的列名
+LEGACY_FIELD_NAMES = {"Origin Country": ("Country of Origin",)}
+# 描述相同、SKU 不同的记录另起一行，key 为 描述 key + 分隔符 + SKU（规范化后的描述不含 \x1f）
+SKU_KEY_SEPARATOR = "\x1f"
+LEGACY_MEMORY_PATH = os.path.join("data", "sku_memory_db.csv")
+BACKUP_SUFFIX = ".v1.bak"
+KEYWORD_MATCH_THRESHOLD = 0.3
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+CHANGES_SUFFIX = ".changes"
+# 变更日志超过 CSV 的 4 倍（且至少 1 MB）时，压缩为每个 key 只保留最后一次变更
+CHANGES_COMPACT_RATIO = 4
+CHANGES_COMPACT_MIN = 1 << 20
+ORIGIN_ENV = "SKU_ORIGIN"
+
+BACKEND_ENV = "SKU_BACKEND"
+SQLITE_PATH_ENV = "SKU_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = "data/sku_reference.sqlite3"
+
+
+def description_key(item_description):
+    """Normalize an item description into the key used by every index (see normalize.py)"""
+    return normalize_description(item_description)
+
+
+def row_key(record, current):
+    """Key a clean SKU_FIELDS record is stored under; current(key) is the record stored under key, or None
+
+    Rows are keyed by normalized description, and the first row of a
+    description answers exact matches. A record whose SKU differs from the
+    (non-empty) SKU of that row gets a row of its own, keyed by description
+    and SKU, so several products sharing a description all stay reachable
+    by SKU. Records without a SKU always go to the description's row.
+    """
+    key = description_key(record["Item Description"])
+    sku = record["SKU"]
+    if sku:
+        first = current(key)
+        if first is not None and first["SKU"] and first["SKU"] != sku:
+            return key + SKU_KEY_SEPARATOR + sku
+    return key
+
+
+def candidate_row_keys(record):
+    """Every key row_key() can return for a clean record"""
+    key = description_key(record["Item Description"])
+    return [key, key + SKU_KEY_SEPARATOR + record["SKU"]] if record["SKU"] else [key]
+
+
+def tokenize(text):
+    """Words of the normalized description, used for keyword scoring (duplicates kept)"""
+    return normalize_description(text).split()
+
+
+def file_signature(path):
+    """Return (inode, mtime, size) for path, or None when it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def clean_value(value):
+    """Stringify a cell for storage: None becomes '', everything else is stripped"""
+    return "" if value is None else str(value).strip()
+
+
+def upgrade_record(record):
+    """A record in either version-1 schema (or the current one) as a clean SKU_FIELDS dict"""
+    upgraded = {}
+    for field in SKU_FIELDS:
+        value = record.get(field)
+        if value is None:
+            for legacy in LEGACY_FIELD_NAMES.get(field, ()):
+                value = record.get(legacy)
+                if value is not None:
+                    break
+        upgraded[field] = clean_value(value)
+    return upgraded
+
+
+def merge_record(existing, record, fill_empty=False):
+    """Upsert rule: non-empty incoming fields replace the stored ones
+
+    With fill_empty, incoming values only go into fields that are empty.
+    """
+    merged = dict(existing)
+    for field, value in record.items():
+        if value and not (fill_empty and merged.get(field)):
+            merged[field] = value
+    return merged
+
+
+def write_csv_atomic(path, fieldnames, records):
+    """Write records to a temp file next to path, then os.replace it into place"""
+    write_rows_atomic(path, fieldnames, ([record.get(field, "") for field in fieldnames] for record in records))
+
+
+def write_rows_atomic(path, fieldnames, rows):
+    """write_csv_atomic for value lists already in fieldnames order"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_keeping_mode(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def records_to_csv(records, fieldnames=SKU_FIELDS):
+    """(row count, UTF-8 CSV bytes with a header row) for records, e.g. for a download"""
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    count = 0
+    for record in records:
+        writer.writerow([record[field] for field in fieldnames])
+        count += 1
+    return count, buffer.getvalue().encode("utf-8")
+
+
+def read_csv_records(path, fieldnames):
+    """Read path into a list of stripped record dicts limited to fieldnames"""
+    records = []
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            records = _parse_csv(f, fieldnames)
+    return records
+
+
+def _parse_csv(f, fieldnames):
+    return [dict(zip(fieldnames, row)) for row in _parse_rows(f, fieldnames)]
+
+
+def _parse_rows(f, fieldnames):
+    """Stripped value lists in fieldnames order; header handling as csv.DictReader"""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return []
+    # 与 DictReader 一致：重名列取最后一列，缺少的列和短行补空
+    positions = {name: i for i, name in enumerate(header)}
+    columns = [positions.get(field) for field in fieldnames]
+    # 旧表头（如记忆库的 Country of Origin）按原列名读取
+    for j, field in enumerate(fieldnames):
+        for legacy in LEGACY_FIELD_NAMES.get(field, ()) if columns[j] is None else ():
+            columns[j] = positions.get(legacy, columns[j])
+    if None in columns or len(columns) < 2:
+        return [[row[i].strip() if i is not None and i < len(row) else "" for i in columns] for row in reader if row]
+    get = itemgetter(*columns)
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        try:
+            values = get(row)
+        except IndexError:
+            values = [row[i] if i < len(row) else "" for i in columns]
+        rows.append([value.strip() for value in values])
+    return rows
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive inter-process lock for writers of path (no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + LOCK_SUFFIX, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def journal_state(path):
+    """Return (inode, size) of a journal file, or (None, 0) when it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (None, 0)
+    return (st.st_ino, st.st_size)
+
+
+def read_journal(path, offset=0, inode=None):
+    """Complete journal entries after offset; returns (entries, new_offset, inode)
+
+    Returns None when path no longer is the journal file identified by inode,
+    i.e. it was replaced by a compaction. A line still being written has no
+    trailing newline yet and is left for the next read.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None if inode is not None else ([], 0, None)
+    with f:
+        current_inode = os.fstat(f.fileno()).st_ino
+        if inode is not None and current_inode != inode:
+            return None
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return entries, offset + end, current_inode
+
+
+def append_journal(path, entries):
+    """Append entries as JSON lines with one O_APPEND write; returns (bytes written, inode)"""
+    data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+        inode = os.fstat(fd).st_ino
+    finally:
+        os.close(fd)
+    return len(data), inode
+
+
+def replace_with_empty(path):
+    """Atomically swap path for a new empty file (new inode)"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    os.close(fd)
+    replace_keeping_mode(tmp_path, path)
+
+
+def instance_origin():
+    """Name of this deployment in change stamps: $SKU_ORIGIN, else the host name"""
+    return os.environ.get(ORIGIN_ENV, "").strip() or socket.gethostname()
+
+
+def change_stamp():
+    """(timestamp, origin) version stamp for a local write; the larger stamp wins a sync"""
+    return (time.time(), instance_origin())
+
+
+# 从未经变更日志写入过的记录（如手工编辑、迁移得到的行）视为最旧
+NO_STAMP = (0.0, "")
+
+
+class ChangeLog:
+    """Append-only log of every record written to a store, <csv>.changes
+
+    One JSON line per change: {"seq", "ts", "origin", "key", "values"}.
+    seq numbers the local writes (strictly increasing, never reused);
+    (ts, origin) is the record's version stamp, which travels with it to
+    other instances for last-writer-wins merges. Writers hold the store's
+    file lock. Once the log outgrows its store it is rewritten with only
+    the latest change per key.
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self._last = (None, 0, 0)  # (inode, size, seq)
+
+    def _seq(self, line):
+        # 每行以 {"seq": N, 开头，只取序号时不必解码整行
+        return int(line[8:line.index(b",")])
+
+    def entries(self, after=0):
+        """Changes with seq > after in log order, as {"seq", "ts", "origin", "key", "record"}"""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 正在写入的行留到下次
+                if not line.strip():
+                    continue
+                try:
+                    if self._seq(line) <= after:
+                        continue
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping unreadable line in %s", self.path)
+                    continue
+                entry["record"] = dict(zip(self.fieldnames, entry.pop("values")))
+                yield entry
+
+    def last_seq(self):
+        """Highest seq written so far, 0 for an empty log"""
+        inode, size = journal_state(self.path)
+        if (inode, size) == self._last[:2]:
+            return self._last[2]
+        seq = 0
+        if size:
+            with open(self.path, "rb") as f:
+                # 从文件尾向前读，直到读到最后一条完整的记录
+                block = 4096
+                while True:
+                    start = max(0, size - block)
+                    f.seek(start)
+                    data = f.read(size - start)
+                    lines = data[:data.rfind(b"\n") + 1].splitlines()
+                    for line in reversed(lines if start == 0 else lines[1:]):
+                        try:
+                            seq = self._seq(line)
+                            break
+                        except ValueError:
+                            continue
+                    if seq or start == 0:
+                        break
+                    block *= 4
+        self._last = (inode, size, seq)
+        return seq
+
+    def append(self, changes):
+        """Log [(key, record, stamp)] under the next seq numbers; returns the last seq"""
+        seq = self.last_seq()
+        entries = []
+        for key, record, (ts, origin) in changes:
+            seq += 1
+            entries.append({"seq": seq, "ts": ts, "origin": origin, "key": key,
+                            "values": [record[field] for field in self.fieldnames]})
+        append_journal(self.path, entries)
+        self._last = (*journal_state(self.path), seq)
+        return seq
+
+    def since(self, seq):
+        """The latest change of every key changed after seq, ordered by seq"""
+        latest = {}
+        for entry in self.entries(seq):
+            # 先删再插：字典顺序即各 key 最后一次变更的顺序
+            latest.pop(entry["key"], None)
+            latest[entry["key"]] = entry
+        return list(latest.values())
+
+    def stamps(self, keys):
+        """{key: (ts, origin)} of the latest logged change, for those of keys that have one"""
+        keys = set(keys)
+        found = {}
+        for entry in self.entries():
+            if entry["key"] in keys:
+                found[entry["key"]] = (entry["ts"], entry["origin"])
+        return found
+
+    def compact(self, limit):
+        """Rewrite the log with only the latest change per key once it is larger than limit bytes"""
+        if journal_state(self.path)[1] <= limit:
+            return
+        # 最后一条变更必然保留，最大序号不会丢失，序号也不会被重用
+        latest = self.since(0)
+        lines = [
+            json.dumps({"seq": entry["seq"], "ts": entry["ts"], "origin": entry["origin"], "key": entry["key"],
+                        "values": [entry["record"][field] for field in self.fieldnames]}, ensure_ascii=False)
+            for entry in latest
+        ]
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=CHANGES_SUFFIX)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in lines)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_keeping_mode(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._last = (None, 0, 0)
+
+
+class SkuStore:
+    """The SKU database CSV plus its append-only journal, loaded once and shared by every caller
+
+    Writers hold an fcntl lock, append upserted records to <path>.journal
+    and periodically compact the journal into the CSV. Readers never take
+    the lock: they load the CSV, replay the journal, and afterwards only
+    read the journal tail that appeared since their last refresh.
+
+    Records are held in a ColumnarTable and located through a HashIndex on
+    row_key (normalized description, plus the SKU for extra SKUs sharing a
+    description), so a large file costs a few compact arrays rather than a
+    dict per row. Exact matches go through that index; the SKU, keyword
+    and brand tiers go through a SkuMemory over the same records, built on
+    first use after a load. Later writes merge their rows into it
+    (SkuMemory.updated) instead of rebuilding it.
+
+    The loaded CSV (without the journal) is also written as a binary
+    snapshot, <path>.snap, after every load from text and every compaction,
+    together with the SkuMemory indexes; a later cold start memory-maps it
+    instead of parsing the CSV, as long as its recorded CSV signature still
+    matches.
+
+    Every write is also logged with a sequence number and version stamp in
+    a ChangeLog, <path>.changes, from which deltas are exported to other
+    instances (see sku_sync.py) and merged back with apply_changes().
+    """
+
+    fieldnames = SKU_FIELDS
+    interned_fields = ("Brand", "Commodity Code", "Weight", "Origin Country")
+    snapshot = True
+    compact_threshold = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.snapshot_path = path + SNAPSHOT_SUFFIX
+        self.changes = ChangeLog(path + CHANGES_SUFFIX, self.fieldnames)
+        self.records = ColumnarTable.from_rows(self.fieldnames, [])
+        self._positions = HashIndex()
+        self._signature = None
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded = False
+        self._derived = {}
+        self._memory = None
+        self._snapshot_memory = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Pick up journal appends and reload only if the CSV itself changed"""
+        if (
+            self._loaded
+            and file_signature(self.path) == self._signature
+            and journal_state(self.journal_path) == (self._journal_inode, self._journal_offset)
+        ):
+            return self
+        with self._lock:
+            self._refresh_locked()
+        return self
+
+    def invalidate(self):
+        """Force a full reload on the next refresh, e.g. right after writing the file"""
+        with self._lock:
+            self._loaded = False
+
+    def _refresh_locked(self):
+        signature = file_signature(self.path)
+        if self._loaded and signature == self._signature:
+            tail = read_journal(self.journal_path, self._journal_offset, self._journal_inode)
+            # journal 或 CSV 被压缩替换过，则整体重新加载
+            if tail is not None and file_signature(self.path) == signature:
+                entries, self._journal_offset, self._journal_inode = tail
+                if entries:
+                    self._apply(entries)
+                return
+        self._load()
+
+    def _load(self):
+        while True:
+            rows = None
+            signature = file_signature(self.path)
+            arrays = self._read_snapshot(signature) if signature is not None else None
+            if arrays is None:
+                try:
+                    f = open(self.path, newline="", encoding="utf-8")
+                except FileNotFoundError:
+                    signature, rows = None, []
+                else:
+                    with f:
+                        st = os.fstat(f.fileno())
+                        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+                        rows = _parse_rows(f, self.fieldnames)
+            entries, offset, journal_inode = read_journal(self.journal_path)
+            # 压缩先替换 CSV 再替换 journal：CSV 没变说明读到的 journal 与之匹配
+            if file_signature(self.path) == signature:
+                break
+
+        if arrays is not None:
+            self._restore_snapshot(arrays)
+        else:
+            self.records = ColumnarTable.from_rows(self.fieldnames, rows, self.interned_fields)
+            del rows
+            self._positions = HashIndex(self.record_keys(self.records))
+            if signature is not None:
+                self._write_snapshot(signature)
+        self._journal_entries = 0
+        self._merge_entries(entries)
+        self._reset_memory()
+        self._signature = signature
+        self._journal_inode = journal_inode
+        self._journal_offset = offset
+        self._loaded = True
+        self._derived = {}
+
+    def _snapshot_meta(self, signature):
+        # 规范化规则变了，快照里的 key 和哈希索引就作废
+        return {"store": type(self).__name__, "fieldnames": self.fieldnames, "source": list(signature),
+                "key_version": NORMALIZATION_VERSION}
+
+    def _read_snapshot(self, signature):
+        """The snapshot's arrays if it was written from exactly this CSV, else None"""
+        if not (self.snapshot and snapshots_enabled()):
+            return None
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is None or snapshot[0] != self._snapshot_meta(signature):
+            return None
+        return snapshot[1]
+
+    def _write_snapshot(self, signature):
+        """Save the packed records and index; failing to write is logged, never raised"""
+        if not (self.snapshot and snapshots_enabled()):
+            return
+        try:
+            write_snapshot(self.snapshot_path, self._snapshot_meta(signature), self._snapshot_arrays())
+        except OSError as e:
+            logger.warning("Could not write snapshot %s: %s", self.snapshot_path, e)
+
+    def _snapshot_arrays(self):
+        memory = self._snapshot_memory = SkuMemory(self.records)
+        return {
+            **self.records.to_arrays("records"), **self._positions.to_arrays("positions"),
+            **memory.to_arrays("memory"),
+        }
+
+    def _restore_snapshot(self, arrays):
+        self.records = ColumnarTable.from_arrays(arrays, "records", self.fieldnames)
+        self._positions = HashIndex.from_arrays(arrays, "positions")
+        self._snapshot_memory = SkuMemory.from_arrays(arrays, "memory", self.records)
+
+    def _merge_entries(self, entries):
+        """Last-writer-wins replay of journal entries into records
+
+        Returns {row: record it held before} for every row written, with
+        None for appended rows.
+        """
+        records = self.records
+        positions = self._positions
+
+        def current(key):
+            position = positions.get(key)
+            return None if position is None else records[position]
+
+        changed = {}
+        for entry in entries:
+            record = upgrade_record(entry)
+            key = row_key(record, current)
+            position = positions.get(key)
+            if position is None:
+                # 先追加再登记位置，并发读者不会拿到越界的位置
+                records.append(record)
+                positions[key] = len(records) - 1
+                changed.setdefault(len(records) - 1, None)
+            else:
+                changed.setdefault(position, records[position])
+                records[position] = record
+        self._journal_entries += len(entries)
+        return changed
+
+    def _apply(self, entries):
+        # 发布新的 records 列表，正在读旧列表的调用方不受影响
+        self.records = self.records.copy()
+        changed = self._merge_entries(entries)
+        memory = self._memory
+        if memory is not None:
+            # 只把写入的行并入索引；无法增量更新时为 None，下次使用时重建
+            self._memory = memory.updated(self.records, changed)
+        self._derived = {}
+
+    def _reset_memory(self):
+        # 快照里的索引只覆盖 CSV 本身；回放过 journal 就得重建
+        snapshot_memory, self._snapshot_memory = self._snapshot_memory, None
+        self._memory = snapshot_memory if snapshot_memory is not None and not self._journal_entries else None
+
+    def _current(self, pending):
+        """current(key) for row_key: pending[key], else the stored record"""
+        def current(key):
+            record = pending.get(key)
+            if record is None:
+                position = self._positions.get(key)
+                if position is not None:
+                    record = self.records[position]
+            return record
+        return current
+
+    def record_keys(self, records):
+        """row_key for every row of a loaded table, in row order"""
+        keys = list(map(description_key, records.column("Item Description")))
+        first = {}
+        later = [row for row, key in enumerate(keys) if first.setdefault(key, row) != row]
+        if later:
+            # 与 row_key 相同的规则：同一描述的后续行带另一个 SKU 时用各自的 key
+            skus = records.column("SKU")
+            for row in later:
+                key = keys[row]
+                sku, first_sku = skus[row], skus[first[key]]
+                if sku and first_sku and sku != first_sku:
+                    keys[row] = key + SKU_KEY_SEPARATOR + sku
+        return keys
+
+    def bulk_upsert(self, records, overwrite=True, fill_empty=False):
+        """Insert or update many records with one locked journal append; returns (inserted, updated)
+
+        Rows are deduplicated against the in-memory index; with overwrite=False
+        existing rows are left untouched and only new keys are inserted, and
+        with fill_empty only their empty fields are filled in.
+        """
+        with self._lock, file_lock(self.path):
+            self._refresh_locked()
+
+            pending = {}
+            stored = self._current(pending)
+            stamp = change_stamp()
+            inserted = updated = 0
+            for record in records:
+                record = upgrade_record(record)
+                key = row_key(record, stored)
+                current = stored(key)
+                if current is None:
+                    pending[key] = record
+                    inserted += 1
+                elif overwrite:
+                    merged = merge_record(current, record, fill_empty)
+                    if merged != current:
+                        if key not in pending:
+                            updated += 1
+                        pending[key] = merged
+
+            if pending:
+                self._write_locked([(key, record, stamp) for key, record in pending.items()])
+        return inserted, updated
+
+    def apply_changes(self, changes):
+        """Merge changes from another instance, last writer wins per key; returns (applied, skipped)
+
+        changes are {"ts", "origin", "record"} dicts as produced by
+        ChangeLog.since(). A change replaces the whole local record when its
+        (ts, origin) stamp is newer than the stamp of that record's latest
+        logged change; applying the same changes twice is a no-op.
+        """
+        changes = list(changes)
+        with self._lock, file_lock(self.path):
+            self._refresh_locked()
+            incoming = []
+            for change in changes:
+                record = upgrade_record(change["record"])
+                incoming.append((record, (float(change["ts"]), str(change["origin"]))))
+            stamps = self.changes.stamps(key for record, _ in incoming for key in candidate_row_keys(record))
+            winners = {}
+            accepted = {}
+            stored = self._current(accepted)
+            for record, stamp in incoming:
+                # key 按已接受的变更计算，与之后回放 journal 时的结果一致
+                key = row_key(record, stored)
+                if stamp > (winners[key][2] if key in winners else stamps.get(key, NO_STAMP)):
+                    winners[key] = (key, record, stamp)
+                    accepted[key] = record
+            if winners:
+                # 日志里保留原始版本戳，转发给其他实例时仍按原写入时间比较
+                self._write_locked(list(winners.values()))
+        return len(winners), len(changes) - len(winners)
+
+    def _write_locked(self, changes):
+        """Journal, apply and log [(key, record, stamp)]; the caller holds both locks"""
+        entries = [record for _, record, _ in changes]
+        written, self._journal_inode = append_journal(self.journal_path, entries)
+        self._journal_offset += written
+        self._apply(entries)
+        self.changes.append(changes)
+        if self._journal_entries >= self.compact_threshold:
+            self._compact_locked()
+
+    def compact(self):
+        """Fold the journal into the CSV (atomic rewrite) and start an empty journal"""
+        with self._lock, file_lock(self.path):
+            self._refresh_locked()
+            if self._journal_entries:
+                self._compact_locked()
+
+    def _compact_locked(self):
+        # 先替换 CSV 再换新 journal：读者最多重复回放，不会丢记录；
+        # 旧 journal 文件不再被写入，正在读它的读者看到的内容始终完整
+        # 顺便把增量部分并回紧凑的列和哈希索引
+        self.records = self.records.packed()
+        self._positions = self._positions.packed()
+        write_rows_atomic(self.path, self.fieldnames, self.records.iter_rows())
+        replace_with_empty(self.journal_path)
+        self._signature = file_signature(self.path)
+        self._journal_inode, self._journal_offset = journal_state(self.journal_path)
+        self._journal_entries = 0
+        self._write_snapshot(self._signature)
+        self._reset_memory()
+        self.changes.compact(CHANGES_COMPACT_RATIO * self._signature[2] + CHANGES_COMPACT_MIN)
+
+    def derived(self, name, build):
+        """Return a structure built from this store, rebuilt only after a reload"""
+        derived = self._derived
+        if name not in derived:
+            derived[name] = build(self)
+        return derived[name]
+
+    @property
+    def version(self):
+        """Changes whenever the CSV or its journal does; equal versions mean equal contents"""
+        return (self._signature, self._journal_inode, self._journal_offset)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def index(self):
+        """row_key -> row position; with duplicate keys the first row"""
+        return self._positions
+
+    @property
+    def memory(self):
+        """SkuMemory (SKU / keyword / brand indexes) over the current records"""
+        memory = self._memory
+        if memory is None:
+            memory = self._memory = SkuMemory(self.records)
+        return memory
+
+    def lookup(self, item_description):
+        """O(1) exact match on normalized description, without checking the file"""
+        position = self._positions.get(description_key(item_description))
+        if position is None:
+            return None
+        return match_fields(self.records[position])
+
+    def lookup_many(self, keys):
+        """Exact matches for already-normalized description keys, as {key: fields}"""
+        positions = self._positions.get_many(keys)
+        records = self.records
+        return {key: match_fields(records[position]) for key, position in positions.items()}
+
+    def __contains__(self, item_description):
+        return description_key(item_description) in self._positions
+
+
+def match_fields(record):
+    """The fields an exact match fills in, copied out of a reference record"""
+    return {
+        "Commodity Code": record["Commodity Code"],
+        "Weight": record["Weight"],
+        "Origin Country": record["Origin Country"],
+    }
+
+
+class SkuMemory(Sequence):
+    """SKU records plus SKU, brand and token indexes for the tiers below an exact match
+
+    Reads like the list of record dicts callers already use. The rows stay
+    in a ColumnarTable and the indexes are compact arrays: SKUs and tokens
+    in HashIndexes, token postings as one int32 array with offsets, plus
+    small per-token lists for rows merged in later by updated(). Derive a
+    new instance instead of changing an existing one.
+    """
+
+    interned_fields = SkuStore.interned_fields
+
+    def __init__(self, records=()):
+        if not isinstance(records, ColumnarTable):
+            records = ColumnarTable.from_records(SKU_FIELDS, map(upgrade_record, records), self.interned_fields)
+        self.records = records
+
+        # 与逐条扫描一致：只索引非空字段，同 key 保留第一条
+        skus = records.column("SKU")
+        sku_rows = [row for row, sku in enumerate(skus) if sku]
+        self.sku_index = HashIndex([skus[row].strip() for row in sku_rows], sku_rows, key_of=self._sku_of)
+        del skus
+
+        first_brands = {}
+        for row, brand in enumerate(records.column("Brand")):
+            if brand and brand not in first_brands:
+                first_brands[brand] = row
+        self.brand_index = {}
+        for brand, row in first_brands.items():
+            self.brand_index.setdefault(brand.strip().lower(), row)
+
+        tokens, token_rows, token_counts = [], [], []
+        for row, description in enumerate(records.column("Item Description")):
+            words = tokenize(description) if description else []
+            token_counts.append(len(words))
+            distinct = set(words)
+            tokens.extend(distinct)
+            token_rows.extend([row] * len(distinct))
+        vocabulary = {}
+        token_ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+        del tokens
+        self.token_counts = np.array(token_counts, dtype=np.int32)
+        self.token_index = HashIndex(list(vocabulary))
+        del vocabulary
+        # 倒排表：按 token id 分段，段内按行号升序
+        token_ids = np.array(token_ids, dtype=np.int64)
+        token_rows = np.array(token_rows, dtype=np.int32)
+        order = np.lexsort((token_rows, token_ids))
+        self.postings = token_rows[order]
+        self.posting_offsets = np.zeros(len(self.token_index) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(token_ids, minlength=len(self.token_index)), out=self.posting_offsets[1:])
+        self.extra_postings = {}
+
+    def updated(self, records, changed):
+        """A new SkuMemory over records with the changed rows merged into copies of the indexes
+
+        records is the store's table after a write and changed maps each
+        written row to the record it held before (None for appended rows),
+        so a write costs the size of the write, not of the table. Returns
+        None when an update takes away the SKU or brand an index entry
+        points at; build a new SkuMemory then.
+        """
+        memory = copy.copy(self)
+        memory.records = records
+        memory.sku_index = self.sku_index.copy(key_of=memory._sku_of)
+        memory.brand_index = dict(self.brand_index)
+        memory.extra_postings = dict(self.extra_postings)
+        counts = []
+        for row in sorted(changed):
+            old, record = changed[row], records[row]
+            if old is not None:
+                # 同一行的描述 key 不变，分词也就不变；只有 SKU、品牌可能被改掉
+                if tokenize(old["Item Description"]) != tokenize(record["Item Description"]):
+                    return None
+                old_sku, old_brand = old["SKU"].strip(), old["Brand"].strip().lower()
+                if old_sku != record["SKU"].strip() and old_sku and self.sku_index.get(old_sku) == row:
+                    return None
+                if old_brand != record["Brand"].strip().lower() and self.brand_index.get(old_brand) == row:
+                    return None
+            else:
+                # 追加的行号都大于已有的行，倒排表按行号升序直接追加
+                words = tokenize(record["Item Description"]) if record["Item Description"] else []
+                counts.append(len(words))
+                for token in set(words):
+                    memory.extra_postings[token] = memory.extra_postings.get(token, ()) + (row,)
+            # 与整体建索引一致：同一个 SKU / 品牌取行号最小的一行
+            sku, brand = record["SKU"].strip(), record["Brand"].strip().lower()
+            if sku:
+                current = memory.sku_index.get(sku)
+                if current is None or current > row:
+                    memory.sku_index[sku] = row
+            if brand and memory.brand_index.get(brand, row) >= row:
+                memory.brand_index[brand] = row
+        if counts:
+            memory.token_counts = np.concatenate([self.token_counts, np.array(counts, dtype=np.int32)])
+        return memory
+
+    def to_arrays(self, prefix):
+        """The indexes as flat arrays (the records are saved by their store); only for a freshly built instance"""
+        if self.extra_postings:
+            raise ValueError("build a new SkuMemory before saving it")
+        return {
+            **self.sku_index.to_arrays(f"{prefix}.sku"),
+            **StringColumn(list(self.brand_index)).to_arrays(f"{prefix}.brands"),
+            f"{prefix}.brand_rows": np.array(list(self.brand_index.values()), dtype=np.int64),
+            **self.token_index.to_arrays(f"{prefix}.tokens"),
+            f"{prefix}.postings": self.postings,
+            f"{prefix}.posting_offsets": self.posting_offsets,
+            f"{prefix}.token_counts": self.token_counts,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, records):
+        memory = cls.__new__(cls)
+        memory.records = records
+        memory.sku_index = HashIndex.from_arrays(arrays, f"{prefix}.sku", key_of=memory._sku_of)
+        brands = StringColumn.from_arrays(arrays, f"{prefix}.brands")
+        memory.brand_index = dict(zip(brands, arrays[f"{prefix}.brand_rows"].tolist()))
+        memory.token_index = HashIndex.from_arrays(arrays, f"{prefix}.tokens")
+        memory.postings = arrays[f"{prefix}.postings"]
+        memory.posting_offsets = arrays[f"{prefix}.posting_offsets"]
+        memory.token_counts = arrays[f"{prefix}.token_counts"]
+        memory.extra_postings = {}
+        return memory
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def _sku_of(self, row):
+        return self.records[row]["SKU"].strip()
+
+    def _record(self, row):
+        return None if row is None else self.records[row]
+
+    def best_match(self, sku, brand, item_description):
+        """Best record by priority: Full SKU > Partial keyword > Brand"""
+        return (
+            self.sku_match(sku)
+            or self.best_keyword_match(item_description)
+            or self.brand_match(brand)
+        )
+
+    def sku_match(self, sku):
+        """Record whose SKU equals sku (after stripping), or None"""
+        return self._record(self.sku_index.get(sku.strip()))
+
+    def brand_match(self, brand):
+        """First record of the same brand (case-insensitive), or None"""
+        return self._record(self.brand_index.get(brand.strip().lower()))
+
+    def best_keyword_match(self, item_description, threshold=KEYWORD_MATCH_THRESHOLD):
+        """Best word-overlap match, scoring only records that share a token"""
+        desc_words = tokenize(item_description)
+        distinct = set(desc_words)
+        offsets = self.posting_offsets
+        postings = [
+            self.postings[offsets[t]:offsets[t + 1]] for t in map(self.token_index.get, distinct) if t is not None
+        ]
+        postings += [
+            np.array(self.extra_postings[token], dtype=np.int32) for token in distinct if token in self.extra_postings
+        ]
+        if not postings:
+            return None
+
+        rows, hits = np.unique(np.concatenate(postings), return_counts=True)
+        scores = hits / np.maximum(len(desc_words), self.token_counts[rows])
+        # argmax 取第一个最大值：分数相同时取最早的记录，与逐条扫描的结果一致
+        best = int(np.argmax(scores))
+        if scores[best] > threshold:
+            return self.records[int(rows[best])]
+        return None
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the rows and indexes"""
+        return (
+            self.records.nbytes + self.sku_index.nbytes + self.token_index.nbytes
+            + self.postings.nbytes + self.posting_offsets.nbytes + self.token_counts.nbytes
+        )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _open_store(path):
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(key, SkuStore(path))
+    return store
+
+
+_open_store_cached = None
+
+
+def _shared_store(path):
+    """One store per file for the whole process
+
+    Under Streamlit the registry goes through st.cache_resource, so every
+    session and rerun reuses the same loaded copy and "Clear cache" drops it.
+    """
+    global _open_store_cached
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        from streamlit import runtime
+        if runtime.exists():
+            if _open_store_cached is None:
+                _open_store_cached = st.cache_resource(show_spinner=False)(_open_store)
+            return _open_store_cached(os.path.abspath(path))
+    return _open_store(path)
+
+
+def get_sku_store(path):
+    """Return the shared, up-to-date SkuStore for path"""
+    return _shared_store(path).refresh()
+
+
+def csv_schema_version(path):
+    """SCHEMA_VERSION for a SKU_FIELDS header, 1 for either old header, None for a missing or empty file"""
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+    if header is None:
+        return None
+    return SCHEMA_VERSION if set(SKU_FIELDS) <= {name.strip() for name in header} else 1
+
+
+def _load_unshared(path):
+    store = SkuStore(path)
+    store.snapshot = False
+    return store.refresh()
+
+
+def _backup(path):
+    if os.path.exists(path):
+        os.replace(path, path + BACKUP_SUFFIX)
+
+
+def migrate_csv(path, memory_path=None):
+    """Bring the SKU database at path to SCHEMA_VERSION; returns the number of rows rewritten (0: nothing to do)
+
+    The version-1 memory file (data/sku_memory_db.csv next to path by
+    default) is folded in: its rows are merged by row_key after the rows of
+    path, only filling fields that are still empty, so reference values win
+    and a second SKU for the same description keeps a row of its own.
+    Journals are replayed first. The old files are kept as
+    *.v1.bak and the memory file is moved out of the way.
+    """
+    if memory_path is None:
+        memory_path = os.path.join(os.path.dirname(path), LEGACY_MEMORY_PATH)
+    with file_lock(path):
+        old_header = csv_schema_version(path) == 1
+        has_memory = os.path.exists(memory_path)
+        if not old_header and not has_memory:
+            return 0
+
+        store = _load_unshared(path)
+        records = [dict(record) for record in store.records]
+        positions = dict(store.index.items())
+
+        def current(key):
+            position = positions.get(key)
+            return None if position is None else records[position]
+
+        if has_memory:
+            for record in _load_unshared(memory_path).records:
+                key = row_key(record, current)
+                position = positions.get(key)
+                if position is None:
+                    if SKU_KEY_SEPARATOR in key:
+                        logger.info("Keeping SKU %s as its own row: its description is shared with SKU %s",
+                                    record["SKU"], current(description_key(record["Item Description"]))["SKU"])
+                    positions[key] = len(records)
+                    records.append(dict(record))
+                else:
+                    records[position] = merge_record(records[position], record, fill_empty=True)
+
+        if old_header:
+            shutil.copy2(path, path + BACKUP_SUFFIX)
+        write_csv_atomic(path, SKU_FIELDS, records)
+        if os.path.exists(store.journal_path):
+            shutil.copy2(store.journal_path, store.journal_path + BACKUP_SUFFIX)
+            replace_with_empty(store.journal_path)
+        if has_memory:
+            _backup(memory_path)
+            _backup(memory_path + JOURNAL_SUFFIX)
+            for suffix in (LOCK_SUFFIX, SNAPSHOT_SUFFIX):
+                if os.path.exists(memory_path + suffix):
+                    os.remove(memory_path + suffix)
+    logger.info("Migrated %s to SKU schema version %d (%d rows)", path, SCHEMA_VERSION, len(records))
+    return len(records)
+
+
+_migrated = set()
+
+
+def ensure_schema(path):
+    """migrate_csv(path) once per process"""
+    key = os.path.abspath(path)
+    if key not in _migrated:
+        migrate_csv(path)
+        _migrated.add(key)
+
+
+class CsvBackend:
+    """SKU storage backend over the CSV file (the default)
+
+    Every backend offers the same operations, so utils and the app never
+    depend on how the data is stored:
+    lookup / lookup_many for exact description matches, memory_match /
+    memory_index for the SKU > keyword > brand tiers, reference_records /
+    reference_version / record_count / derived for whole-table readers,
+    upsert for writes, and last_seq / changes_since / apply_changes for
+    delta sync between instances (sku_sync.py). All of them work on the
+    same SKU_FIELDS records. Opening a backend migrates version-1 files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        ensure_schema(path)
+
+    def reference(self):
+        return get_sku_store(self.path)
+
+    def lookup(self, item_description):
+        return self.reference().lookup(item_description)
+
+    def lookup_many(self, keys):
+        return self.reference().lookup_many(keys)
+
+    def reference_records(self):
+        return self.reference().records
+
+    def reference_version(self):
+        return self.reference().version
+
+    def record_count(self):
+        return len(self.reference())
+
+    def derived(self, name, build):
+        """build(backend), cached until the data changes"""
+        return self.reference().derived(name, lambda store: build(self))
+
+    def upsert(self, records, overwrite=True, fill_empty=False):
+        return self.reference().bulk_upsert(records, overwrite=overwrite, fill_empty=fill_empty)
+
+    def last_seq(self):
+        """Sequence number of the latest logged write, 0 before the first one"""
+        return self.reference().changes.last_seq()
+
+    def changes_since(self, seq):
+        """Latest change of every record written after seq, as {"seq", "ts", "origin", "key", "record"} in seq order"""
+        return self.reference().changes.since(seq)
+
+    def apply_changes(self, changes):
+        return self.reference().apply_changes(changes)
+
+    def memory_match(self, sku, brand, item_description):
+        return self.reference().memory.best_match(sku, brand, item_description)
+
+    def memory_index(self):
+        return self.reference().memory
+
+    def __contains__(self, item_description):
+        return item_description in self.reference()
+
+
+def get_backend(path):
+    """Storage backend for the SKU data at path, chosen by $SKU_BACKEND (csv | sqlite)"""
+    kind = os.environ.get(BACKEND_ENV, "csv").strip().lower()
+    if kind == "sqlite":
+        from sku_sqlite import get_sqlite_backend
+        return get_sqlite_backend(os.environ.get(SQLITE_PATH_ENV, DEFAULT_SQLITE_PATH))
+    if kind != "csv":
+        raise ValueError(f"Unknown {BACKEND_ENV}: {kind!r} (expected 'csv' or 'sqlite')")
+    return CsvBackend(path)
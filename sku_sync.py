@@ -0,0 +1,121 @@
+"""
+Incremental sync of the SKU database between app instances
+
+    python sku_sync.py status
+    python sku_sync.py export --since 1200 [-o delta.jsonl.gz]
+    python sku_sync.py import delta.jsonl.gz [more.jsonl.gz ...]
+
+Every write to the SKU database is logged with a local sequence number and
+a (timestamp, origin) version stamp (sku_store.ChangeLog for the CSV,
+change columns for SQLite). export writes the latest change of every record
+written after sequence N to a small gzip-compressed JSON-lines delta; import
+merges a delta with last-writer-wins per description key, so importing the
+same delta twice, or deltas in any order, gives the same result. Note the
+"until" sequence printed by export: it is the --since for the next export
+to the same peer.
+
+Records edited by hand in the CSV are not in the change log; ship the
+whole file for those.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+
+import utils
+from sku_store import SCHEMA_VERSION, SKU_FIELDS, get_backend, instance_origin
+
+DELTA_FORMAT = "sku-delta"
+DELTA_VERSION = 1
+DELTA_SUFFIX = ".jsonl.gz"
+
+
+def write_delta(changes, since, until, origin=None):
+    """A delta file as bytes: a header line, then one [seq, ts, origin, values] line per change"""
+    header = {
+        "format": DELTA_FORMAT, "version": DELTA_VERSION, "schema": SCHEMA_VERSION, "fields": SKU_FIELDS,
+        "origin": origin or instance_origin(), "since": since, "until": until, "count": len(changes),
+    }
+    lines = [json.dumps(header, ensure_ascii=False)]
+    for change in changes:
+        values = [change["record"][field] for field in SKU_FIELDS]
+        lines.append(json.dumps([change["seq"], change["ts"], change["origin"], values], ensure_ascii=False))
+    # mtime=0：同样的变更得到完全相同的文件
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), mtime=0)
+
+
+def read_delta(data):
+    """(header, changes) from delta bytes; changes are {"seq", "ts", "origin", "record"} dicts"""
+    try:
+        lines = gzip.decompress(data).decode("utf-8").splitlines()
+        header = json.loads(lines[0])
+    except (OSError, EOFError, UnicodeDecodeError, IndexError, ValueError) as e:
+        raise ValueError(f"Not a SKU delta file: {e}") from e
+    if not isinstance(header, dict) or header.get("format") != DELTA_FORMAT:
+        raise ValueError("Not a SKU delta file")
+    if header.get("version") != DELTA_VERSION:
+        raise ValueError(f"Unsupported SKU delta version {header.get('version')!r}")
+    fields = header["fields"]
+    changes = []
+    for line in lines[1:]:
+        if line.strip():
+            seq, ts, origin, values = json.loads(line)
+            # 按文件里的字段名取值，字段顺序不同的导出也能读
+            changes.append({"seq": seq, "ts": ts, "origin": origin, "record": dict(zip(fields, values))})
+    return header, changes
+
+
+def export_delta(backend, since=0):
+    """(delta bytes, header) with the latest change of every record written after sequence since"""
+    changes = backend.changes_since(since)
+    until = max([since] + [change["seq"] for change in changes])
+    data = write_delta(changes, since, until)
+    return data, read_delta(data)[0]
+
+
+def import_delta(backend, data):
+    """Merge a delta into backend; returns {"origin", "until", "applied", "skipped"}"""
+    header, changes = read_delta(data)
+    applied, skipped = backend.apply_changes(changes)
+    return {"origin": header["origin"], "until": header["until"], "applied": applied, "skipped": skipped}
+
+
+def delta_file_name(header):
+    return f"sku_delta_{header['origin']}_{header['since']}-{header['until']}{DELTA_SUFFIX}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sku-sync", description="Export and import SKU database deltas")
+    parser.add_argument("--db", default=utils.SKU_DB, help="SKU database (SKU_BACKEND=sqlite is honoured)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show this instance's origin and latest sequence number")
+    export = commands.add_parser("export", help="write the changes after a sequence number to a delta file")
+    export.add_argument("--since", type=int, default=0, help="last sequence number the peer already has")
+    export.add_argument("-o", "--out", default=None, help="delta file (default: sku_delta_<origin>_<since>-<until>.jsonl.gz)")
+    imports = commands.add_parser("import", help="merge delta files, last writer wins per record")
+    imports.add_argument("deltas", nargs="+", help="delta files written by export")
+    args = parser.parse_args(argv)
+
+    backend = get_backend(args.db)
+    if args.command == "status":
+        print(f"📍 Origin {instance_origin()}, latest sequence {backend.last_seq()}")
+    elif args.command == "export":
+        data, header = export_delta(backend, args.since)
+        out = args.out or delta_file_name(header)
+        with open(out, "wb") as f:
+            f.write(data)
+        print(f"✅ {header['count']} changes ({len(data):,} bytes) written to {out}; "
+              f"next time export with --since {header['until']}")
+    else:
+        for path in args.deltas:
+            with open(path, "rb") as f:
+                result = import_delta(backend, f.read())
+            print(f"✅ {os.path.basename(path)} from {result['origin']}: "
+                  f"{result['applied']} applied, {result['skipped']} already up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
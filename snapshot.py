@@ -0,0 +1,116 @@
+"""
+Versioned binary snapshots of the SKU stores, memory-mapped for fast cold start
+
+A snapshot is a cache of one CSV file in its loaded, indexed form: the
+columnar arrays and hash indexes of sku_store, laid out so they can be
+mapped straight back into numpy arrays without parsing. The CSV stays the
+source of truth; a snapshot whose recorded source signature no longer
+matches the CSV is ignored and rewritten.
+
+Layout: MAGIC, a little-endian uint64 header length, a JSON header
+({"format", "meta", "arrays": {name: [dtype, length, offset]}}), then the
+raw array data, each array aligned to ALIGN bytes.
+"""
+
+import json
+import logging
+import mmap
+import os
+import stat
+import struct
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SKUSNAP\n"
+FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snap"
+ALIGN = 64
+SNAPSHOT_ENV = "SKU_SNAPSHOT"
+
+# 读取 umask 只能先改再改回，进程启动时读一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def snapshots_enabled():
+    """Snapshots are on unless $SKU_SNAPSHOT is 0"""
+    return os.environ.get(SNAPSHOT_ENV, "1").strip() != "0"
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def replace_keeping_mode(tmp_path, path):
+    """os.replace(tmp_path, path), giving tmp_path the mode of the file it replaces
+
+    mkstemp creates files as 0600; without this an atomic rewrite would take
+    read access away from everyone else. A new file gets 0666 minus the umask.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(path, meta, arrays):
+    """Atomically write {name: ndarray} plus a JSON-able meta dict to path"""
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, len(array), offset]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"format": FORMAT_VERSION, "meta": meta, "arrays": layout}).encode("utf-8")
+    start = _aligned(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=SNAPSHOT_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(start + layout[name][2])
+                f.write(memoryview(array).cast("B"))
+            f.truncate(start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_keeping_mode(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_snapshot(path):
+    """(meta, {name: read-only ndarray}) memory-mapped from path, or None if missing or unreadable"""
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):  # ValueError: 空文件无法 mmap
+        return None
+    try:
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError("bad magic")
+        (length,) = struct.unpack_from("<Q", mapped, len(MAGIC))
+        header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+        if header.get("format") != FORMAT_VERSION:
+            return None
+        start = _aligned(len(MAGIC) + 8 + length)
+        arrays = {}
+        for name, (dtype, count, offset) in header["arrays"].items():
+            dtype = np.dtype(dtype)
+            if start + offset + count * dtype.itemsize > len(mapped):
+                raise ValueError(f"array {name!r} runs past the end of the file")
+            arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=start + offset) \
+                if count else np.empty(0, dtype=dtype)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        # 快照只是缓存：损坏就当作没有，之后从 CSV 重建
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+    return header["meta"], arrays
@@ -1,35 +1,12 @@
 import streamlit as st
-import requests
 import pandas as pd
+from utils import fuzzy_search_tariff
 
 st.set_page_config(page_title="UK Tariff Code Fuzzy Search", layout="centered")
 st.title("UK Tariff Code Fuzzy Search")
 
 st.write("Enter a product description in English (e.g. 'men's leather shoes', 'plastic bag', 'cotton shirt'). All similar commodity codes will be listed below.")
 
-def fuzzy_search_tariff(query):
-    url = f"https://www.trade-tariff.service.gov.uk/api/v2/search?q={query}"
-    headers = {"User-Agent": "dhl-tariff-app/1.0 (contact@example.com)"}
-    resp = requests.get(url, headers=headers)
-    try:
-        data = resp.json()
-    except Exception:
-        return []
-    results = []
-    if isinstance(data, dict) and isinstance(data.get('data', None), list):
-        for item in data['data']:
-            code = item.get('id', '')
-            desc = item.get('attributes', {}).get('description', '')
-            type_ = item.get('type', '')
-            if code and desc:
-                results.append({
-                    'Code': code,
-                    'Description': desc,
-                    'Type': type_,
-                    'Official Link': f"https://www.trade-tariff.service.gov.uk/commodities/{code}"
-                })
-    return results
-
 query = st.text_input("Product Description", "")
 
 if st.button("Search") and query.strip():
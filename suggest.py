@@ -0,0 +1,146 @@
+"""
+Approximate nearest-match suggestions over reference descriptions (character trigram index)
+"""
+
+import numpy as np
+
+from sku_store import description_key, match_fields
+
+DEFAULT_SUGGESTIONS = 3
+MIN_SCORE = 0.3
+# 每次查询最多读取的倒排项数：先取最少见的 trigram，足够挑出候选又不会扫全表
+POSTING_BUDGET = 8_000
+CANDIDATE_LIMIT = 200
+
+
+def _codes(text):
+    """Unicode code points of text as uint64"""
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def _trigram_codes(codes):
+    # 三个 21 位码点拼成一个 63 位整数
+    return (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+
+
+def trigrams(key):
+    """Distinct trigram codes of a normalized key, padded with a space on each side"""
+    return np.unique(_trigram_codes(_codes(f" {key} ")))
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to key ids, stored as sorted numpy arrays
+
+    Queries read the posting lists of their rarest trigrams (up to
+    POSTING_BUDGET entries) to pick at most CANDIDATE_LIMIT candidates, then
+    binary-search the remaining, common trigrams' posting lists to get each
+    candidate's exact trigram Jaccard similarity.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        if not self.keys:
+            self.grams = self.offsets = self.ids = np.zeros(0, dtype=np.uint64)
+            self.sizes = np.zeros(0, dtype=np.int64)
+            return
+
+        # 所有 key 拼成一个字符串一次性算 trigram，去掉跨越两个 key 的部分
+        padded = [f" {key} " for key in self.keys]
+        lengths = np.fromiter((len(p) for p in padded), dtype=np.int64, count=len(padded))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        grams = _trigram_codes(_codes("".join(padded)))
+        owner = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)[:len(grams)]
+        valid = np.arange(len(grams)) - starts[owner] <= lengths[owner] - 3
+        grams, owner = grams[valid], owner[valid]
+
+        # 按 (trigram, key id) 排序；同一个 key 内重复的 trigram 只算一次
+        order = np.lexsort((owner, grams))
+        grams, owner = grams[order], owner[order]
+        distinct = np.ones(len(grams), dtype=bool)
+        distinct[1:] = (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])
+        grams, owner = grams[distinct], owner[distinct]
+        self.sizes = np.bincount(owner, minlength=len(self.keys))
+        self.grams, starts = np.unique(grams, return_index=True)
+        self.offsets = np.append(starts, len(grams))
+        self.ids = owner
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, key, k=DEFAULT_SUGGESTIONS, min_score=MIN_SCORE):
+        """[(key_id, score)] for the k most similar keys with Jaccard score >= min_score"""
+        if not self.keys or not key:
+            return []
+        query = trigrams(key)
+        positions = np.searchsorted(self.grams, query)
+        found = positions < len(self.grams)
+        found[found] = self.grams[positions[found]] == query[found]
+        positions = positions[found]
+        if not len(positions):
+            return []
+
+        # 第一步：从最少见的 trigram 开始取倒排表，直到达到预算，得到候选
+        lengths = self.offsets[positions + 1] - self.offsets[positions]
+        order = np.argsort(lengths, kind="stable")
+        within = np.cumsum(lengths[order]) - lengths[order] < POSTING_BUDGET
+        rare, common = positions[order[within]], positions[order[~within]]
+        ids, shared = np.unique(
+            np.concatenate([self.ids[self.offsets[p]:self.offsets[p + 1]] for p in rare]), return_counts=True
+        )
+        if len(ids) > CANDIDATE_LIMIT:
+            keep = np.sort(np.argpartition(-shared, CANDIDATE_LIMIT)[:CANDIDATE_LIMIT])
+            ids, shared = ids[keep], shared[keep]
+
+        # 第二步：常见 trigram 的倒排表按 id 有序，二分查找补全候选的共享数，得到精确的 Jaccard 分数
+        for p in common:
+            posting = self.ids[self.offsets[p]:self.offsets[p + 1]]
+            found = np.searchsorted(posting, ids)
+            found[found == len(posting)] = 0
+            shared = shared + (posting[found] == ids)
+
+        scores = shared / (len(query) + self.sizes[ids] - shared)
+        # 分数相同时取 id 小（先出现）的 key
+        best = np.lexsort((ids, -scores))[:k]
+        return [(int(ids[i]), float(scores[i])) for i in best if scores[i] >= min_score]
+
+
+class SuggestionIndex:
+    """Trigram index over the reference records, one entry per canonical description"""
+
+    def __init__(self, records):
+        by_key = {}
+        for record in records:
+            # 与精确匹配一致：同一个 key 保留第一条
+            by_key.setdefault(description_key(record["Item Description"]), record)
+        self.records = list(by_key.values())
+        self.index = TrigramIndex(by_key.keys())
+
+    def __len__(self):
+        return len(self.records)
+
+    def suggest(self, item_description, k=DEFAULT_SUGGESTIONS, min_score=MIN_SCORE):
+        """Up to k similar reference records as dicts with the match fields plus Item Description and Score"""
+        results = []
+        for key_id, score in self.index.search(description_key(item_description), k, min_score):
+            record = self.records[key_id]
+            results.append({
+                "Item Description": record["Item Description"],
+                **match_fields(record),
+                "Score": round(score, 3),
+            })
+        return results
+
+
+def get_suggestion_index(backend):
+    """SuggestionIndex for a SKU backend, rebuilt only when its reference data changes"""
+    return backend.derived("suggestion_index", lambda b: SuggestionIndex(b.reference_records()))
+
+
+def suggest_matches(backend, descriptions, k=DEFAULT_SUGGESTIONS, min_score=MIN_SCORE):
+    """{description: [suggestions]} for each distinct description"""
+    descriptions = list(dict.fromkeys(descriptions))
+    if not descriptions:
+        # 没有要查的描述就不建索引
+        return {}
+    index = get_suggestion_index(backend)
+    return {description: index.suggest(description, k, min_score) for description in descriptions}
@@ -0,0 +1,113 @@
+"""
+Persistent cache and rate limiting for UK Tariff API lookups
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from normalize import normalize_description
+
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tariff_cache (
+    query_key TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+def tariff_query_key(item_description):
+    """Cache key of a description: the same normalize_description() key the SKU indexes use"""
+    return normalize_description(item_description)
+
+
+class TariffCache:
+    """query -> commodity code cache in a SQLite file, with separate TTLs for hits and misses
+
+    An empty code records that the API had no result (negative caching), so
+    the same unknown description is not asked again until negative_ttl passes.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, query_key):
+        """Return (hit, code); expired entries count as misses"""
+        row = self._connect().execute(
+            "SELECT code, fetched_at FROM tariff_cache WHERE query_key = ?", (query_key,)
+        ).fetchone()
+        if row is None:
+            return False, ""
+        code, fetched_at = row
+        ttl = self.ttl if code else self.negative_ttl
+        if time.time() - fetched_at > ttl:
+            return False, ""
+        return True, code
+
+    def set(self, query_key, code):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tariff_cache (query_key, code, fetched_at) VALUES (?, ?, ?)",
+            (query_key, code or "", time.time()),
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM tariff_cache")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: on average `rate` calls per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_tariff_cache(path):
+    """Return the shared TariffCache for the database file at path"""
+    key = os.path.abspath(path)
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = _caches[key] = TariffCache(path)
+    return cache
@@ -0,0 +1,184 @@
+"""
+Offline UK tariff nomenclature index (SQLite FTS5, BM25 ranking)
+
+    python tariff_index.py commodities.csv [--db data/tariff_index.sqlite3]
+
+The dump may be CSV (a code column such as "Commodity code" and a
+"Description" column, header names are matched case-insensitively) or the
+JSON returned by the tariff API ({"data": [{"id", "type", "attributes":
+{"description"}}]}).
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+from sku_store import tokenize
+
+DEFAULT_INDEX_PATH = "data/tariff_index.sqlite3"
+OFFICIAL_LINK = "https://www.trade-tariff.service.gov.uk/commodities/{}"
+
+CODE_COLUMNS = ["commodity code", "commodity_code", "goods_nomenclature_item_id", "code", "id"]
+DESCRIPTION_COLUMNS = ["description", "formatted_description", "goods_nomenclature_description"]
+TYPE_COLUMNS = ["type", "entity_type"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nomenclature (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT ''
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS nomenclature_fts USING fts5(
+    description, content='nomenclature', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+
+
+def _pick(columns, candidates):
+    lowered = {c.lower().strip(): c for c in columns}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def read_dump(path):
+    """Yield (code, description, type) rows from a CSV or JSON nomenclature dump"""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("data", []) if isinstance(data, dict) else data
+        for item in items:
+            attributes = item.get("attributes", {})
+            code = item.get("id") or attributes.get("goods_nomenclature_item_id", "")
+            description = attributes.get("description") or attributes.get("formatted_description", "")
+            yield str(code).strip(), str(description).strip(), str(item.get("type", "")).strip()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        code_col = _pick(reader.fieldnames or [], CODE_COLUMNS)
+        desc_col = _pick(reader.fieldnames or [], DESCRIPTION_COLUMNS)
+        type_col = _pick(reader.fieldnames or [], TYPE_COLUMNS)
+        if not code_col or not desc_col:
+            raise ValueError(f"{path}: need a commodity code column and a description column, got {reader.fieldnames}")
+        for row in reader:
+            yield (
+                (row.get(code_col) or "").strip(),
+                (row.get(desc_col) or "").strip(),
+                (row.get(type_col) or "").strip() if type_col else "",
+            )
+
+
+def _match_query(text):
+    # 每个词单独加引号再 OR，避免 FTS5 语法字符；BM25 让命中词越多的排得越前
+    return " OR ".join(f'"{word}"' for word in dict.fromkeys(tokenize(text)))
+
+
+class TariffIndex:
+    """Full-text index over tariff codes and descriptions, queried in milliseconds offline"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def import_rows(self, rows):
+        """Insert or replace (code, description, type) rows; returns how many were imported"""
+        conn = self._connect()
+        count = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for code, description, type_ in rows:
+                if not code or not description:
+                    continue
+                conn.execute(
+                    "INSERT INTO nomenclature (code, description, type) VALUES (?, ?, ?)"
+                    " ON CONFLICT(code) DO UPDATE SET description = excluded.description, type = excluded.type",
+                    (code, description, type_),
+                )
+                count += 1
+            # 外部内容表整体重建全文索引，比逐行维护快
+            conn.execute("INSERT INTO nomenclature_fts(nomenclature_fts) VALUES ('rebuild')")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def search(self, query, limit=20):
+        """Best-ranked matches as [{'Code', 'Description', 'Type', 'Official Link'}]"""
+        match = _match_query(query)
+        if not match:
+            return []
+        rows = self._connect().execute(
+            "SELECT n.code, n.description, n.type FROM nomenclature_fts f"
+            " JOIN nomenclature n ON n.id = f.rowid"
+            " WHERE nomenclature_fts MATCH ? ORDER BY bm25(nomenclature_fts) LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        return [{
+            "Code": row["code"],
+            "Description": row["description"],
+            "Type": row["type"],
+            "Official Link": OFFICIAL_LINK.format(row["code"]),
+        } for row in rows]
+
+    def best_code(self, query):
+        """Top-ranked commodity code for a description, or '' when nothing matches"""
+        results = self.search(query, limit=20)
+        for result in results:
+            if result["Type"].lower() == "commodity":
+                return result["Code"]
+        return results[0]["Code"] if results else ""
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM nomenclature").fetchone()[0]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_tariff_index(path):
+    """Shared TariffIndex for path, or None when no index has been imported there"""
+    if not os.path.exists(path):
+        return None
+    key = os.path.abspath(path)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _indexes[key] = TariffIndex(path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a tariff nomenclature dump into the offline search index")
+    parser.add_argument("dumps", nargs="+", help="CSV or JSON nomenclature dump files")
+    parser.add_argument("--db", default=os.environ.get("TARIFF_INDEX_DB", DEFAULT_INDEX_PATH))
+    args = parser.parse_args()
+
+    index = TariffIndex(args.db)
+    for dump in args.dumps:
+        count = index.import_rows(read_dump(dump))
+        print(f"✅ Imported {count} codes from {dump}")
+    print(f"📚 {len(index)} codes in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Test script for the benchmark suite harness (tiny sizes, results JSON and regression check)
+"""
+
+import os
+import tempfile
+import utils
+from benchmarks.bench_suite import BENCHMARKS, compare, load_results, run_suite, save_results
+
+def test_bench_suite():
+    print("🧪 Testing Benchmark Suite")
+    print("=" * 50)
+
+    # Test 1: Every benchmark runs on a small synthetic dataset, for both backends
+    print("\n1. Testing suite run:")
+    sku_db, backend_env = utils.SKU_DB, os.environ.get("SKU_BACKEND")
+    for backend in ("csv", "sqlite"):
+        document = run_suite([200], list(BENCHMARKS), repeat=1, backend=backend, log=lambda line: None)
+        print(f"   {backend}: {len(document['results'])} results, revision {document['meta']['revision']}")
+        assert [r["name"] for r in document["results"]] == list(BENCHMARKS)
+        assert all(r["size"] == 200 and r["min"] > 0 and r["ops"] > 0 for r in document["results"])
+    assert utils.SKU_DB == sku_db and os.environ.get("SKU_BACKEND") == backend_env
+
+    # Test 2: Results round-trip through JSON and slowdowns are flagged
+    print("\n2. Testing results comparison:")
+    path = save_results(document, os.path.join(tempfile.mkdtemp(), "run.json"))
+    baseline = load_results(path)
+    assert baseline == document
+    slower = {**document, "results": [dict(r, median=r["median"] * (1.5 if r["name"] == "pipeline" else 1.0))
+                                      for r in document["results"]]}
+    regressions = [row[0] for row in compare(baseline, slower, threshold=0.2) if row[-1]]
+    print(f"   regressions: {regressions}")
+    assert regressions == ["pipeline"]
+
+    print("\n✅ All benchmark suite tests completed successfully!")
+
+if __name__ == "__main__":
+    test_bench_suite()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact columnar SKU storage
+"""
+
+import os
+import random
+import tempfile
+import tracemalloc
+from benchmarks.bench_find_best_match import legacy_find_best_match, make_queries, make_records
+from columnar import ColumnarTable, HashIndex
+from normalize import normalize_description
+from sku_store import SKU_FIELDS, SkuMemory, SkuStore
+
+def test_columnar():
+    print("🧪 Testing Columnar SKU Storage")
+    print("=" * 50)
+
+    # Test 1: Rows read back as dict-like views; updates stay off the shared columns
+    print("\n1. Testing table and views:")
+    records = [{"SKU": f"S{i}", "Brand": "LV" if i % 2 else "GUCCI", "Item Description": f"BAG {i}",
+                "Commodity Code": "42022100", "Weight": "0.5", "Origin Country": "IT"} for i in range(5)]
+    table = ColumnarTable.from_records(SKU_FIELDS, records, SkuMemory.interned_fields)
+    assert list(table) == records and table[-1] == records[4] and dict(table[2]) == records[2]
+    print(f"   {table[1]!r}")
+    copy = table.copy()
+    copy[1] = dict(records[1], Weight="0.9")
+    copy.append(dict(records[0], SKU="S5"))
+    assert table[1]["Weight"] == "0.5" and len(table) == 5
+    assert copy[1]["Weight"] == "0.9" and len(copy) == 6
+    assert list(copy.packed()) == list(copy) and copy.column("SKU")[-1] == "S5"
+
+    # Test 2: Hash index keeps the first row per key, with or without stored keys
+    print("\n2. Testing hash index:")
+    keys = ["gucci belt", "lv bag", "gucci belt", "prada", "dior"]  # 第 5 行之后才加入索引
+    for index in (HashIndex(keys[:4]), HashIndex(keys[:4], key_of=keys.__getitem__)):
+        assert index.get("gucci belt") == 0 and index.get("prada") == 3 and index.get("dior") is None
+        assert index.get_many(["lv bag", "dior", "prada"]) == {"lv bag": 1, "prada": 3}
+        index["dior"] = 4
+        assert "dior" in index and dict(index.packed().items()) == {"gucci belt": 0, "lv bag": 1, "prada": 3, "dior": 4}
+
+    # Test 3: SkuMemory answers exactly like the original linear scan
+    print("\n3. Testing SkuMemory against the linear scan:")
+    rng = random.Random(3)
+    memory_records = make_records(2000, rng)
+    memory_records[10]["SKU"] = ""
+    memory = SkuMemory(memory_records)
+    queries = make_queries(2000, rng) + [(record["SKU"], "", "") for record in memory_records[:20]]
+    for sku, brand, description in queries:
+        assert memory.best_match(sku, brand, description) == legacy_find_best_match(
+            sku, brand, description, memory_records)
+    print(f"   ✅ {len(queries)} queries agree")
+
+    # Test 4: The stores hold far less memory than a list of dicts
+    print("\n4. Testing memory footprint:")
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("SKU,Brand,Item Description,Commodity Code,Weight,Origin Country\n")
+        for i in range(50_000):
+            f.write(f",,{rng.choice(['LV', 'GUCCI', 'PRADA'])} LEATHER BAG MODEL {i},"
+                    f"{rng.choice(['42022100', '42023100', '61091000'])},0.{i % 9 + 1},{rng.choice(['IT', 'FR'])}\n")
+    # 规范化的 lru_cache 有上限，与库大小无关，不计入
+    normalize_description.cache_clear()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    # 不写快照：写快照时会顺带建好 SKU/关键词索引，这里只比较行数据和描述索引
+    store = SkuStore(path)
+    store.snapshot = False
+    store.refresh()
+    normalize_description.cache_clear()
+    store_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    as_dicts = [dict(record) for record in store.records]
+    dict_bytes = tracemalloc.get_traced_memory()[0] - baseline - store_bytes
+    tracemalloc.stop()
+    print(f"   list of dicts: {dict_bytes / 1e6:.1f} MB, columnar store with index: {store_bytes / 1e6:.1f} MB")
+    assert store_bytes * 4 < dict_bytes
+    assert store.lookup(as_dicts[7]["Item Description"].lower()) == {
+        "Commodity Code": as_dicts[7]["Commodity Code"], "Weight": "0.8", "Origin Country": as_dicts[7]["Origin Country"]}
+    del as_dicts
+
+    # Test 5: Journal updates and compaction keep lookups and the memory index right
+    print("\n5. Testing updates and compaction:")
+    store.compact_threshold = 3
+    store.bulk_upsert([{"Item Description": f"NEW ITEM {i}", "Commodity Code": "1", "Weight": "1",
+                        "Origin Country": "CN"} for i in range(2)])
+    assert store.lookup("new item 1")["Origin Country"] == "CN" and len(store.records._extra) == 2
+    store.bulk_upsert([{"Item Description": "NEW ITEM 0", "Commodity Code": "2"}])
+    assert not store.records._extra and store.lookup("new item 0")["Commodity Code"] == "2"
+    assert SkuStore(path).refresh().lookup("NEW ITEM 0")["Commodity Code"] == "2"
+
+    memory_path = os.path.join(tmp_dir, "sku_memory_db.csv")
+    memory_store = SkuStore(memory_path).refresh()
+    memory_store.bulk_upsert(memory_records[:50])
+    memory = memory_store.memory
+    memory_store.bulk_upsert([dict(memory_records[3], Weight="9.9")])
+    assert memory_store.memory.sku_match(memory_records[3]["SKU"])["Weight"] == "9.9"
+    assert len(memory_store.memory) == 50
+
+    # Test 6: Writes merge their rows into the existing memory index instead of rebuilding it
+    print("\n6. Testing incremental memory updates:")
+    memory_store.bulk_upsert(memory_records[50:80] + [dict(memory_records[60], SKU="")])
+    memory_store.bulk_upsert([{"SKU": "EXTRA-1", "Brand": "NEWBRAND", "Item Description": "NEWBRAND SILK SCARF"}])
+    assert memory_store.memory.postings is memory.postings and len(memory_store.memory) == 81
+    checks = queries + [(record["SKU"], record["Brand"], "") for record in memory_records[:80]]
+    checks += [("EXTRA-1", "", ""), ("", "newbrand", ""), ("", "", "silk scarf")]
+    fresh = SkuMemory(memory_store.records)
+    for sku, brand, description in checks:
+        assert memory_store.memory.best_match(sku, brand, description) == fresh.best_match(sku, brand, description)
+    # 改掉索引指向的品牌时整体重建，结果仍一致
+    brand_row = memory_store.memory.brand_index[memory_records[5]["Brand"].lower()]
+    memory_store.bulk_upsert([dict(memory_store.records[brand_row], Brand="RENAMED")])
+    assert memory_store._memory is None
+    fresh = SkuMemory(memory_store.records)
+    for sku, brand, description in checks + [("", "renamed", "")]:
+        assert memory_store.memory.best_match(sku, brand, description) == fresh.best_match(sku, brand, description)
+    print(f"   ✅ {len(checks)} queries agree with a rebuilt index")
+
+    print("\n✅ All columnar storage tests completed successfully!")
+
+if __name__ == "__main__":
+    test_columnar()
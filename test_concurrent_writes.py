@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Multi-process stress test for concurrent SKU database writes
+"""
+
+import csv
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from sku_store import SKU_FIELDS, SkuStore, description_key, read_csv_records
+
+WRITERS = 6
+RECORDS_PER_WRITER = 200
+SHARED_KEYS = 20
+COMPACT_EVERY = 40
+
+def writer(path, writer_id):
+    store = SkuStore(path)
+    store.compact_threshold = COMPACT_EVERY
+    rng = random.Random(writer_id)
+    records = [
+        {"Item Description": f"WRITER {writer_id} ITEM {i}", "Commodity Code": "42022100",
+         "Weight": "0.5", "Origin Country": "IT"}
+        for i in range(RECORDS_PER_WRITER)
+    ]
+    position = 0
+    while position < len(records):
+        size = rng.randint(1, 15)
+        batch = records[position:position + size]
+        position += size
+        # 每批都顺带更新共享 key，制造写冲突
+        batch.append({"Item Description": f"SHARED {rng.randrange(SHARED_KEYS)}", "Commodity Code": "61091000",
+                      "Weight": f"{writer_id}.{position}", "Origin Country": "CN"})
+        store.bulk_upsert(batch)
+
+def reader(path, stop):
+    store = SkuStore(path)
+    seen = 0
+    while not stop.is_set():
+        store.refresh()
+        keys = [description_key(record["Item Description"]) for record in store.records]
+        assert len(keys) == len(set(keys)), "reader saw duplicated records"
+        assert len(keys) >= seen, "reader saw records disappear"
+        seen = len(keys)
+        time.sleep(0.001)
+
+def test_concurrent_writes():
+    print("🧪 Testing Concurrent SKU Database Writes")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer_csv = csv.DictWriter(f, fieldnames=SKU_FIELDS)
+        writer_csv.writeheader()
+        writer_csv.writerow({"Item Description": "LV SPEEDY BAG", "Commodity Code": "42022100",
+                             "Weight": "0.9", "Origin Country": "FR"})
+
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    readers = [ctx.Process(target=reader, args=(path, stop)) for _ in range(2)]
+    writers = [ctx.Process(target=writer, args=(path, i)) for i in range(WRITERS)]
+    start = time.perf_counter()
+    for process in readers + writers:
+        process.start()
+    for process in writers:
+        process.join()
+    stop.set()
+    for process in readers:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n1. {WRITERS} writers x {RECORDS_PER_WRITER} records finished in {elapsed:.2f}s")
+    assert all(process.exitcode == 0 for process in writers + readers), "a writer or reader failed"
+
+    # Test 2: Base + journal holds every record exactly once
+    print("\n2. Checking for lost or duplicated records:")
+    store = SkuStore(path).refresh()
+    keys = [description_key(record["Item Description"]) for record in store.records]
+    expected = 1 + WRITERS * RECORDS_PER_WRITER + SHARED_KEYS
+    print(f"   records={len(keys)}, unique={len(set(keys))}, expected={expected}")
+    assert len(keys) == len(set(keys)) == expected
+    for writer_id in range(WRITERS):
+        for i in range(RECORDS_PER_WRITER):
+            assert f"writer {writer_id} item {i}" in store.index
+
+    # Test 3: Compaction folds everything into the CSV
+    print("\n3. Checking compaction:")
+    store.compact()
+    rows = read_csv_records(path, SKU_FIELDS)
+    assert len(rows) == expected
+    assert os.path.getsize(store.journal_path) == 0
+    print(f"   ✅ {len(rows)} rows in the compacted CSV, journal empty")
+
+    print("\n✅ Concurrent write test completed successfully!")
+
+if __name__ == "__main__":
+    test_concurrent_writes()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for the incremental SKU database sync
+"""
+
+import os
+import tempfile
+import time
+from sku_sqlite import SqliteBackend
+from sku_store import ORIGIN_ENV, CsvBackend, SkuStore
+from sku_sync import export_delta, import_delta, main, read_delta
+
+def write_on(origin, backend, records):
+    os.environ[ORIGIN_ENV] = origin
+    try:
+        return backend.upsert(records)
+    finally:
+        del os.environ[ORIGIN_ENV]
+
+def test_delta_sync():
+    print("🧪 Testing Incremental SKU Sync")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    paths = {}
+    for name in ("a", "b", "c"):
+        os.makedirs(os.path.join(tmp_dir, name))
+        paths[name] = os.path.join(tmp_dir, name, "sku_reference_data.csv")
+    a, b, c = (CsvBackend(paths[name]) for name in "abc")
+
+    # Test 1: Every write gets the next sequence number; deltas keep the latest change per key
+    print("\n1. Testing the change log:")
+    write_on("shop-a", a, [
+        {"Item Description": "LV SPEEDY BAG", "Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "FR"},
+        {"Item Description": "GUCCI BELT", "Commodity Code": "4203301000", "Weight": "0.3", "Origin Country": "IT"},
+    ])
+    write_on("shop-a", a, [{"Item Description": "gucci belt", "Weight": "0.4"}])
+    assert a.last_seq() == 3
+    changes = a.changes_since(0)
+    assert [(change["seq"], change["record"]["Weight"]) for change in changes] == [(1, "0.9"), (3, "0.4")]
+    assert [change["seq"] for change in a.changes_since(1)] == [3] and a.changes_since(3) == []
+    print(f"   ✅ latest sequence {a.last_seq()}, {len(changes)} keys changed")
+
+    # Test 2: Export/import round trip, idempotent on re-import
+    print("\n2. Testing export and import:")
+    data, header = export_delta(a, 0)
+    assert header["until"] == 3 and header["count"] == 2 and header["origin"]
+    result = import_delta(b, data)
+    assert (result["applied"], result["skipped"]) == (2, 0)
+    assert b.lookup("GUCCI BELT") == {"Commodity Code": "4203301000", "Weight": "0.4", "Origin Country": "IT"}
+    assert import_delta(b, data)["applied"] == 0
+    # 转发的变更保留原始版本戳：B 再导出给 A 也不会产生新的变更
+    assert b.changes_since(0)[0]["origin"] == "shop-a"
+    assert import_delta(a, export_delta(b, 0)[0])["applied"] == 0
+    print(f"   ✅ {len(data)} byte delta applied once")
+
+    # Test 3: Last writer wins per key, whatever the import order
+    print("\n3. Testing last-writer-wins merges:")
+    since_a, since_b = a.last_seq(), b.last_seq()
+    write_on("shop-a", a, [{"Item Description": "GUCCI BELT", "Weight": "0.5"},
+                           {"Item Description": "DIOR SADDLE BAG", "Commodity Code": "42022100"}])
+    time.sleep(0.01)
+    write_on("shop-b", b, [{"Item Description": "GUCCI BELT", "Weight": "0.6"}])
+    delta_a, delta_b = export_delta(a, since_a)[0], export_delta(b, since_b)[0]
+    import_delta(a, delta_b)
+    import_delta(b, delta_a)
+    import_delta(c, delta_b)
+    import_delta(c, delta_a)
+    for backend in (a, b, c):
+        assert backend.lookup("gucci belt")["Weight"] == "0.6"
+        assert backend.lookup("DIOR SADDLE BAG")["Commodity Code"] == "42022100"
+    # 同一时间戳时按 origin 比较，结果仍然确定
+    tie = [{"ts": 9e9, "origin": origin, "record": {"Item Description": "TIE", "Weight": origin}}
+           for origin in ("x", "y")]
+    a.apply_changes(tie)
+    b.apply_changes(tie[::-1])
+    assert a.lookup("TIE") == b.lookup("TIE") and a.lookup("TIE")["Weight"] == "y"
+    print("   ✅ All instances converged")
+
+    # Test 4: Compaction of the CSV and of the change log keeps sequence numbers
+    print("\n4. Testing compaction:")
+    store = SkuStore(paths["a"]).refresh()
+    store.compact()
+    last, latest = store.changes.last_seq(), store.changes.since(0)
+    store.changes.compact(0)
+    assert store.changes.last_seq() == last and store.changes.since(0) == latest
+    write_on("shop-a", a, [{"Item Description": "PRADA SHOULDER BAG", "Weight": "0.7"}])
+    assert a.last_seq() == last + 1
+
+    # Test 5: A few changes to a large database make a small delta
+    print("\n5. Testing delta size:")
+    big = os.path.join(tmp_dir, "big.csv")
+    with open(big, "w", encoding="utf-8") as f:
+        f.write("SKU,Brand,Item Description,Commodity Code,Weight,Origin Country\n")
+        for i in range(50_000):
+            f.write(f"S{i},GUCCI,LEATHER BAG MODEL {i},42022100,0.{i % 9 + 1},IT\n")
+    big_backend = CsvBackend(big)
+    for i in range(20):
+        big_backend.upsert([{"Item Description": f"LEATHER BAG MODEL {i * 997}", "Weight": "2.5"}])
+    data, header = export_delta(big_backend, 10)
+    print(f"   {header['count']} changes: {len(data):,} bytes vs {os.path.getsize(big):,} byte CSV")
+    assert header["count"] == 10 and len(data) < 1000
+
+    # Test 6: The SQLite backend speaks the same deltas
+    print("\n6. Testing the SQLite backend:")
+    db = SqliteBackend(os.path.join(tmp_dir, "sku.sqlite3"))
+    result = import_delta(db, export_delta(a, 0)[0])
+    assert result["applied"] == 5 and db.lookup("GUCCI BELT")["Weight"] == "0.6"
+    assert import_delta(db, export_delta(a, 0)[0])["applied"] == 0
+    write_on("shop-db", db, [{"Item Description": "GUCCI BELT", "Weight": "0.8"}])
+    changes = db.changes_since(5)
+    assert [change["record"]["Weight"] for change in changes] == ["0.8"] and db.last_seq() == 6
+    import_delta(a, export_delta(db, 5)[0])
+    assert a.lookup("GUCCI BELT")["Weight"] == "0.8"
+
+    # 描述相同的两个 SKU 作为两行同步
+    since = a.last_seq()
+    write_on("shop-a", a, [{"SKU": "M1", "Item Description": "LV NEVERFULL MM", "Weight": "0.8"},
+                           {"SKU": "M2", "Item Description": "LV NEVERFULL MM", "Weight": "1.1"}])
+    for backend in (b, db):
+        assert import_delta(backend, export_delta(a, since)[0])["applied"] == 2
+        assert backend.memory_match("M2", "", "")["Weight"] == "1.1"
+        assert backend.memory_match("M1", "", "")["Weight"] == "0.8"
+        assert import_delta(backend, export_delta(a, since)[0])["applied"] == 0
+
+    # Test 7: Command line export/import and bad files
+    print("\n7. Testing the command line:")
+    out = os.path.join(tmp_dir, "delta.jsonl.gz")
+    assert main(["--db", paths["a"], "export", "--since", "0", "-o", out]) == 0
+    assert main(["--db", paths["c"], "import", out]) == 0
+    assert c.lookup("GUCCI BELT")["Weight"] == "0.8"
+    try:
+        read_delta(b"not a delta")
+        raise AssertionError("expected ValueError")
+    except ValueError as e:
+        print(f"   ✅ Rejected: {e}")
+
+    print("\n✅ All delta sync tests completed successfully!")
+
+if __name__ == "__main__":
+    test_delta_sync()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming DHL CSV exporter
+"""
+
+import os
+import tempfile
+import pandas as pd
+from dhl_export import DHL_COLUMNS, DHLExporter, export_dhl, format_commodity_code
+
+def sample_orders(n):
+    return pd.DataFrame({
+        "Item Description": [f"ITEM {i}" for i in range(n)],
+        "Selling Price": [100 + i for i in range(n)],
+        "Weight": ["0.5"] * n,
+        "Origin Country": ["IT"] * n,
+        "Commodity Code": ["4202210000", "42031000"] * (n // 2) + ["4202210000"] * (n % 2),
+        "is_matched": [True] * n,
+    })
+
+def test_dhl_export():
+    print("🧪 Testing Streaming DHL Export")
+    print("=" * 50)
+
+    # Test 1: Output matches the old DataFrame.to_csv export byte for byte
+    print("\n1. Testing output format:")
+    orders = sample_orders(3)
+    orders.loc[1, "Selling Price"] = float("nan")
+    orders["Selling Price"] = orders["Selling Price"].astype(object)
+    orders.loc[2, "Item Description"] = 'BAG, "LARGE"'
+    legacy = pd.DataFrame([
+        [1, "INV_ITEM", row["Item Description"], format_commodity_code(row["Commodity Code"]), 1, "PCS",
+         row["Selling Price"], "GBP", row["Weight"], "", row["Origin Country"], "", "", ""]
+        for _, row in orders.iterrows()
+    ], columns=DHL_COLUMNS).to_csv(index=False, header=False)
+    [(name, text)] = export_dhl(orders)
+    print(text)
+    assert name == "DHL_ready_file.csv"
+    assert text == legacy
+    assert format_commodity_code("4202210000") == "4202.21.00.00"
+    assert format_commodity_code(42031000) == "4203.10.00"
+
+    # Test 2: Splitting at the row limit
+    print("\n2. Testing split output:")
+    parts = export_dhl(sample_orders(25), max_rows=10)
+    print(f"   parts: {[(name, text.count(chr(10))) for name, text in parts]}")
+    assert [name for name, _ in parts] == [
+        "DHL_ready_file_part1.csv", "DHL_ready_file_part2.csv", "DHL_ready_file_part3.csv"
+    ]
+    assert [text.count("\n") for _, text in parts] == [10, 10, 5]
+    assert "".join(text for _, text in parts) == export_dhl(sample_orders(25))[0][1]
+
+    # Test 3: Writing parts to a directory
+    print("\n3. Testing directory output:")
+    directory = tempfile.mkdtemp()
+    with DHLExporter(directory=directory, max_rows=4, header=True) as exporter:
+        exporter.write_frame(sample_orders(6))
+    print(f"   files: {sorted(os.listdir(directory))}")
+    assert exporter.row_count == 6
+    for path, rows in zip(exporter.paths, [4, 2]):
+        df = pd.read_csv(path)
+        assert list(df.columns) == DHL_COLUMNS and len(df) == rows
+
+    print("\n✅ All DHL export tests completed successfully!")
+
+if __name__ == "__main__":
+    test_dhl_export()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the headless dhl-gen batch mode
+"""
+
+import csv
+import os
+import tempfile
+from dhl_gen import REPORT_NAME, expand_inputs, main
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+def test_dhl_gen():
+    print("🧪 Testing dhl-gen Batch Mode")
+    print("=" * 50)
+
+    tmp = tempfile.mkdtemp()
+    db = os.path.join(tmp, "sku_reference_data.csv")
+    write_csv(db, [
+        ["Item Description", "Commodity Code", "Weight", "Origin Country"],
+        ["LV SPEEDY BAG", "42022100", "0.9", "CN"],
+        ["GUCCI BELT", "4203301000", "0.3", "IT"],
+    ])
+    orders = os.path.join(tmp, "orders")
+    os.makedirs(orders)
+    for shop in range(3):
+        write_csv(os.path.join(orders, f"shop{shop}.csv"), [
+            ["Item Description", "Selling Price"],
+            ["LV SPEEDY BAG", 1200],
+            ["gucci belt", 800],
+            [],
+            [f"UNKNOWN ITEM {shop}", 50],
+        ])
+    write_csv(os.path.join(orders, "broken.csv"), [["Description", "Price"], ["X", 1]])
+    out = os.path.join(tmp, "out")
+
+    # Test 1: Directories and globs expand to order files
+    print("\n1. Testing input expansion:")
+    paths = expand_inputs([orders, os.path.join(orders, "shop*.csv")])
+    print(f"   {[os.path.basename(p) for p in paths]}")
+    assert len(paths) == 4
+
+    # Test 2: Parallel run writes one DHL file per order and one report
+    print("\n2. Testing parallel batch run:")
+    exit_code = main([orders, "--out", out, "--db", db, "--workers", "2"])
+    assert exit_code == 1  # broken.csv 缺列，其余文件照常处理
+    with open(os.path.join(out, "shop1_DHL.csv"), encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    print(f"   shop1_DHL.csv: {rows}")
+    assert rows[1][2:4] == ["gucci belt", "4203.30.10.00"]
+    assert len(rows) == 3 and rows[2][3] == ""
+
+    with open(os.path.join(out, REPORT_NAME), encoding="utf-8") as f:
+        report = list(csv.DictReader(f))
+    print(f"   report: {[(os.path.basename(r['Source File']), r['Item Description']) for r in report]}")
+    assert [r["Item Description"] for r in report] == [f"UNKNOWN ITEM {i}" for i in range(3)]
+    assert report[0]["Row"] == "5"  # 空行也算一行，与表格里的行号一致
+
+    # Test 3: Matched-only output
+    print("\n3. Testing --matched-only:")
+    assert main([os.path.join(orders, "shop0.csv"), "--out", out, "--db", db, "--matched-only"]) == 0
+    with open(os.path.join(out, "shop0_DHL.csv"), encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    print("\n✅ All dhl-gen tests completed successfully!")
+
+if __name__ == "__main__":
+    test_dhl_gen()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming order file ingestion
+"""
+
+import io
+import os
+import tempfile
+from ingest import MissingColumnsError, iter_order_batches, read_orders
+
+def test_ingest():
+    print("🧪 Testing Streaming Order Ingestion")
+    print("=" * 50)
+
+    # Test 1: CSV is read in chunks, keeping only the two order columns
+    print("\n1. Testing chunked CSV:")
+    lines = ["SKU, item description ,Brand,SELLING PRICE,Notes"]
+    lines += [f"S{i},ITEM {i},LV,{i}.5,note" for i in range(25)]
+    lines.append("S25,PRICE ON REQUEST,LV,POA,note")
+    source = io.BytesIO("\n".join(lines).encode("utf-8"))
+    batches = list(iter_order_batches(source, "orders.csv", batch_size=10))
+    print(f"   batch sizes: {[len(b) for b in batches]}")
+    assert [len(b) for b in batches] == [10, 10, 6]
+    assert list(batches[0].columns) == ["Item Description", "Selling Price"]
+    assert batches[0]["Selling Price"].iloc[1] == 1.5
+    assert batches[-1]["Selling Price"].iloc[-1] == "POA"
+    assert batches[0].index[0] == 2 and batches[-1].index[-1] == 27
+
+    # Test 2: XLSX is streamed through openpyxl read-only mode
+    print("\n2. Testing read-only XLSX:")
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Item Description", "Other", "Selling Price"])
+    for i in range(7):
+        sheet.append([f"ITEM {i}", "x", 100 + i])
+        if i == 2:
+            sheet.append([])
+    path = os.path.join(tempfile.mkdtemp(), "orders.xlsx")
+    workbook.save(path)
+    df = read_orders(path, batch_size=3)
+    print(df.to_string(index=False))
+    assert len(df) == 7 and df["Selling Price"].sum() == 721
+    lines = [line for batch in iter_order_batches(path, batch_size=3) for line in batch.index]
+    assert lines == [2, 3, 4, 6, 7, 8, 9]
+
+    # Test 3: Blank lines are skipped without shifting line numbers
+    print("\n3. Testing source line numbers:")
+    source = io.BytesIO(b"\nItem Description,Selling Price\nA,1\n\n,\nB,2\n")
+    batch = next(iter_order_batches(source, "orders.csv"))
+    print(batch.to_string())
+    assert list(batch.index) == [3, 6] and list(batch["Item Description"]) == ["A", "B"]
+
+    # Test 4: Missing columns are reported
+    print("\n4. Testing missing columns:")
+    try:
+        list(iter_order_batches(io.BytesIO(b"Description,Price\nA,1\n"), "orders.csv"))
+    except MissingColumnsError as e:
+        print(f"   ✅ {e}")
+    else:
+        raise AssertionError("missing columns were not detected")
+
+    print("\n✅ All ingestion tests completed successfully!")
+
+if __name__ == "__main__":
+    test_ingest()
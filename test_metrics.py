@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the stage timers, counters and Prometheus export
+"""
+
+import os
+import tempfile
+import time
+import pandas as pd
+import metrics
+import utils
+from matching import match_orders
+from sku_store import CsvBackend
+
+def test_metrics():
+    print("🧪 Testing Metrics")
+    print("=" * 50)
+    metrics.reset()
+
+    # Test 1: Stages, counters and histograms
+    print("\n1. Testing registry:")
+    with metrics.stage("parse", rows=500):
+        time.sleep(0.01)
+    try:
+        with metrics.stage("parse"):
+            raise ValueError("bad file")
+    except ValueError:
+        pass
+    for latency in (0.003, 0.04, 0.2, 9.0):
+        metrics.observe("api_latency_seconds", latency)
+    snap = metrics.snapshot()
+    table = metrics.stage_table(snap)
+    print(f"   {table}")
+    assert snap["stages"]["parse"]["calls"] == 2 and snap["stages"]["parse"]["rows"] == 500
+    assert snap["counters"]["parse_errors"] == 1
+    assert table[0]["Rows/s"] <= 50_000
+    buckets = dict(snap["histograms"]["api_latency_seconds"]["buckets"])
+    assert buckets[0.005] == 1 and buckets[0.05] == 2 and buckets[float("inf")] == 4
+
+    # Test 2: Instrumented lookups count hits and misses
+    print("\n2. Testing instrumented lookups:")
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("Item Description,Commodity Code,Weight,Origin Country\nGUCCI BELT,4203301000,0.3,IT\n")
+    sku_db, utils.SKU_DB = utils.SKU_DB, csv_path
+    try:
+        utils.exact_match_lookup("GUCCI BELT")
+        utils.exact_match_lookup("PRADA BAG")
+        utils.local_lookup("PRADA BAG")
+    finally:
+        utils.SKU_DB = sku_db
+    match_orders(pd.DataFrame({"Item Description": ["GUCCI BELT"] * 3 + ["LV BAG"], "Selling Price": [1] * 4}),
+                 CsvBackend(csv_path))
+    snap = metrics.snapshot()
+    rates = metrics.hit_rates(snap)
+    print(f"   hit rates: {rates}")
+    assert snap["stages"]["exact_match_lookup"]["calls"] == 2
+    assert snap["stages"]["match_orders"]["rows"] == 4
+    assert snap["counters"]["db_rows_scanned"] == 1
+    assert rates["sku_lookup"] == 4 / 6
+    assert metrics.hit_rate({"match_cache_lookups": 4, "match_cache_misses": 1}, "match_cache") == 0.75
+
+    # Test 3: Prometheus text file
+    print("\n3. Testing Prometheus export:")
+    path = metrics.write_prometheus(os.path.join(tmp_dir, "metrics", "dhl.prom"))
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    print("   " + "\n   ".join(text.splitlines()[4:8]))
+    assert 'dhl_stage_calls_total{stage="exact_match_lookup"} 2' in text
+    assert 'dhl_api_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "dhl_sku_lookup_hits_total 4" in text
+    assert metrics.write_prometheus("") is None
+
+    # Test 4: Overhead stays in the microseconds
+    print("\n4. Testing overhead:")
+    noop = metrics.timed("noop")(lambda: None)
+    start = time.perf_counter()
+    for _ in range(10_000):
+        noop()
+    per_call = (time.perf_counter() - start) / 10_000
+    print(f"   {per_call * 1e6:.2f} µs per timed call")
+    assert per_call < 50e-6
+
+    metrics.reset()
+    print("\n✅ All metrics tests completed successfully!")
+
+if __name__ == "__main__":
+    test_metrics()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-file matching and zipped per-file DHL export
+"""
+
+import io
+import os
+import tempfile
+import zipfile
+from dhl_export import export_dhl_by_source, zip_parts
+from matching import SOURCE_COLUMN, UPLOAD_COLUMN, match_order_files
+from sku_store import CsvBackend
+
+def test_multi_file():
+    print("🧪 Testing Multi-file Upload Processing")
+    print("=" * 50)
+
+    db = os.path.join(tempfile.mkdtemp(), "sku_reference_data.csv")
+    with open(db, "w", encoding="utf-8") as f:
+        f.write("Item Description,Commodity Code,Weight,Origin Country\n")
+        f.write("LV SPEEDY BAG,42022100,0.9,CN\n")
+    store = CsvBackend(db)
+
+    # Test 1: Files are matched in parallel and combined in upload order
+    print("\n1. Testing parallel matching:")
+    files = [
+        (f"shop{i}.csv", io.BytesIO(f"Item Description,Selling Price\nLV SPEEDY BAG,{i}\nITEM {i},5\n".encode()))
+        for i in range(6)
+    ]
+    files.insert(2, ("bad.csv", io.BytesIO(b"Description,Price\nX,1\n")))
+    df, summary, errors = match_order_files(files, store, max_workers=4)
+    print(df.to_string(index=False))
+    assert list(df[SOURCE_COLUMN].unique()) == [f"shop{i}.csv" for i in range(6)]
+    assert [s["Matched"] for s in summary] == [1] * 6
+    assert list(errors) == ["bad.csv"]
+
+    # Test 2: One DHL file per upload, packed into a zip; uploads sharing a name stay apart
+    print("\n2. Testing zipped per-file export:")
+    files.append(("shop1.csv", io.BytesIO(b"Item Description,Selling Price\nOTHER ITEM,7\n")))
+    for _, source in files:
+        source.seek(0)
+    df, summary, errors = match_order_files(files, store, max_workers=4)
+    assert list(df[UPLOAD_COLUMN].unique()) == [0, 1, 3, 4, 5, 6, 7]
+    parts = export_dhl_by_source(df, SOURCE_COLUMN, UPLOAD_COLUMN)
+    archive = zipfile.ZipFile(io.BytesIO(zip_parts(parts)))
+    print(f"   {archive.namelist()}")
+    assert archive.namelist() == [f"shop{i}_DHL.csv" for i in range(6)] + ["shop1_2_DHL.csv"]
+    assert archive.read("shop3_DHL.csv").decode().splitlines()[0].startswith("1,INV_ITEM,LV SPEEDY BAG,4202.21.00")
+    assert "OTHER ITEM" in archive.read("shop1_2_DHL.csv").decode()
+    assert "OTHER ITEM" not in archive.read("shop1_DHL.csv").decode()
+
+    print("\n✅ All multi-file tests completed successfully!")
+
+if __name__ == "__main__":
+    test_multi_file()
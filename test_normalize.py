@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for description normalization and the canonical key column
+"""
+
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+from matching import match_orders
+from normalize import normalize_description
+from sku_sqlite import SqliteBackend
+from sku_store import CsvBackend
+
+def test_normalize():
+    print("🧪 Testing Description Normalization")
+    print("=" * 50)
+
+    # Test 1: Trivial variants share one canonical key
+    print("\n1. Testing canonical keys:")
+    variants = ["MEN'S T-SHIRT", "Men’s  T Shirt", "mens t-shirt.", "ＭＥＮ’Ｓ　Ｔ－ＳＨＩＲＴ", "The Mens T Shirt"]
+    for variant in variants:
+        print(f"   {variant!r} -> {normalize_description(variant)!r}")
+    assert {normalize_description(v) for v in variants} == {"mens t shirt"}
+    assert normalize_description("LV & Co") == normalize_description("LV and Co") == "lv co"
+    assert normalize_description("THE") == "the"
+
+    # Test 2: Both backends match the variants
+    print("\n2. Testing variant matching:")
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("Item Description,Commodity Code,Weight,Origin Country\nMEN'S T-SHIRT,61091000,0.2,CN\n")
+    sqlite_backend = SqliteBackend(os.path.join(tmp_dir, "sku.sqlite3"))
+    sqlite_backend.upsert([{"Item Description": "MEN'S T-SHIRT", "Commodity Code": "61091000",
+                            "Weight": "0.2", "Origin Country": "CN"}])
+    orders = pd.DataFrame({"Item Description": variants + ["WOMENS T SHIRT"], "Selling Price": [10] * 6})
+    for backend in (CsvBackend(csv_path), sqlite_backend):
+        _, matched, unmatched = match_orders(orders, backend)
+        print(f"   {type(backend).__name__}: matched={matched}, unmatched={unmatched}")
+        assert (matched, unmatched) == (5, 1)
+
+    # Test 3: An existing (schema version 1) SQLite database is migrated and re-keyed on open
+    print("\n3. Testing SQLite key migration:")
+    old_path = os.path.join(tmp_dir, "old.sqlite3")
+    conn = sqlite3.connect(old_path)
+    conn.executescript(
+        "CREATE TABLE sku_reference (id INTEGER PRIMARY KEY, description_key TEXT NOT NULL UNIQUE,"
+        " item_description TEXT NOT NULL, commodity_code TEXT, weight TEXT, origin_country TEXT);"
+        "CREATE TABLE sku_memory (id INTEGER PRIMARY KEY, sku TEXT, brand TEXT, item_description TEXT,"
+        " commodity_code TEXT, weight TEXT, country_of_origin TEXT);"
+        "INSERT INTO sku_memory VALUES (1, 'G1', 'GUCCI', 'Gucci Belt', '1', '1', 'CN');"
+    )
+    conn.executemany(
+        "INSERT INTO sku_reference (description_key, item_description, commodity_code, weight, origin_country)"
+        " VALUES (?, ?, ?, ?, ?)",
+        [("men's t-shirt", "MEN'S T-SHIRT", "61091000", "", "CN"),
+         ("mens t shirt", "MENS T SHIRT", "99999999", "0.2", "IT"),
+         ("gucci belt", "GUCCI BELT", "4203301000", "0.3", "IT")],
+    )
+    conn.commit()
+    conn.close()
+    migrated = SqliteBackend(old_path)
+    records = list(migrated.reference_records())
+    print(f"   {records}")
+    assert len(records) == 2
+    assert migrated.lookup("Men's T Shirt") == {"Commodity Code": "61091000", "Weight": "0.2", "Origin Country": "CN"}
+    assert migrated.lookup("gucci belt")["Commodity Code"] == "4203301000"
+    assert migrated.memory_match("G1", "", "")["Item Description"] == "GUCCI BELT"
+
+    print("\n✅ All normalization tests completed successfully!")
+
+if __name__ == "__main__":
+    test_normalize()
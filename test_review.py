@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the paginated review table helpers
+"""
+
+import pandas as pd
+from review import (
+    ALL, MATCHED, SAVE_COLUMN, SELECT_COLUMN, UNMATCHED, apply_page_edits, bulk_set,
+    filter_index, page_count, page_index, records_to_save, review_frame, selected_index,
+)
+
+def sample_matches(n):
+    return pd.DataFrame({
+        "Source File": ["orders.csv"] * n,
+        "Item Description": [f"ITEM {i}" for i in range(n)],
+        "Selling Price": list(range(n)),
+        "Weight": ["0.5" if i % 3 == 0 else "" for i in range(n)],
+        "Origin Country": ["IT" if i % 3 == 0 else "" for i in range(n)],
+        "Commodity Code": ["42022100" if i % 3 == 0 else "" for i in range(n)],
+        "is_matched": [i % 3 == 0 for i in range(n)],
+    })
+
+def test_review():
+    print("🧪 Testing Paginated Review Table")
+    print("=" * 50)
+
+    df = review_frame(sample_matches(1000))
+
+    # Test 1: Filtering and paging happen on the server-side frame
+    print("\n1. Testing filter and paging:")
+    unmatched = filter_index(df, UNMATCHED)
+    print(f"   unmatched={len(unmatched)}, pages of 100={page_count(len(unmatched), 100)}")
+    assert len(unmatched) == 666 and len(filter_index(df, MATCHED)) == 334 and len(filter_index(df, ALL)) == 1000
+    assert page_count(len(unmatched), 100) == 7
+    last_page = page_index(unmatched, 7, 100)
+    assert len(last_page) == 66 and list(page_index(unmatched, 99, 100)) == list(last_page)
+    assert list(page_index(unmatched, 1, 3)) == [1, 2, 4]
+
+    # Test 2: Edits on one page are written back to the full frame
+    print("\n2. Testing page edits:")
+    page = df.loc[page_index(unmatched, 2, 100)].copy()
+    page["Weight"] = "1.2"
+    page[SELECT_COLUMN] = [i < 5 for i in range(len(page))]
+    page["is_matched"] = True  # 只读列不会被写回
+    apply_page_edits(df, page)
+    assert (df.loc[page.index, "Weight"] == "1.2").all()
+    assert not df.loc[page.index, "is_matched"].any()
+    assert df[SELECT_COLUMN].dtype == bool and len(selected_index(df)) == 5
+
+    # Test 3: Bulk edits on selected rows
+    print("\n3. Testing bulk edits:")
+    assert bulk_set(df, selected_index(df), "Origin Country", "CN") == 5
+    df.loc[selected_index(df), "Commodity Code"] = "61091000"
+    df.loc[selected_index(df)[:3], SAVE_COLUMN] = True
+    df.loc[0, SAVE_COLUMN] = True
+    records = records_to_save(df)
+    print(f"   records to save: {records}")
+    assert len(records) == 4
+    assert records[1] == {"Item Description": "ITEM 151", "Commodity Code": "61091000", "Weight": "1.2",
+                          "Origin Country": "CN"}
+    try:
+        bulk_set(df, selected_index(df), "is_matched", True)
+    except ValueError as e:
+        print(f"   ✅ {e}")
+    else:
+        raise AssertionError("read-only column was bulk edited")
+
+    print("\n✅ All review table tests completed successfully!")
+
+if __name__ == "__main__":
+    test_review()
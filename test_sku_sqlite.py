@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite SKU backend
+"""
+
+import os
+import random
+import tempfile
+from sku_store import SkuMemory
+from sku_sqlite import SqliteBackend, import_csv
+
+def test_sku_sqlite():
+    print("🧪 Testing SQLite SKU Backend")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, "sku.sqlite3")
+
+    # Test 1: One-shot import of the SKU database plus an old memory CSV
+    print("\n1. Testing CSV import:")
+    memory_csv = os.path.join(tmp_dir, "sku_memory_db.csv")
+    with open(memory_csv, "w", encoding="utf-8") as f:
+        f.write("SKU,Brand,Item Description,Commodity Code,Weight,Country of Origin\n")
+        f.write("S1,LV,MENS SHOES,99999999,9,CN\nW1,DIOR,DIOR SADDLE BAG,42022100,0.8,FR\n")
+        f.write("S2,LV,mens shoes,64039900,1.2,IT\n")
+    counts = import_csv(db_path, "sku_reference_data.csv", memory_csv)
+    print(f"   Imported: {counts}")
+    assert counts["reference"] > 0 and counts["memory"] == 3
+    assert import_csv(db_path, "sku_reference_data.csv", memory_csv) == {"reference": 0, "memory": 0}
+
+    backend = SqliteBackend(db_path)
+    result = backend.lookup("  gucci belt ")
+    print(f"   'gucci belt' -> {result}")
+    assert result == {"Commodity Code": "4203.30.10.00", "Weight": "0.3", "Origin Country": "IT"}
+    assert backend.memory_match("", "", "DIOR SADDLE BAG")["Origin Country"] == "FR"
+    assert backend.memory_match("S1", "", "")["Commodity Code"] == "111111111"  # 只补空字段
+    # 描述相同的另一个 SKU 单独成行，精确匹配仍取该描述的第一行
+    assert backend.memory_match("S2", "", "")["Weight"] == "1.2"
+    assert backend.lookup("MENS SHOES")["Commodity Code"] == "111111111"
+    backend.upsert([{"SKU": "S2", "Item Description": "MENS SHOES", "Weight": "1.3"}])
+    assert backend.memory_match("S2", "", "")["Weight"] == "1.3" and backend.memory_match("S1", "", "")["Weight"] != "1.3"
+    assert "LV SPEEDY BAG" in backend and "DIOR BOOK TOTE" not in backend
+    assert set(backend.lookup_many(["gucci belt", "nope"])) == {"gucci belt"}
+
+    # Test 2: Batched upserts
+    print("\n2. Testing batched upserts:")
+    batch = [{"Item Description": f"ITEM {i}", "Commodity Code": "61091000", "Weight": 0.2, "Origin Country": "CN"}
+             for i in range(1000)]
+    batch.append({"Item Description": "Gucci Belt", "Weight": "0.4"})
+    version = backend.reference_version()
+    assert backend.upsert(batch) == (1000, 1)
+    assert backend.lookup("GUCCI BELT")["Weight"] == "0.4"
+    assert backend.reference_version() == version + 1
+    assert backend.upsert(batch[:5], overwrite=False) == (0, 0)
+    assert backend.reference_version() == version + 1
+    assert backend.record_count() == sum(1 for _ in backend.reference_records())
+    print("   ✅ 1000 inserts + 1 update in one call")
+
+    # Test 3: Memory tiers agree with the in-memory SkuMemory
+    print("\n3. Testing memory matching against SkuMemory:")
+    rng = random.Random(7)
+    words = ["LV", "GUCCI", "BAG", "BELT", "MINI", "LEATHER", "BLACK", "SHOES", "WALLET", "CLASSIC"]
+    records = [{
+        "SKU": f"S{i}" if i % 3 else "",
+        "Brand": rng.choice(words[:2]),
+        "Item Description": " ".join(rng.sample(words, rng.randint(1, 4))),
+        "Commodity Code": str(i), "Weight": "1", "Country of Origin": "IT",
+    } for i in range(300)]
+    memory_backend = SqliteBackend(os.path.join(tmp_dir, "memory.sqlite3"))
+    memory_backend.upsert(records)
+    memory = SkuMemory(memory_backend.reference_records())
+    for _ in range(200):
+        query = ("S" + str(rng.randrange(400)), rng.choice(words + ["PRADA"]),
+                 " ".join(rng.sample(words, rng.randint(1, 3))))
+        assert memory_backend.memory_match(*query) == memory.best_match(*query), query
+    print("   ✅ 200 random queries agree")
+
+    print("\n✅ All SQLite backend tests completed successfully!")
+
+if __name__ == "__main__":
+    test_sku_sqlite()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test script for the indexed SKU reference store
+"""
+
+import csv
+import os
+import tempfile
+import time
+import utils
+from sku_store import SkuStore, csv_schema_version, get_backend, get_sku_store, migrate_csv, records_to_csv
+
+def write_reference(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["Item Description", "Commodity Code", "Weight", "Origin Country"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def test_sku_store():
+    print("🧪 Testing Indexed SKU Store")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    write_reference(path, [
+        {"Item Description": "LV SPEEDY BAG", "Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "FR"},
+        {"Item Description": "GUCCI BELT", "Commodity Code": "4203301000", "Weight": "0.3", "Origin Country": "IT "},
+        {"Item Description": "lv speedy bag", "Commodity Code": "99999999", "Weight": "9", "Origin Country": "CN"},
+    ])
+
+    # Test 1: Exact lookups are case-insensitive and keep the first row
+    print("\n1. Testing exact lookups:")
+    store = get_sku_store(path)
+    result = store.lookup("  Lv Speedy Bag ")
+    print(f"   'Lv Speedy Bag' -> {result}")
+    assert result == {"Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "FR"}
+    assert store.lookup("GUCCI BELT")["Origin Country"] == "IT"
+    assert store.lookup("PRADA SHOULDER BAG") is None
+
+    # Test 2: The shared store is not reloaded while the file is unchanged
+    print("\n2. Testing reload on file change:")
+    records_before = store.records
+    assert get_sku_store(path) is store
+    assert store.records is records_before
+
+    time.sleep(0.01)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        f.write("PRADA SHOULDER BAG,42022100,0.7,IT\n")
+    get_sku_store(path)
+    assert store.records is not records_before
+    assert store.lookup("prada shoulder bag")["Weight"] == "0.7"
+    print(f"   ✅ Reloaded {len(store)} records after append")
+
+    # Test 3: Missing file behaves like an empty database
+    print("\n3. Testing missing file:")
+    empty = SkuStore(os.path.join(tmp_dir, "missing.csv")).refresh()
+    assert len(empty) == 0 and empty.lookup("GUCCI BELT") is None
+    print("   ✅ Missing file returns no matches")
+
+    # Test 4: The SKU/brand/keyword index is shared and rebuilt after invalidate()
+    print("\n4. Testing shared memory index:")
+    memory_path = os.path.join(tmp_dir, "sku_memory.csv")
+    with open(memory_path, "w", newline="", encoding="utf-8") as f:
+        f.write("SKU,Brand,Item Description,Commodity Code,Weight,Origin Country\n")
+        f.write("M46234,LV,LV SPEEDY BAG,42022100,0.9,CN\n")
+    memory_store = get_sku_store(memory_path)
+    memory = memory_store.memory
+    assert get_sku_store(memory_path).memory is memory
+    assert memory.sku_match("M46234")["Brand"] == "LV"
+    assert memory_store.lookup("lv speedy bag")["Origin Country"] == "CN"
+    memory_store.invalidate()
+    assert get_sku_store(memory_path).memory is not memory
+    print("   ✅ Memory cached across calls and reloaded after invalidate()")
+
+    # Test 5: Bulk upsert dedups in memory and writes the batch once
+    print("\n5. Testing bulk upsert:")
+    batch = [{"Item Description": f"ITEM {i}", "Commodity Code": "61091000", "Weight": 0.2, "Origin Country": "CN"}
+             for i in range(2000)]
+    batch.append({"Item Description": "gucci belt", "Commodity Code": "", "Weight": "0.4", "Origin Country": None})
+    batch.append({"Item Description": "ITEM 7", "Commodity Code": "61091000", "Weight": "0.2", "Origin Country": "CN"})
+    version = store.version
+    inserted, updated = store.bulk_upsert(batch)
+    print(f"   inserted={inserted}, updated={updated}")
+    assert (inserted, updated) == (2000, 1)
+    assert store.version != version
+    reloaded = SkuStore(path).refresh()
+    assert len(reloaded) == len(store) == 2004
+    assert reloaded.lookup("GUCCI BELT") == {"Commodity Code": "4203301000", "Weight": "0.4", "Origin Country": "IT"}
+    version = store.version
+    assert store.bulk_upsert(batch[:10], overwrite=False) == (0, 0)
+    assert store.version == version
+    assert not [name for name in os.listdir(tmp_dir) if name.startswith(".tmp-")]
+    print("   ✅ One journal append for the whole batch")
+    # 其他实例（或进程）的写入：共享的 store 在下次取用时从 journal 读到，无需手动失效
+    SkuStore(path).bulk_upsert([{"Item Description": "CELINE TRIOMPHE BAG", "Weight": "0.6"}])
+    assert get_sku_store(path).lookup("celine triomphe bag")["Weight"] == "0.6"
+    # 下载内容包含还在 journal 里、尚未压缩进 CSV 的记录
+    store.bulk_upsert([{"Item Description": "DIOR SADDLE BAG", "Commodity Code": "42022100"}])
+    count, data = records_to_csv(get_backend(path).reference_records())
+    assert count == 2006 == get_backend(path).record_count() and b"DIOR SADDLE BAG,42022100" in data
+    with open(path, "rb") as f:
+        assert b"DIOR SADDLE BAG" not in f.read()
+    # 原子重写保留原文件的权限，新文件按 umask 创建（mkstemp 默认是 0600）
+    os.chmod(path, 0o640)
+    store.compact()
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    umask = os.umask(0)
+    os.umask(umask)
+    for name in (path + ".journal", path + ".snap"):
+        assert os.stat(name).st_mode & 0o777 == 0o666 & ~umask
+
+    # Test 6: Both version-1 files (and their journals) migrate into one store
+    print("\n6. Testing schema migration:")
+    old_dir = tempfile.mkdtemp()
+    old_path = os.path.join(old_dir, "sku_reference_data.csv")
+    write_reference(old_path, [
+        {"Item Description": "LV SPEEDY BAG", "Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "FR"},
+        {"Item Description": "GUCCI BELT", "Commodity Code": "", "Weight": "0.3", "Origin Country": "IT"},
+    ])
+    os.makedirs(os.path.join(old_dir, "data"))
+    old_memory = os.path.join(old_dir, "data", "sku_memory_db.csv")
+    with open(old_memory, "w", newline="", encoding="utf-8") as f:
+        f.write("SKU,Brand,Item Description,Commodity Code,Weight,Country of Origin\n")
+        f.write("M46234,LV,lv speedy bag,99999999,0.5,CN\n1234567,GUCCI,GUCCI BELT,4203301000,0.4,IT\n")
+        f.write("M40995,LV,LV SPEEDY BAG,42022100,0.7,FR\n")
+    with open(old_memory + ".journal", "w", encoding="utf-8") as f:
+        f.write('{"SKU": "N78901", "Brand": "HERMES", "Item Description": "HERMES BIRKIN BAG", '
+                '"Commodity Code": "42022100", "Weight": "1.2", "Country of Origin": "FR"}\n')
+    assert csv_schema_version(old_path) == 1
+
+    backend = get_backend(old_path)  # 打开即迁移
+    assert csv_schema_version(old_path) == 2
+    assert not os.path.exists(old_memory) and os.path.exists(old_path + ".v1.bak")
+    # 参考库的值优先，记忆库只补空字段
+    assert backend.lookup("LV SPEEDY BAG") == {"Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "FR"}
+    assert backend.lookup("gucci belt")["Commodity Code"] == "4203301000"
+    assert backend.memory_match("M46234", "", "")["Item Description"] == "LV SPEEDY BAG"
+    assert backend.memory_match("N78901", "", "")["Origin Country"] == "FR"
+    assert backend.lookup("HERMES BIRKIN BAG")["Weight"] == "1.2"
+    assert backend.memory_match("M40995", "", "")["Weight"] == "0.7"
+    assert migrate_csv(old_path) == 0
+    print(f"   ✅ Migrated {len(list(backend.reference_records()))} rows into one file")
+
+    # Test 7: Two SKUs sharing one description keep a row each
+    print("\n7. Testing SKUs with the same description:")
+    shared = os.path.join(tmp_dir, "shared.csv")
+    sku_db, utils.SKU_DB = utils.SKU_DB, shared
+    try:
+        utils.save_sku_memory("M1", "LV", "LV NEVERFULL MM", "42022100", "0.8", "FR")
+        utils.save_sku_memory("M2", "LV", "lv neverfull mm", "42029100", "1.1", "IT")
+        utils.save_sku_memory("M1", "LV", "LV NEVERFULL MM", weight="0.9")
+        utils.bulk_upsert([{"Item Description": "LV NEVERFULL MM", "Origin Country": "ES"}])
+        assert utils.get_memory_values("M1", "", "")["weight"] == "0.9"
+        assert utils.get_memory_values("M2", "", "") == {"commodity_code": "42029100", "weight": "1.1", "country": "IT"}
+        # 精确匹配和不带 SKU 的写入都落在该描述的第一行
+        assert utils.exact_match_lookup("lv neverfull mm") == {
+            "Commodity Code": "42022100", "Weight": "0.9", "Origin Country": "ES"}
+    finally:
+        utils.SKU_DB = sku_db
+    # 回放 journal、压缩后解析 CSV、映射快照，三种加载方式结果一致
+    loads = [SkuStore(shared).refresh()]
+    get_sku_store(shared).compact()
+    for snapshot in (False, True):
+        reloaded = SkuStore(shared)
+        reloaded.snapshot = snapshot
+        loads.append(reloaded.refresh())
+    for reloaded in loads:
+        assert len(reloaded) == 2
+        assert reloaded.memory.sku_match("M2")["Weight"] == "1.1"
+        assert reloaded.lookup("LV NEVERFULL MM")["Weight"] == "0.9"
+    print("   ✅ Both SKUs matched after reload and compaction")
+
+    print("\n✅ All SKU store tests completed successfully!")
+
+if __name__ == "__main__":
+    test_sku_store()
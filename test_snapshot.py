@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary SKU store snapshots
+"""
+
+import os
+import random
+import tempfile
+import time
+import sku_store
+from benchmarks.bench_find_best_match import make_queries, make_records
+from snapshot import SNAPSHOT_ENV, read_snapshot
+from sku_store import SkuMemory, SkuStore
+
+def no_parsing(f, fieldnames):
+    raise AssertionError("the CSV was parsed although the snapshot is valid")
+
+def test_snapshot():
+    print("🧪 Testing SKU Store Snapshots")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Item Description,Commodity Code,Weight,Origin Country\n")
+        f.write("LV SPEEDY BAG,42022100,0.9,FR\nGUCCI BELT,4203301000,0.3,IT\nCHLOÉ 香水,33030010,0.2,FR\n")
+
+    # Test 1: Loading from text writes the snapshot next to the CSV
+    print("\n1. Testing snapshot write on load:")
+    SkuStore(path).refresh()
+    meta, arrays = read_snapshot(path + ".snap")
+    print(f"   {meta['store']} snapshot with {len(arrays)} arrays")
+    assert meta["fieldnames"][:3] == ["SKU", "Brand", "Item Description"]
+
+    # Test 2: A fresh store maps the snapshot instead of parsing the CSV
+    print("\n2. Testing cold start from the snapshot:")
+    parse_rows = sku_store._parse_rows
+    sku_store._parse_rows = no_parsing
+    try:
+        store = SkuStore(path).refresh()
+        assert store.lookup("chloé 香水") == {"Commodity Code": "33030010", "Weight": "0.2", "Origin Country": "FR"}
+        assert [r["Item Description"] for r in store.records] == ["LV SPEEDY BAG", "GUCCI BELT", "CHLOÉ 香水"]
+        # journal 照常回放在快照之上
+        store.bulk_upsert([{"Item Description": "GUCCI BELT", "Weight": "0.4"}])
+        assert SkuStore(path).refresh().lookup("GUCCI BELT")["Weight"] == "0.4"
+    finally:
+        sku_store._parse_rows = parse_rows
+    print("   ✅ Lookups served without parsing")
+
+    # Test 3: Editing the CSV by hand makes the snapshot stale
+    print("\n3. Testing stale snapshot after a CSV edit:")
+    time.sleep(0.01)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("PRADA SHOULDER BAG,42022100,0.7,IT\n")
+    store = SkuStore(path).refresh()
+    assert store.lookup("PRADA SHOULDER BAG")["Weight"] == "0.7"
+    assert read_snapshot(path + ".snap")[0]["source"][2] == os.path.getsize(path)
+
+    # Test 4: Compaction rewrites the snapshot; a corrupt one is ignored
+    print("\n4. Testing compaction and corrupt snapshots:")
+    store.compact()
+    assert read_snapshot(path + ".snap")[0]["source"][2] == os.path.getsize(path)
+    assert SkuStore(path).refresh().lookup("GUCCI BELT")["Weight"] == "0.4"
+    with open(path + ".snap", "r+b") as f:
+        f.write(b"garbage!")
+    assert read_snapshot(path + ".snap") is None
+    assert SkuStore(path).refresh().lookup("prada shoulder bag")["Origin Country"] == "IT"
+    assert read_snapshot(path + ".snap") is not None
+
+    # Test 5: The memory store keeps its match indexes in the snapshot
+    print("\n5. Testing memory store indexes:")
+    rng = random.Random(5)
+    records = make_records(500, rng)
+    memory_path = os.path.join(tmp_dir, "sku_memory_db.csv")
+    SkuStore(memory_path).bulk_upsert(records)
+    SkuStore(memory_path).compact()
+    loaded = SkuStore(memory_path).refresh()
+    assert loaded._memory is not None  # 来自快照，无需重建
+    expected = SkuMemory(records)
+    for sku, brand, description in make_queries(300, rng):
+        assert loaded.memory.best_match(sku, brand, description) == expected.best_match(sku, brand, description)
+    loaded.bulk_upsert([dict(records[0], Weight="7.5")])
+    assert loaded.memory.sku_match(records[0]["SKU"])["Weight"] == "7.5"
+    print("   ✅ Snapshot indexes match a fresh build")
+
+    # Test 6: New normalization rules invalidate the snapshot's keys
+    print("\n6. Testing a normalization version change:")
+    SkuStore(path).refresh()
+    normalize_description = sku_store.normalize_description
+    sku_store.normalize_description = lambda text: " ".join(str(text).upper().split())
+    sku_store.NORMALIZATION_VERSION += 1
+    try:
+        store = SkuStore(path).refresh()
+        assert store.lookup("gucci   belt")["Weight"] == "0.4"
+        assert read_snapshot(path + ".snap")[0]["key_version"] == sku_store.NORMALIZATION_VERSION
+    finally:
+        sku_store.normalize_description = normalize_description
+        sku_store.NORMALIZATION_VERSION -= 1
+    print("   ✅ Snapshot rebuilt with the new keys")
+
+    # Test 7: SKU_SNAPSHOT=0 turns snapshots off
+    print("\n7. Testing SKU_SNAPSHOT=0:")
+    os.environ[SNAPSHOT_ENV] = "0"
+    try:
+        other = os.path.join(tmp_dir, "other.csv")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("Item Description,Commodity Code,Weight,Origin Country\nA,1,1,GB\n")
+        assert SkuStore(other).refresh().lookup("a") is not None
+        assert not os.path.exists(other + ".snap")
+    finally:
+        del os.environ[SNAPSHOT_ENV]
+
+    print("\n✅ All snapshot tests completed successfully!")
+
+if __name__ == "__main__":
+    test_snapshot()
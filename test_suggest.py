@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for approximate nearest-match suggestions
+"""
+
+import os
+import random
+import tempfile
+import pandas as pd
+from review import fill_unmatched, review_frame
+from sku_sqlite import SqliteBackend
+from sku_store import CsvBackend
+from suggest import TrigramIndex, suggest_matches, trigrams
+
+def brute_force(keys, query, k):
+    query_grams = set(trigrams(query).tolist())
+    scores = []
+    for key_id, key in enumerate(keys):
+        grams = set(trigrams(key).tolist())
+        scores.append((-len(query_grams & grams) / len(query_grams | grams), key_id))
+    return [(key_id, -score) for score, key_id in sorted(scores)[:k]]
+
+def test_suggest():
+    print("🧪 Testing Nearest-Match Suggestions")
+    print("=" * 50)
+
+    # Test 1: Index scores agree with brute-force trigram Jaccard
+    print("\n1. Testing index against brute force:")
+    rng = random.Random(7)
+    words = ["gucci", "belt", "prada", "bag", "leather", "wallet", "silk", "scarf", "black", "red"]
+    keys = list(dict.fromkeys(" ".join(rng.sample(words, rng.randint(1, 4))) for _ in range(300)))
+    index = TrigramIndex(keys)
+    for query in ["gucci belt", "lether walet", "red silk scarf", "prada bag black"]:
+        found = index.search(query, k=5, min_score=0)
+        expected = brute_force(keys, query, 5)
+        print(f"   {query!r} -> {[keys[i] for i, _ in found[:2]]}")
+        assert [round(s, 9) for _, s in found] == [round(s, 9) for _, s in expected]
+    assert index.search("zzzz") == [] and TrigramIndex([]).search("gucci") == []
+
+    # Test 2: Typos get suggestions from both backends, and the index follows writes
+    print("\n2. Testing backend suggestions:")
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp_dir, "sku_reference_data.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("Item Description,Commodity Code,Weight,Origin Country\n"
+                "GUCCI BELT,4203301000,0.3,IT\nPRADA BAG,4202210000,0.8,IT\n")
+    sqlite_backend = SqliteBackend(os.path.join(tmp_dir, "sku.sqlite3"))
+    sqlite_backend.upsert([
+        {"Item Description": "GUCCI BELT", "Commodity Code": "4203301000", "Weight": "0.3", "Origin Country": "IT"},
+        {"Item Description": "PRADA BAG", "Commodity Code": "4202210000", "Weight": "0.8", "Origin Country": "IT"},
+    ])
+    csv_backend = CsvBackend(csv_path)
+    # 没有要查的描述时不建索引
+    assert suggest_matches(csv_backend, []) == {}
+    assert "suggestion_index" not in csv_backend.reference()._derived
+    for backend in (csv_backend, sqlite_backend):
+        suggestions = suggest_matches(backend, ["GUCI BELT", "GUCI BELT", "SILK SCARF"])
+        print(f"   {type(backend).__name__}: {suggestions}")
+        assert list(suggestions) == ["GUCI BELT", "SILK SCARF"]
+        assert suggestions["GUCI BELT"][0]["Item Description"] == "GUCCI BELT"
+        assert suggestions["GUCI BELT"][0]["Commodity Code"] == "4203301000"
+        assert suggestions["SILK SCARF"] == []
+
+        backend.upsert([{"Item Description": "SILK SCARF WOMEN", "Commodity Code": "62141000",
+                         "Weight": "0.1", "Origin Country": "CN"}])
+        assert suggest_matches(backend, ["SILK SCARF"])["SILK SCARF"][0]["Commodity Code"] == "62141000"
+
+    # Test 3: Accepting a suggestion fills every unmatched row with that description
+    print("\n3. Testing accepted suggestion:")
+    df = review_frame(pd.DataFrame({
+        "Item Description": ["GUCI BELT", "GUCI BELT", "PRADA BAG"],
+        "Selling Price": [10, 12, 20],
+        "Weight": ["", "", "0.8"],
+        "Origin Country": ["", "", "IT"],
+        "Commodity Code": ["", "", "4202210000"],
+        "is_matched": [False, False, True],
+    }))
+    accepted = suggest_matches(sqlite_backend, ["GUCI BELT"])["GUCI BELT"][0]
+    assert fill_unmatched(df, "GUCI BELT", accepted) == 2
+    assert (df.loc[:1, "Commodity Code"] == "4203301000").all()
+    assert df.loc[2, "Commodity Code"] == "4202210000"
+
+    print("\n✅ All suggestion tests completed successfully!")
+
+if __name__ == "__main__":
+    test_suggest()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached, rate-limited UK Tariff API lookup (against a local stub server)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import metrics
+import utils
+from tariff_cache import TariffCache, TokenBucket
+
+STUB_CODES = {"leather bag": "4202210000", "cotton shirt": "6205200000"}
+
+class StubTariffHandler(BaseHTTPRequestHandler):
+    hits = []
+    delay = 0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get("filter[description]", [""])[0]
+        StubTariffHandler.hits.append(query)
+        time.sleep(StubTariffHandler.delay)
+        if query.lower() == "server error":
+            self.send_response(500)
+            self.end_headers()
+            return
+        code = STUB_CODES.get(query.lower())
+        body = json.dumps({"data": [{"id": code}] if code else []}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTariffHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_tariff_cache():
+    print("🧪 Testing Cached UK Tariff API Lookup")
+    print("=" * 50)
+
+    server = start_stub_server()
+    tmp_dir = tempfile.mkdtemp()
+    saved = (utils.UK_TARIFF_API, utils.TARIFF_CACHE_DB, utils.TARIFF_INDEX_DB,
+             utils.TARIFF_ONLINE_FALLBACK, utils.tariff_rate_limiter)
+    utils.UK_TARIFF_API = f"http://127.0.0.1:{server.server_address[1]}/commodities?filter[description]={{}}"
+    utils.TARIFF_CACHE_DB = os.path.join(tmp_dir, "tariff_cache.sqlite3")
+    utils.TARIFF_INDEX_DB = os.path.join(tmp_dir, "no_tariff_index.sqlite3")
+    utils.TARIFF_ONLINE_FALLBACK = True
+    StubTariffHandler.hits.clear()
+
+    try:
+        # Test 1: Repeat descriptions hit the network once, sending the original description
+        print("\n1. Testing positive caching:")
+        assert utils.query_uk_tariff_api("Leather Bag") == "4202210000"
+        assert utils.query_uk_tariff_api("  leather   BAG ") == "4202210000"
+        # 缓存 key 与 SKU 索引同一套规范化：标点、停用词不影响
+        assert utils.query_uk_tariff_api("The Leather-Bag") == "4202210000"
+        print(f"   network hits: {StubTariffHandler.hits}")
+        assert StubTariffHandler.hits == ["Leather Bag"]
+
+        # Test 2: Empty results are cached too
+        print("\n2. Testing negative caching:")
+        assert utils.query_uk_tariff_api("unknown thing") == ""
+        assert utils.query_uk_tariff_api("unknown thing") == ""
+        assert StubTariffHandler.hits.count("unknown thing") == 1
+
+        # Test 3: Server errors are not cached
+        print("\n3. Testing errors are retried:")
+        assert utils.query_uk_tariff_api("server error") == ""
+        assert utils.query_uk_tariff_api("server error") == ""
+        assert StubTariffHandler.hits.count("server error") == 2
+
+        # Test 4: The cache survives a new process (new TariffCache on the same file)
+        print("\n4. Testing persistence and TTL:")
+        cache = TariffCache(utils.TARIFF_CACHE_DB)
+        assert cache.get("leather bag") == (True, "4202210000")
+        expired = TariffCache(utils.TARIFF_CACHE_DB, ttl=0, negative_ttl=0)
+        time.sleep(0.01)
+        assert expired.get("leather bag") == (False, "")
+        print("   ✅ Persisted across instances, expired after TTL")
+
+        # Test 5: Batch lookups dedup and run concurrently
+        print("\n5. Testing concurrent batch lookups:")
+        StubTariffHandler.hits.clear()
+        StubTariffHandler.delay = 0.2
+        utils.tariff_rate_limiter = TokenBucket(rate=1000)
+        descriptions = [f"item {i % 8}" for i in range(40)] + ["Leather Bag", "LEATHER BAG"]
+        misses_before = metrics.snapshot()["counters"].get("tariff_cache_misses", 0)
+        start = time.perf_counter()
+        codes = utils.query_uk_tariff_api_batch(descriptions)
+        elapsed = time.perf_counter() - start
+        # 每个不同的描述只查一次缓存：8 个未命中，leather bag 命中
+        assert metrics.snapshot()["counters"]["tariff_cache_misses"] - misses_before == 8
+        print(f"   {len(descriptions)} descriptions, {len(StubTariffHandler.hits)} requests, {elapsed:.2f}s")
+        assert set(codes) == set(descriptions)
+        assert codes["LEATHER BAG"] == "4202210000"
+        assert sorted(StubTariffHandler.hits) == [f"item {i}" for i in range(8)]
+        assert elapsed < 8 * StubTariffHandler.delay
+    finally:
+        server.shutdown()
+        (utils.UK_TARIFF_API, utils.TARIFF_CACHE_DB, utils.TARIFF_INDEX_DB,
+         utils.TARIFF_ONLINE_FALLBACK, utils.tariff_rate_limiter) = saved
+
+    # Test 6: Token bucket rate limiting
+    print("\n6. Testing token bucket:")
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.perf_counter()
+    for _ in range(15):
+        bucket.acquire()
+    elapsed = time.perf_counter() - start
+    print(f"   15 acquires at 50/s with burst 5 took {elapsed:.3f}s")
+    assert elapsed >= 0.18
+
+    print("\n✅ All tariff cache tests completed successfully!")
+
+if __name__ == "__main__":
+    test_tariff_cache()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline tariff nomenclature index
+"""
+
+import csv
+import os
+import tempfile
+import time
+
+import utils
+from tariff_index import TariffIndex, read_dump
+
+NOMENCLATURE = [
+    ("4202210000", "Handbags, with outer surface of leather or of composition leather", "commodity"),
+    ("4202220000", "Handbags, with outer surface of plastic sheeting or of textile materials", "commodity"),
+    ("4203301000", "Belts and bandoliers of leather", "commodity"),
+    ("6403990000", "Other footwear with outer soles of rubber and uppers of leather", "commodity"),
+    ("4202000000", "Trunks, suitcases, handbags and similar containers", "heading"),
+]
+
+def test_tariff_index():
+    print("🧪 Testing Offline Tariff Index")
+    print("=" * 50)
+
+    tmp_dir = tempfile.mkdtemp()
+    dump_path = os.path.join(tmp_dir, "commodities.csv")
+    with open(dump_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Commodity code", "Description", "Type"])
+        writer.writerows(NOMENCLATURE)
+
+    # Test 1: Import a CSV dump
+    print("\n1. Testing import:")
+    db_path = os.path.join(tmp_dir, "tariff_index.sqlite3")
+    index = TariffIndex(db_path)
+    assert index.import_rows(read_dump(dump_path)) == len(NOMENCLATURE)
+    assert index.import_rows(read_dump(dump_path)) == len(NOMENCLATURE)
+    assert len(index) == len(NOMENCLATURE)
+    print(f"   ✅ {len(index)} codes indexed (re-import is idempotent)")
+
+    # Test 2: Ranked full-text search
+    print("\n2. Testing search:")
+    start = time.perf_counter()
+    results = index.search("leather handbag")
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"   'leather handbag' -> {[r['Code'] for r in results]} in {elapsed:.2f} ms")
+    assert results[0]["Code"] == "4202210000"
+    assert index.best_code("LEATHER BELT") == "4203301000"
+    assert index.best_code("spaceship") == ""
+
+    # Test 3: utils lookups use the index and never touch the network when offline
+    print("\n3. Testing utils integration (offline):")
+    saved = (utils.TARIFF_INDEX_DB, utils.TARIFF_CACHE_DB, utils.TARIFF_ONLINE_FALLBACK, utils.UK_TARIFF_API)
+    utils.TARIFF_INDEX_DB = db_path
+    utils.TARIFF_CACHE_DB = os.path.join(tmp_dir, "tariff_cache.sqlite3")
+    utils.TARIFF_ONLINE_FALLBACK = False
+    utils.UK_TARIFF_API = "http://127.0.0.1:9/unreachable?q={}"
+    try:
+        assert utils.query_uk_tariff_api("Leather handbags") == "4202210000"
+        assert utils.query_uk_tariff_api("spaceship") == ""
+        assert utils.query_uk_tariff_api_batch(["rubber footwear", "spaceship"]) == {
+            "rubber footwear": "6403990000", "spaceship": ""}
+        assert utils.fuzzy_search_tariff("handbags")[0]["Code"].startswith("4202")
+    finally:
+        utils.TARIFF_INDEX_DB, utils.TARIFF_CACHE_DB, utils.TARIFF_ONLINE_FALLBACK, utils.UK_TARIFF_API = saved
+    print("   ✅ Codes resolved from the local index")
+
+    print("\n✅ All tariff index tests completed successfully!")
+
+if __name__ == "__main__":
+    test_tariff_index()
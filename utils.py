@@ -1,10 +1,28 @@
-import csv
+import logging
 import os
 import requests
-import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import incr, observe, stage, timed
+from sku_store import SkuMemory, get_backend, tokenize
+from tariff_cache import TokenBucket, get_tariff_cache, tariff_query_key
+from tariff_index import DEFAULT_INDEX_PATH, get_tariff_index
+
+logger = logging.getLogger(__name__)
 
 SKU_DB = "sku_reference_data.csv"
 UK_TARIFF_API = "https://www.trade-tariff.service.gov.uk/api/v2/commodities?filter[description]={}"
+UK_TARIFF_SEARCH_API = "https://www.trade-tariff.service.gov.uk/api/v2/search?q={}"
+TARIFF_USER_AGENT = "dhl-tariff-app/1.0 (contact@example.com)"
+TARIFF_TIMEOUT = 5
+TARIFF_MAX_WORKERS = 8
+TARIFF_CACHE_DB = os.environ.get("TARIFF_CACHE_DB", "data/tariff_cache.sqlite3")
+# 本地离线税则索引（python tariff_index.py <dump> 导入）；TARIFF_ONLINE=0 时完全不联网
+TARIFF_INDEX_DB = os.environ.get("TARIFF_INDEX_DB", DEFAULT_INDEX_PATH)
+TARIFF_ONLINE_FALLBACK = os.environ.get("TARIFF_ONLINE", "1") != "0"
+# 每秒最多 5 次 API 请求，允许 5 次突发
+tariff_rate_limiter = TokenBucket(rate=5, capacity=5)
 
 def get_default_weight(item_description):
     """Estimate default weight based on item description keywords"""
@@ -24,117 +42,45 @@ def get_default_weight(item_description):
 
 def find_best_match(sku, brand, item_description, memory_data):
     """Find the best matching record using priority: Full SKU > Partial keyword > Brand"""
-    desc_lower = item_description.lower()
-    
-    # Priority 1: Full SKU match
-    for record in memory_data:
-        if record['SKU'] and record['SKU'].strip() == sku.strip():
-            return record
-    
-    # Priority 2: Partial keyword match in Item Description
-    desc_words = re.findall(r'\b\w+\b', desc_lower)
-    best_match = None
-    best_score = 0
-    
-    for record in memory_data:
-        if not record['Item Description']:
-            continue
-            
-        record_desc_lower = record['Item Description'].lower()
-        record_words = re.findall(r'\b\w+\b', record_desc_lower)
-        
-        # Calculate match score based on common words
-        common_words = set(desc_words) & set(record_words)
-        if len(common_words) > 0:
-            score = len(common_words) / max(len(desc_words), len(record_words))
-            if score > best_score and score > 0.3:  # Minimum 30% match threshold
-                best_score = score
-                best_match = record
+    if not isinstance(memory_data, SkuMemory):
+        memory_data = SkuMemory(memory_data)
     
-    if best_match:
-        return best_match
-    
-    # Priority 3: Brand match (least reliable)
-    for record in memory_data:
-        if record['Brand'] and record['Brand'].strip().lower() == brand.strip().lower():
-            return record
-    
-    return None
+    # SKU 和 Brand 走哈希索引，关键词走倒排索引
+    return memory_data.best_match(sku, brand, item_description)
 
 def load_sku_memory():
-    """Load memory database with enhanced format"""
-    memory_data = []
-    if os.path.exists(SKU_DB):
-        with open(SKU_DB, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                memory_data.append({
-                    'SKU': row.get('SKU', '').strip(),
-                    'Brand': row.get('Brand', '').strip(),
-                    'Item Description': row.get('Item Description', '').strip(),
-                    'Commodity Code': row.get('Commodity Code', '').strip(),
-                    'Weight': row.get('Weight', '').strip(),
-                    'Country of Origin': row.get('Country of Origin', '').strip()
-                })
-    return memory_data
+    """SKU / keyword / brand match index over the SKU database"""
+    return get_backend(SKU_DB).memory_index()
 
+@timed("save_sku_memory")
 def save_sku_memory(sku, brand, item_description, commodity_code=None, weight=None, country=None):
     """Save memory with enhanced format including commodity code"""
-    rows = []
-    updated = False
-    
-    # Load existing data
-    if os.path.exists(SKU_DB):
-        with open(SKU_DB, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Check if this is the same item
-                if (row.get('SKU', '').strip() == sku.strip() and 
-                    row.get('Brand', '').strip() == brand.strip() and
-                    row.get('Item Description', '').strip() == item_description.strip()):
-                    
-                    # Update existing record
-                    if commodity_code:
-                        row['Commodity Code'] = commodity_code
-                    if weight:
-                        row['Weight'] = weight
-                    if country:
-                        row['Country of Origin'] = country
-                    updated = True
-                
-                rows.append(row)
-    
-    # Add new record if not found
-    if not updated:
-        rows.append({
-            'SKU': sku,
-            'Brand': brand,
-            'Item Description': item_description,
-            'Commodity Code': commodity_code or '',
-            'Weight': weight or '',
-            'Country of Origin': country or ''
-        })
-    
-    # Ensure data directory exists
-    os.makedirs(os.path.dirname(SKU_DB), exist_ok=True)
-    
-    # Write back to file
-    with open(SKU_DB, "w", newline="", encoding="utf-8") as f:
-        fieldnames = ['SKU', 'Brand', 'Item Description', 'Commodity Code', 'Weight', 'Country of Origin']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    bulk_save_sku_memory([{
+        'SKU': sku,
+        'Brand': brand,
+        'Item Description': item_description,
+        'Commodity Code': commodity_code,
+        'Weight': weight,
+        'Origin Country': country
+    }])
 
+def bulk_save_sku_memory(records):
+    """Save many memory records with a single write; returns (inserted, updated)"""
+    records = list(records)
+    with stage("bulk_save_sku_memory", rows=len(records)):
+        return get_backend(SKU_DB).upsert(records)
+
+@timed("get_memory_values")
 def get_memory_values(sku, brand, item_description):
     """Get memory values for an item using enhanced matching logic"""
-    memory_data = load_sku_memory()
-    match = find_best_match(sku, brand, item_description, memory_data)
+    match = get_backend(SKU_DB).memory_match(sku, brand, item_description)
+    incr("memory_lookup_hits" if match else "memory_lookup_misses")
     
     if match:
         return {
             'commodity_code': match.get('Commodity Code', ''),
             'weight': match.get('Weight', ''),
-            'country': match.get('Country of Origin', '')
+            'country': match.get('Origin Country', '')
         }
     
     # Return default weight if no match found
@@ -144,78 +90,191 @@ def get_memory_values(sku, brand, item_description):
         'country': ''
     }
 
+@timed("exact_match_lookup")
 def exact_match_lookup(item_description):
     """Exact match lookup in SKU database"""
-    if not os.path.exists(SKU_DB):
-        return None
-    with open(SKU_DB, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['Item Description'].strip().lower() == item_description.strip().lower():
-                return {
-                    'Commodity Code': row.get('Commodity Code', '').strip(),
-                    'Weight': row.get('Weight', '').strip(),
-                    'Origin Country': row.get('Origin Country', '').strip()
-                }
-    return None
+    result = get_backend(SKU_DB).lookup(item_description)
+    incr("sku_lookup_hits" if result else "sku_lookup_misses")
+    return result
 
 # 1. 本地模糊查找
 
 def keyword_match(desc, ref_desc):
     # 简单关键词交集匹配
-    desc_words = set(re.findall(r'\w+', desc.lower()))
-    ref_words = set(re.findall(r'\w+', ref_desc.lower()))
+    desc_words = set(tokenize(desc))
+    ref_words = set(tokenize(ref_desc))
     return len(desc_words & ref_words) > 0
 
+@timed("local_lookup")
 def local_lookup(item_description):
-    if not os.path.exists(SKU_DB):
-        return None
-    with open(SKU_DB, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if keyword_match(item_description, row['Item Description']):
-                return {
-                    'Commodity Code': row.get('Commodity Code', '').strip(),
-                    'Weight': row.get('Weight', '').strip(),
-                    'Origin Country': row.get('Origin Country', '').strip()
-                }
+    scanned = 0
+    for row in get_backend(SKU_DB).reference_records():
+        scanned += 1
+        if keyword_match(item_description, row['Item Description']):
+            incr("db_rows_scanned", scanned)
+            return {
+                'Commodity Code': row['Commodity Code'],
+                'Weight': row['Weight'],
+                'Origin Country': row['Origin Country']
+            }
+    incr("db_rows_scanned", scanned)
     return None
 
 # 2. UK Tariff API 查询
 
+_tariff_session = None
+_tariff_session_lock = threading.Lock()
+
+def tariff_api_get(url):
+    """GET against the tariff API through the shared session, recording latency and errors"""
+    incr("tariff_api_requests")
+    start = time.perf_counter()
+    try:
+        return get_tariff_session().get(url, timeout=TARIFF_TIMEOUT)
+    except requests.RequestException:
+        incr("tariff_api_errors")
+        raise
+    finally:
+        observe("tariff_api_latency_seconds", time.perf_counter() - start)
+
+def get_tariff_session():
+    """Shared keep-alive session, pooled for TARIFF_MAX_WORKERS concurrent requests"""
+    global _tariff_session
+    if _tariff_session is None:
+        with _tariff_session_lock:
+            if _tariff_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=TARIFF_MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = TARIFF_USER_AGENT
+                _tariff_session = session
+    return _tariff_session
+
+def lookup_tariff_offline(item_description):
+    """Return (hit, code) from the local index or the API cache, without touching the network"""
+    index = get_tariff_index(TARIFF_INDEX_DB)
+    if index is not None:
+        code = index.best_code(item_description)
+        incr("tariff_index_hits" if code else "tariff_index_misses")
+        if code:
+            return True, code
+    hit, code = get_tariff_cache(TARIFF_CACHE_DB).get(tariff_query_key(item_description))
+    incr("tariff_cache_hits" if hit else "tariff_cache_misses")
+    if hit or not TARIFF_ONLINE_FALLBACK:
+        return True, code
+    return False, ''
+
+@timed("query_uk_tariff_api")
 def query_uk_tariff_api(item_description):
-    url = UK_TARIFF_API.format(requests.utils.quote(item_description))
+    """Commodity code for a description: local index, then cache, then the API as a fallback"""
+    hit, code = lookup_tariff_offline(item_description)
+    if hit:
+        return code
+    return fetch_uk_tariff_code(item_description)
+
+def fetch_uk_tariff_code(item_description):
+    """Ask the UK Tariff API and cache the answer; for descriptions lookup_tariff_offline() already missed"""
+    cache = get_tariff_cache(TARIFF_CACHE_DB)
+    query_key = tariff_query_key(item_description)
+
+    tariff_rate_limiter.acquire()
+    # 请求用原始描述，规范化的 key 只用于缓存
+    url = UK_TARIFF_API.format(requests.utils.quote(str(item_description).strip()))
     try:
-        resp = requests.get(url, timeout=5)
-        if resp.status_code == 200:
+        resp = tariff_api_get(url)
+        if resp.status_code == 404:
+            data = {}
+        else:
+            resp.raise_for_status()
             data = resp.json()
-            # 取第一个 commodity code
-            if data.get('data') and len(data['data']) > 0:
-                return data['data'][0]['id']
-    except Exception as e:
-        print(f"API error: {e}")
-    return ''
+    except (requests.RequestException, ValueError) as e:
+        # 网络/服务端错误不缓存，下次重试
+        logger.warning("UK Tariff API error for %r: %s", item_description, e)
+        return ''
+
+    # 取第一个 commodity code；没有结果也缓存（负缓存）
+    code = data['data'][0]['id'] if data.get('data') else ''
+    cache.set(query_key, code)
+    return code
+
+@timed("query_uk_tariff_api_batch")
+def query_uk_tariff_api_batch(descriptions, max_workers=TARIFF_MAX_WORKERS):
+    """Resolve many descriptions at once; returns {description: code} for every input
+
+    Descriptions are deduplicated on their cache key, local index and cached
+    answers are used directly and only the misses go to the API, at most
+    max_workers at a time.
+    """
+    by_key = {}
+    for description in descriptions:
+        by_key.setdefault(tariff_query_key(description), description)
+
+    codes = {}
+    misses = []
+    for key, description in by_key.items():
+        hit, code = lookup_tariff_offline(description)
+        if hit:
+            codes[key] = code
+        else:
+            misses.append(description)
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # 离线查找已经做过，线程里直接请求 API
+            for description, code in zip(misses, pool.map(fetch_uk_tariff_code, misses)):
+                codes[tariff_query_key(description)] = code
+
+    return {description: codes[tariff_query_key(description)] for description in descriptions}
+
+@timed("fuzzy_search_tariff")
+def fuzzy_search_tariff(query):
+    """Similar commodity codes for a free-text query: local index first, then the search API"""
+    index = get_tariff_index(TARIFF_INDEX_DB)
+    if index is not None:
+        results = index.search(query)
+        if results or not TARIFF_ONLINE_FALLBACK:
+            return results
+    elif not TARIFF_ONLINE_FALLBACK:
+        return []
+
+    tariff_rate_limiter.acquire()
+    url = UK_TARIFF_SEARCH_API.format(requests.utils.quote(query))
+    try:
+        resp = tariff_api_get(url)
+        data = resp.json()
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("UK Tariff search error for %r: %s", query, e)
+        return []
+    results = []
+    if isinstance(data, dict) and isinstance(data.get('data', None), list):
+        for item in data['data']:
+            code = item.get('id', '')
+            desc = item.get('attributes', {}).get('description', '')
+            type_ = item.get('type', '')
+            if code and desc:
+                results.append({
+                    'Code': code,
+                    'Description': desc,
+                    'Type': type_,
+                    'Official Link': f"https://www.trade-tariff.service.gov.uk/commodities/{code}"
+                })
+    return results
 
 # 3. 追加写入 SKU 数据库
 
+@timed("append_sku_record")
 def append_sku_record(item_description, commodity_code, weight, origin_country):
-    # 先检查是否已存在
-    exists = False
-    if os.path.exists(SKU_DB):
-        with open(SKU_DB, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['Item Description'].strip().lower() == item_description.strip().lower():
-                    exists = True
-                    break
-    if not exists:
-        with open(SKU_DB, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=["Item Description", "Commodity Code", "Weight", "Origin Country"])
-            if os.stat(SKU_DB).st_size == 0:
-                writer.writeheader()
-            writer.writerow({
-                "Item Description": item_description,
-                "Commodity Code": commodity_code,
-                "Weight": weight,
-                "Origin Country": origin_country
-            })
\ No newline at end of file
+    # 已存在的记录保持不变，只追加新记录
+    get_backend(SKU_DB).upsert([{
+        "Item Description": item_description,
+        "Commodity Code": commodity_code,
+        "Weight": weight,
+        "Origin Country": origin_country
+    }], overwrite=False)
+
+def bulk_upsert(records):
+    """Insert or update many SKU records with a single atomic write; returns (inserted, updated)"""
+    records = list(records)
+    with stage("bulk_upsert", rows=len(records)):
+        return get_backend(SKU_DB).upsert(records)